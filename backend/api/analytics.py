@@ -0,0 +1,63 @@
+from flask import Blueprint, current_app, request, jsonify
+from flask_login import login_required
+from utils.policy import admin_required
+from utils.analytics import analytics_status, catch_up, distinct_ips, top_files, top_users
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/api/analytics')
+
+MAX_LIMIT = 100
+
+
+def _params():
+    """days（不超过保留天数）与 limit 参数"""
+    days = max(1, min(request.args.get('days', 7, type=int), current_app.config.get('ANALYTICS_RETENTION_DAYS', 7)))
+    limit = max(1, min(request.args.get('limit', 20, type=int), MAX_LIMIT))
+    return days, limit
+
+
+def _refresh():
+    """读取前追上最多一批新日志，其余留给后台任务"""
+    catch_up(current_app.config.get('ANALYTICS_BATCH_SIZE', 1000))
+
+
+@analytics_bp.route('/top-users', methods=['GET'])
+@login_required
+@admin_required
+def get_top_users():
+    """最近 days 天解密次数最多的用户（近似，decrypts - error 为真实值下界）"""
+    days, limit = _params()
+    _refresh()
+    users, max_error = top_users(days, limit)
+    return jsonify({'success': True, 'approximate': True, 'days': days, 'max_error': max_error, 'users': users})
+
+
+@analytics_bp.route('/distinct-ips', methods=['GET'])
+@login_required
+@admin_required
+def get_distinct_ips():
+    """最近 days 天各用户访问的不同 IP 数（近似），可用 user 只看一个用户"""
+    days, limit = _params()
+    _refresh()
+    users, total = distinct_ips(days, limit, user=request.args.get('user') or None)
+    return jsonify({'success': True, 'approximate': True, 'days': days,
+                    'relative_error': analytics_status()['hll_relative_error'],
+                    'total_distinct_ips': total, 'users': users})
+
+
+@analytics_bp.route('/top-files', methods=['GET'])
+@login_required
+@admin_required
+def get_top_files():
+    """累计解密次数最多的文件（近似计数，另附记录上的 decrypt_count）"""
+    _, limit = _params()
+    _refresh()
+    files, max_error = top_files(limit)
+    return jsonify({'success': True, 'approximate': True, 'max_error': max_error, 'files': files})
+
+
+@analytics_bp.route('/status', methods=['GET'])
+@login_required
+@admin_required
+def get_analytics_status():
+    """分析摘要的读取游标、保留天数与容量"""
+    return jsonify({'success': True, 'status': analytics_status()})
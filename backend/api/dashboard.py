@@ -1,59 +1,43 @@
 from flask import Blueprint, jsonify
 from flask_login import login_required, current_user
-from models import KeyRecord, AuditLog, Device, User
+from models import KeyRecord
 from extensions import db
+from utils.db_routing import read_replica
+from utils.quota import total_usage
+from utils.sizes import format_storage
+from utils.heartbeat import device_stats
+from utils.anomaly import alert_summary
+from utils.policy import get_policy, scope_keys
 from datetime import datetime, timedelta
-import os
 
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api')
 
 @dashboard_bp.route('/dashboard/stats', methods=['GET'])
 @login_required
+@read_replica
 def get_dashboard_stats():
     """获取仪表盘统计数据"""
     
-    # 根据用户角色过滤
-    if current_user.role == 'admin':
-        keys = KeyRecord.query.all()
-        total_keys = len(keys)
-    else:
-        keys = KeyRecord.query.filter_by(owner=current_user.username).all()
-        total_keys = len(keys)
-    
-    # 计算存储大小（从文件系统）
-    total_storage = 0
-    for key in keys:
-        if key.storage_path and os.path.exists(key.storage_path):
-            total_storage += os.path.getsize(key.storage_path)
-    
-    # 格式化存储大小
-    if total_storage < 1024:
-        storage_str = f"{total_storage} B"
-    elif total_storage < 1024 * 1024:
-        storage_str = f"{total_storage / 1024:.1f} KB"
-    elif total_storage < 1024 * 1024 * 1024:
-        storage_str = f"{total_storage / (1024 * 1024):.1f} MB"
+    policy = get_policy()
+    keys = scope_keys(KeyRecord.query)
+    
+    # 文件数与存储用量（配额计数器，O(1)，不扫描记录或文件系统）
+    total_keys = keys.count()
+    if policy.scope == 'all':
+        total_storage, _ = total_usage()
+    elif policy.scope == 'department':
+        total_storage, _ = total_usage(department=policy.department)
     else:
-        storage_str = f"{total_storage / (1024 * 1024 * 1024):.1f} GB"
+        total_storage, _ = total_usage(current_user.username)
+    storage_str = format_storage(total_storage)
     
     # 本周新增文件数
     week_ago = datetime.utcnow() - timedelta(days=7)
-    if current_user.role == 'admin':
-        keys_this_week = KeyRecord.query.filter(KeyRecord.created_at >= week_ago).count()
-        keys_last_week = KeyRecord.query.filter(
-            KeyRecord.created_at >= week_ago - timedelta(days=7),
-            KeyRecord.created_at < week_ago
-        ).count()
-    else:
-        keys_this_week = KeyRecord.query.filter(
-            KeyRecord.owner == current_user.username,
-            KeyRecord.created_at >= week_ago
-        ).count()
-        keys_last_week = KeyRecord.query.filter(
-            KeyRecord.owner == current_user.username,
-            KeyRecord.created_at >= week_ago - timedelta(days=7),
-            KeyRecord.created_at < week_ago
-        ).count()
+    keys_this_week = keys.filter(KeyRecord.created_at >= week_ago).count()
+    keys_last_week = keys.filter(
+        KeyRecord.created_at >= week_ago - timedelta(days=7),
+        KeyRecord.created_at < week_ago
+    ).count()
     
     # 计算变化百分比
     if keys_last_week > 0:
@@ -61,19 +45,9 @@ def get_dashboard_stats():
     else:
         change_percent = 100 if keys_this_week > 0 else 0
     
-    # 待处理告警（错误日志数）
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    if current_user.role == 'admin':
-        alerts = AuditLog.query.filter(
-            AuditLog.level == 'error',
-            AuditLog.timestamp >= today
-        ).count()
-    else:
-        alerts = AuditLog.query.filter(
-            AuditLog.user == current_user.username,
-            AuditLog.level == 'error',
-            AuditLog.timestamp >= today
-        ).count()
+    # 待处理告警：今日错误事件 + 异常检测告警（审计事件流的内存计数，不查询日志表）
+    summary = alert_summary(policy)
+    alerts = summary['alerts']
     
     # 安全评分（基于配置完整性）
     score_points = 0
@@ -85,9 +59,11 @@ def get_dashboard_stats():
     # 无今日错误 +1
     if alerts == 0:
         score_points += 1
+    # 设备状态（心跳内存视图，不查询 devices 表）
+    devices = device_stats()
+    
     # 有受信任设备 +1
-    trusted_devices = Device.query.filter_by(status='trusted').count()
-    if trusted_devices > 0:
+    if devices['trusted'] > 0:
         score_points += 1
     # 用户密码强度（简化：假设都通过）+1
     score_points += 1
@@ -97,15 +73,6 @@ def get_dashboard_stats():
     score_map = {5: 'A+', 4: 'A', 3: 'B+', 2: 'B', 1: 'C', 0: 'D'}
     security_score = score_map.get(score_points, 'C')
     
-    # 设备状态
-    devices = Device.query.all()
-    device_stats = {
-        'total': len(devices),
-        'trusted': sum(1 for d in devices if d.status == 'trusted'),
-        'pending': sum(1 for d in devices if d.status == 'pending'),
-        'revoked': sum(1 for d in devices if d.status == 'revoked')
-    }
-    
     # QRNG 状态（随机波动模拟真实探针）
     import random
     
@@ -149,9 +116,18 @@ def get_dashboard_stats():
             'storage_used': storage_str,
             'storage_bytes': total_storage,
             'security_score': security_score,
-            'alerts': alerts
+            'alerts': alerts,
+            'anomalies': summary['anomalies']
         },
-        'devices': device_stats,
+        'recent_alerts': [{
+            'rule': a.rule,
+            'subject_kind': a.subject_kind,
+            'subject': a.subject,
+            'value': a.value,
+            'threshold': a.threshold,
+            'at': a.at.isoformat()
+        } for a in summary['recent'][-10:]],
+        'devices': devices,
         'qrng': qrng_status,
         'security_status': security_status
     })
@@ -1,35 +1,85 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 from models import Device, AuditLog
 from extensions import db
-from datetime import datetime
+from utils.db_routing import read_replica
+from utils.policy import admin_required
+from utils.device_trust import STATUSES, parse_network, get_index, device_changed, device_removed
+from utils.heartbeat import get_view, track_device, forget_device, record_heartbeats
+from utils.serialize import list_response
+from datetime import datetime, timedelta, timezone
 import uuid
 
 devices_bp = Blueprint('devices', __name__, url_prefix='/api')
 
+DEVICE_LIST_FIELDS = ('id', 'name', 'ip', 'status', 'last_active', 'stale')
+
 @devices_bp.route('/devices', methods=['GET'])
 @login_required
+@read_replica
 def get_devices():
-    """Get all devices."""
-    devices = Device.query.order_by(Device.last_active.desc()).all()
-    return jsonify({
-        'success': True,
-        'devices': [{
-            'id': d.id,
-            'name': d.name,
-            'ip': d.ip,
-            'status': d.status,
-            'last_active': d.last_active.isoformat()
-        } for d in devices]
-    })
+    """Get devices, optionally filtered by status or by the device an IP resolves to."""
+    query = db.session.query(Device.id, Device.name, Device.ip, Device.status, Device.last_active)
+    status = request.args.get('status')
+    if status:
+        if status not in STATUSES:
+            return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'Status must be trusted, pending, or revoked'}), 400
+        query = query.filter(Device.status == status)
+    ip = request.args.get('ip')
+    if ip:
+        match = get_index().lookup(ip.strip())
+        query = query.filter(Device.id == (match[0] if match else None))
+    rows = query.order_by(Device.last_active.desc()).all()
+    
+    # last_active comes from the heartbeat view, which is ahead of the periodically flushed column
+    view = get_view()
+    stale_cutoff = datetime.utcnow() - timedelta(seconds=current_app.config.get('DEVICE_STALE_SECONDS', 300))
+    result = []
+    for device_id, name, ip, status, flushed in rows:
+        last_active = view.last_seen(device_id) or flushed
+        result.append((device_id, name, ip, status, last_active, last_active is None or last_active < stale_cutoff))
+    return list_response('devices', DEVICE_LIST_FIELDS, result)
+
+def _parse_beat(item):
+    if not isinstance(item, dict) or not isinstance(item.get('device_id'), str) or not item['device_id'].strip():
+        raise ValueError('Each heartbeat needs a device_id')
+    at = item.get('timestamp')
+    if at is not None:
+        try:
+            at = datetime.fromisoformat(str(at).replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError('timestamp must be ISO 8601')
+        if at.tzinfo is not None:
+            at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    return item['device_id'].strip(), at
+
+@devices_bp.route('/devices/heartbeat', methods=['POST'])
+@login_required
+def device_heartbeat():
+    """
+    Accept one heartbeat or a batch; last_active is written back in bulk by a background task.
+    A beat only counts when the request comes from inside the device's registered IP/CIDR and the device is not revoked.
+    """
+    data = request.json or {}
+    items = data.get('heartbeats', [data])
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'heartbeats must be a non-empty list'}), 400
+    max_batch = current_app.config.get('HEARTBEAT_MAX_BATCH', 1000)
+    if len(items) > max_batch:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': f'At most {max_batch} heartbeats per request'}), 400
+    try:
+        beats = [_parse_beat(item) for item in items]
+    except ValueError as e:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': str(e)}), 400
+    
+    accepted, rejected = record_heartbeats(beats, request.remote_addr)
+    return jsonify({'success': True, 'accepted': accepted, 'rejected': rejected}), 202
 
 @devices_bp.route('/devices', methods=['POST'])
 @login_required
+@admin_required
 def add_device():
     """Add a new device (admin only)."""
-    if current_user.role != 'admin':
-        return jsonify({'success': False, 'code': 'FORBIDDEN', 'message': 'Admin access required'}), 403
-    
     data = request.json or {}
     name = data.get('name', '').strip()
     ip = data.get('ip', '').strip()
@@ -40,7 +90,9 @@ def add_device():
         return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'Device name is required'}), 400
     if len(name) > 80:
         return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'Device name too long'}), 400
-    if status not in ['trusted', 'pending', 'revoked']:
+    if ip and parse_network(ip) is None:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'IP must be an address or CIDR network'}), 400
+    if status not in STATUSES:
         status = 'pending'
     
     device_id = f"DEV-{uuid.uuid4().hex[:8].upper()}"
@@ -65,16 +117,16 @@ def add_device():
     )
     db.session.add(log)
     db.session.commit()
+    device_changed(device)
+    track_device(device)
     
     return jsonify({'success': True, 'device': {'id': device_id, 'name': name}}), 201
 
 @devices_bp.route('/devices/<device_id>/status', methods=['PATCH'])
 @login_required
+@admin_required
 def update_device_status(device_id):
     """Update device status (trust/revoke) - admin only."""
-    if current_user.role != 'admin':
-        return jsonify({'success': False, 'code': 'FORBIDDEN', 'message': 'Admin access required'}), 403
-    
     device = Device.query.get(device_id)
     if not device:
         return jsonify({'success': False, 'code': 'NOT_FOUND', 'message': 'Device not found'}), 404
@@ -82,7 +134,7 @@ def update_device_status(device_id):
     data = request.json or {}
     new_status = data.get('status', '').strip()
     
-    if new_status not in ['trusted', 'pending', 'revoked']:
+    if new_status not in STATUSES:
         return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'Status must be trusted, pending, or revoked'}), 400
     
     old_status = device.status
@@ -99,16 +151,16 @@ def update_device_status(device_id):
     )
     db.session.add(log)
     db.session.commit()
+    device_changed(device)
+    track_device(device)
     
     return jsonify({'success': True, 'message': f'Device status updated to {new_status}'})
 
 @devices_bp.route('/devices/<device_id>', methods=['DELETE'])
 @login_required
+@admin_required
 def delete_device(device_id):
     """Delete a device (admin only)."""
-    if current_user.role != 'admin':
-        return jsonify({'success': False, 'code': 'FORBIDDEN', 'message': 'Admin access required'}), 403
-    
     device = Device.query.get(device_id)
     if not device:
         return jsonify({'success': False, 'code': 'NOT_FOUND', 'message': 'Device not found'}), 404
@@ -126,5 +178,7 @@ def delete_device(device_id):
     )
     db.session.add(log)
     db.session.commit()
+    device_removed(device_id)
+    forget_device(device_id)
     
     return jsonify({'success': True, 'message': 'Device deleted'})
@@ -0,0 +1,34 @@
+from flask import Blueprint, jsonify
+from flask_login import login_required
+from utils.policy import admin_required
+from utils.profiling import get_buffer
+
+diagnostics_bp = Blueprint('diagnostics', __name__, url_prefix='/api/diagnostics')
+
+def _summary(trace):
+    return {k: v for k, v in trace.items() if k not in ('queries', 'profile')}
+
+@diagnostics_bp.route('/profiles', methods=['GET'])
+@login_required
+@admin_required
+def list_profiles():
+    """最慢的请求剖析记录（管理员）"""
+    return jsonify({'success': True, 'profiles': [_summary(t) for t in get_buffer().list()]})
+
+@diagnostics_bp.route('/profiles/<trace_id>', methods=['GET'])
+@login_required
+@admin_required
+def get_profile(trace_id):
+    """单条剖析记录（含 SQL 明细与调用栈统计）"""
+    trace = get_buffer().get(trace_id)
+    if not trace:
+        return jsonify({'success': False, 'code': 'NOT_FOUND', 'message': '性能剖析记录不存在'}), 404
+    return jsonify({'success': True, 'profile': trace})
+
+@diagnostics_bp.route('/profiles', methods=['DELETE'])
+@login_required
+@admin_required
+def clear_profiles():
+    """清空剖析记录"""
+    get_buffer().clear()
+    return jsonify({'success': True})
@@ -1,20 +1,25 @@
-from flask import Blueprint, request, jsonify, send_file, current_app, after_this_request
+from flask import Blueprint, Response, request, jsonify, send_file, current_app, after_this_request
 from flask_login import login_required, current_user
-from models import KeyRecord, AuditLog
+from models import KeyRecord, AuditLog, User
 from extensions import db
+from utils.db_routing import read_replica
 from datetime import datetime
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 import uuid
 import os
 import hashlib
 import tempfile
+from utils.ciphers import get_suite, DEFAULT_FRAME_SIZE
+from utils.vault import encrypt_to_file, decrypt_to_file, decrypt_many
+from utils.zipstream import iter_zip, unique_name
+from utils.bulk import ACTIONS, BulkJob, build_query, start_job, get_job
+from utils.quota import QuotaExceeded, check_quota, charge
+from utils.sizes import format_size, parse_size
 
-# 尝试导入加密工具（允许失败以保持向后兼容）
-try:
-    from utils.crypto import encrypt_key_hex, decrypt_key_hex
-except ImportError:
-    encrypt_key_hex = lambda x: x
-    decrypt_key_hex = lambda x: x
+from utils.crypto import wrap_key
+from utils.device_trust import require_trusted_device
+from utils.policy import get_policy, manager_required, scope_keys, scope_users
+from utils.serialize import list_response
+from utils.http_cache import conditional
 
 keys_bp = Blueprint('keys', __name__, url_prefix='/api')
 
@@ -49,6 +54,15 @@ def check_file_size(file):
         return False, f"文件过大（最大 {max_size // (1024*1024)} MB）"
     return True, size
 
+def quota_exceeded_response(error):
+    """超出存储配额时的统一响应"""
+    return jsonify({
+        'success': False,
+        'code': 'QUOTA_EXCEEDED',
+        'message': str(error),
+        'usage': error.usage
+    }), 403
+
 def generate_temp_filename(key_id, original_name):
     """生成唯一的临时文件名"""
     timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
@@ -56,29 +70,83 @@ def generate_temp_filename(key_id, original_name):
     ext = os.path.splitext(original_name)[1] if '.' in original_name else ''
     return f"decrypt_{key_id}_{timestamp}_{random_suffix}{ext}"
 
+KEY_LIST_COLUMNS = (
+    KeyRecord.id, KeyRecord.owner, KeyRecord.file_name, KeyRecord.file_size, KeyRecord.algorithm,
+    KeyRecord.key_type, KeyRecord.created_at, KeyRecord.key_fingerprint, KeyRecord.decrypt_count,
+    KeyRecord.content_sha256, KeyRecord.cipher_checksum, KeyRecord.integrity_status, KeyRecord.last_verified_at
+)
+KEY_LIST_FIELDS = (
+    'id', 'owner', 'file_name', 'file_size', 'file_size_bytes', 'algorithm',
+    'key_type', 'created_at', 'key_fingerprint', 'decrypt_count',
+    'content_sha256', 'cipher_checksum', 'integrity_status', 'last_verified_at'
+)
+
 @keys_bp.route('/keys', methods=['GET'])
 @login_required
+@read_replica
+@conditional('key_records', 'users')
 def get_keys():
-    """获取密钥列表（管理员看全部，用户看自己的）"""
-    if current_user.role == 'admin':
-        keys = KeyRecord.query.order_by(KeyRecord.created_at.desc()).all()
-    else:
-        keys = KeyRecord.query.filter_by(owner=current_user.username).order_by(KeyRecord.created_at.desc()).all()
-        
-    return jsonify({
-        'success': True,
-        'keys': [{
-            'id': k.id,
-            'owner': k.owner,
-            'file_name': k.file_name,
-            'file_size': k.file_size,
-            'algorithm': k.algorithm,
-            'key_type': k.key_type,
-            'created_at': k.created_at.isoformat(),
-            'key_fingerprint': k.key_fingerprint,
-            'decrypt_count': k.decrypt_count
-        } for k in keys]
-    })
+    """获取密钥列表（按访问策略过滤：管理员看全部，部门管理员看本部门，用户看自己的）"""
+    # 只取列表需要的列（行元组），file_size 之后插入格式化后的大小
+    query = scope_keys(db.session.query(*KEY_LIST_COLUMNS)).order_by(KeyRecord.created_at.desc())
+    rows = [(key_id, owner, file_name, format_size(size), size, *rest)
+            for key_id, owner, file_name, size, *rest in query]
+    return list_response('keys', KEY_LIST_FIELDS, rows)
+
+@keys_bp.route('/keys/bulk', methods=['POST'])
+@login_required
+@manager_required
+def bulk_keys():
+    """
+    批量删除 / 转移所有者 / 重新加密密钥记录（管理员；部门管理员限本部门的记录与用户）
+    目标由 key_ids 和/或 filter（owner, algorithm, created_before, created_after）确定；
+    默认在后台执行并返回任务 ID，async 为 false 时同步执行并直接返回结果
+    """
+    data = request.json or {}
+    action = data.get('action')
+    if action not in ACTIONS:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': f"action 必须是 {' / '.join(ACTIONS)}"}), 400
+    
+    key_ids = data.get('key_ids')
+    if key_ids is not None and (not isinstance(key_ids, list) or not all(isinstance(k, str) for k in key_ids)):
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'key_ids 必须是字符串列表'}), 400
+    filters = data.get('filter') or {}
+    if not isinstance(filters, dict):
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'filter 必须是对象'}), 400
+    
+    params = {}
+    if action == 'transfer':
+        new_owner = (data.get('new_owner') or '').strip()
+        if not new_owner or not scope_users(User.query).filter(User.username == new_owner).first():
+            return jsonify({'success': False, 'code': 'USER_NOT_FOUND', 'message': '目标用户不存在'}), 400
+        params['new_owner'] = new_owner
+    elif action == 'reencrypt':
+        algorithm = data.get('algorithm') or 'auto'
+        try:
+            params['suite'] = current_app.extensions['cipher_default'] if algorithm == 'auto' else get_suite(algorithm)
+        except ValueError as e:
+            return jsonify({'success': False, 'code': 'UNSUPPORTED_ALGORITHM', 'message': str(e)}), 400
+        params['frame_size'] = current_app.config.get('CIPHER_FRAME_SIZE', DEFAULT_FRAME_SIZE)
+    
+    try:
+        ids = [key_id for (key_id,) in scope_keys(build_query(key_ids, filters))]
+    except ValueError as e:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': str(e)}), 400
+    
+    job = BulkJob(action, current_user.username, params)
+    background = data.get('async', True) is not False
+    start_job(job, ids, ip_address=request.remote_addr, background=background)
+    return jsonify({'success': True, 'job': job.to_dict()}), 202 if background else 200
+
+@keys_bp.route('/keys/bulk/<job_id>', methods=['GET'])
+@login_required
+@manager_required
+def bulk_job_status(job_id):
+    """批量任务进度（管理员看全部任务，部门管理员看自己发起的）"""
+    job = get_job(job_id)
+    if job is None or (not get_policy().is_admin and job.user != current_user.username):
+        return jsonify({'success': False, 'code': 'NOT_FOUND', 'message': '任务不存在'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
 
 @keys_bp.route('/encrypt/simulate', methods=['POST'])
 @login_required
@@ -106,7 +174,7 @@ def simulate_encryption():
         id=key_id,
         owner=current_user.username,
         file_name=filename,
-        file_size=filesize,
+        file_size=parse_size(filesize),
         algorithm=algorithm,
         key_type=key_mode,
         created_at=datetime.utcnow(),
@@ -136,6 +204,7 @@ def simulate_encryption():
 
 @keys_bp.route('/encrypt', methods=['POST'])
 @login_required
+@require_trusted_device
 def real_encryption():
     """真实 AES-256-GCM 加密端点"""
     # 检查文件是否存在
@@ -161,57 +230,66 @@ def real_encryption():
         return jsonify({'success': False, 'code': 'FILE_TOO_LARGE', 'message': result}), 413
     file_size = result
     
-    # 获取参数
-    algorithm = request.form.get('algorithm', 'AES-256-GCM')
+    # 获取参数（algorithm 为空或 auto 时使用启动时选出的默认算法）
+    algorithm = request.form.get('algorithm') or 'auto'
     key_mode = request.form.get('keyMode', 'QRNG-Auto')
     mode = request.form.get('mode', 'real')  # 'real' 或 'simulate'
+    default_suite = current_app.extensions['cipher_default']
     
     if mode == 'simulate':
         # 使用模拟模式（复用验证逻辑）
         data = {
             'filename': file.filename,
-            'filesize': f"{file_size / 1024:.2f} KB" if file_size < 1024*1024 else f"{file_size / (1024*1024):.2f} MB",
-            'algorithm': algorithm,
+            'filesize': file_size,
+            'algorithm': default_suite.name if algorithm == 'auto' else algorithm,
             'keyMode': key_mode
         }
         return simulate_encryption_internal(data)
     
-    # 读取文件内容
-    file_bytes = file.read()
-    
-    # 生成 AES-256-GCM 密钥和 IV
-    key = AESGCM.generate_key(bit_length=256)
-    iv = os.urandom(12)  # 96 bits for GCM
+    try:
+        suite = default_suite if algorithm == 'auto' else get_suite(algorithm)
+    except ValueError as e:
+        return jsonify({'success': False, 'code': 'UNSUPPORTED_ALGORITHM', 'message': str(e)}), 400
+    algorithm = suite.name
     
-    # 加密
-    aesgcm = AESGCM(key)
-    ciphertext = aesgcm.encrypt(iv, file_bytes, None)
+    # 配额预检查（只读计数器），避免为注定超额的上传做加密
+    try:
+        check_quota(current_user.username, current_user.department, file_size)
+    except QuotaExceeded as e:
+        return quota_exceeded_response(e)
     
-    # 生成密钥 ID 和指纹
+    # 生成密钥 ID，流式分帧加密写入存储
     key_id = f"KEY-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
-    fingerprint = hashlib.sha256(key).hexdigest()[:16]
-    
-    # 保存加密文件
     storage_filename = f"{key_id}.enc"
     storage_path = os.path.join(current_app.config['UPLOAD_FOLDER'], storage_filename)
     
-    with open(storage_path, 'wb') as f:
-        f.write(ciphertext)
+    key, nonce_prefix, _, content_sha256, cipher_checksum = encrypt_to_file(
+        file.stream, storage_path, suite,
+        current_app.config.get('CIPHER_FRAME_SIZE', DEFAULT_FRAME_SIZE)
+    )
+    fingerprint = hashlib.sha256(key).hexdigest()[:16]
+    
+    # 同一用户已加密过相同内容的文件
+    duplicate = db.session.query(KeyRecord.id).filter_by(
+        owner=current_user.username, content_sha256=content_sha256
+    ).order_by(KeyRecord.created_at).first()
     
     # 存储记录
     new_key = KeyRecord(
         id=key_id,
         owner=current_user.username,
         file_name=file.filename,
-        file_size=f"{file_size / 1024:.2f} KB" if file_size < 1024*1024 else f"{file_size / (1024*1024):.2f} MB",
+        file_size=file_size,
         algorithm=algorithm,
         key_type=key_mode,
         created_at=datetime.utcnow(),
         key_fingerprint=fingerprint,
         decrypt_count=0,
         storage_path=storage_path,
-        iv=iv.hex(),
-        key_hex=encrypt_key_hex(key.hex())  # 使用 MASTER_KEY 加密存储
+        nonce=nonce_prefix,  # 分帧格式：nonce 前缀
+        content_sha256=content_sha256,
+        cipher_checksum=cipher_checksum,
+        wrapped_key=wrap_key(key)  # 使用 MASTER_KEY 封装存储
     )
     
     db.session.add(new_key)
@@ -220,19 +298,31 @@ def real_encryption():
         user=current_user.username,
         action_type='ENCRYPT',
         message=f'文件 {file.filename} 已加密，算法 {algorithm}',
-        detail=f'大小: {new_key.file_size}, 密钥ID: {key_id}',
+        detail=f'大小: {format_size(file_size)}, 密钥ID: {key_id}',
         level='info',
         ip_address=request.remote_addr,
         user_agent=str(request.user_agent)
     )
     db.session.add(log)
-    db.session.commit()
+    
+    # 与记录同一事务占用配额；并发上传导致超额时整体回滚并删除密文
+    try:
+        charge(current_user.username, current_user.department, file_size)
+        db.session.commit()
+    except QuotaExceeded as e:
+        db.session.rollback()
+        os.remove(storage_path)
+        return quota_exceeded_response(e)
     
     return jsonify({
         'success': True,
         'key_id': key_id,
         'fingerprint': fingerprint,
-        'file_size': new_key.file_size,
+        'file_size': format_size(file_size),
+        'file_size_bytes': file_size,
+        'content_sha256': content_sha256,
+        'cipher_checksum': cipher_checksum,
+        'duplicate_of': duplicate.id if duplicate else None,
         'steps': ['hashing', 'qrng', 'encrypting', 'finalizing']
     })
 
@@ -250,7 +340,7 @@ def simulate_encryption_internal(data):
         id=key_id,
         owner=current_user.username,
         file_name=filename,
-        file_size=filesize,
+        file_size=parse_size(filesize),
         algorithm=algorithm,
         key_type=key_mode,
         created_at=datetime.utcnow(),
@@ -280,6 +370,7 @@ def simulate_encryption_internal(data):
 
 @keys_bp.route('/decrypt', methods=['POST'])
 @login_required
+@require_trusted_device
 def decrypt_file():
     """解密文件并返回下载链接"""
     data = request.json or {}
@@ -288,22 +379,19 @@ def decrypt_file():
     if not key_id:
         return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': '密钥ID不能为空'}), 400
     
-    # 查找密钥记录
-    key_record = KeyRecord.query.get(key_id)
+    # 查找密钥记录（访问策略拼入查询条件，无权访问的记录与不存在的记录一样查不到）
+    key_record = scope_keys(KeyRecord.query).filter(KeyRecord.id == key_id).first()
     
     if not key_record:
         return jsonify({'success': False, 'code': 'NOT_FOUND', 'message': '密钥不存在'}), 404
     
-    # 检查权限（管理员可解密所有，用户只能解密自己的）
-    if current_user.role != 'admin' and key_record.owner != current_user.username:
-        return jsonify({'success': False, 'code': 'FORBIDDEN', 'message': '无权访问'}), 403
-    
     # 检查是否为模拟加密（无实际文件）
-    if not key_record.storage_path or not key_record.key_hex:
+    if not key_record.storage_path or not key_record.wrapped_key:
         log = AuditLog(
             user=current_user.username,
             action_type='DECRYPT_SIMULATE',
             message=f'模拟解密 {key_record.file_name}',
+            detail=f'密钥ID: {key_record.id}',
             level='info',
             ip_address=request.remote_addr,
             user_agent=str(request.user_agent)
@@ -324,16 +412,14 @@ def decrypt_file():
     if not os.path.exists(key_record.storage_path):
         return jsonify({'success': False, 'code': 'FILE_MISSING', 'message': '加密文件不存在'}), 404
     
-    # 读取加密内容
-    with open(key_record.storage_path, 'rb') as f:
-        ciphertext = f.read()
+    # 生成唯一临时文件名，避免覆盖和命名冲突
+    temp_filename = generate_temp_filename(key_id, key_record.file_name)
+    decrypted_path = os.path.join(current_app.config['UPLOAD_FOLDER'], temp_filename)
     
-    # 解密
+    # 流式解密到临时文件
     try:
-        key = bytes.fromhex(decrypt_key_hex(key_record.key_hex))
-        iv = bytes.fromhex(key_record.iv)
-        aesgcm = AESGCM(key)
-        plaintext = aesgcm.decrypt(iv, ciphertext, None)
+        decrypt_to_file(key_record.storage_path, key_record.wrapped_key, key_record.nonce,
+                        decrypted_path, key_record.algorithm or 'AES-256-GCM')
     except Exception as e:
         log = AuditLog(
             user=current_user.username,
@@ -347,13 +433,6 @@ def decrypt_file():
         db.session.commit()
         return jsonify({'success': False, 'code': 'DECRYPT_ERROR', 'message': '解密失败'}), 500
     
-    # 生成唯一临时文件名，避免覆盖和命名冲突
-    temp_filename = generate_temp_filename(key_id, key_record.file_name)
-    decrypted_path = os.path.join(current_app.config['UPLOAD_FOLDER'], temp_filename)
-    
-    with open(decrypted_path, 'wb') as f:
-        f.write(plaintext)
-    
     # 记录解密成功，并存储临时文件路径
     log = AuditLog(
         user=current_user.username,
@@ -377,17 +456,91 @@ def decrypt_file():
         'simulated': False
     })
 
+@keys_bp.route('/download/bundle', methods=['POST'])
+@login_required
+@require_trusted_device
+def download_bundle():
+    """批量解密并以流式 ZIP 返回（条目按解密完成顺序写出）"""
+    data = request.json or {}
+    key_ids = data.get('key_ids')
+    
+    if not isinstance(key_ids, list) or not key_ids or not all(isinstance(k, str) for k in key_ids):
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'key_ids 必须是非空字符串列表'}), 400
+    key_ids = list(dict.fromkeys(k.strip() for k in key_ids))
+    max_files = current_app.config.get('BUNDLE_MAX_FILES', 100)
+    if len(key_ids) > max_files:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': f'单次最多打包 {max_files} 个文件'}), 400
+    
+    # 一次查询完成所有权限检查
+    records = {k.id: k for k in scope_keys(KeyRecord.query).filter(KeyRecord.id.in_(key_ids)).all()}
+    
+    missing = [k for k in key_ids if k not in records]
+    if missing:
+        return jsonify({'success': False, 'code': 'NOT_FOUND', 'message': '密钥不存在或无权访问', 'key_ids': missing}), 404
+    
+    simulated = [k for k in key_ids if not records[k].storage_path or not records[k].wrapped_key]
+    if simulated:
+        return jsonify({'success': False, 'code': 'SIMULATED', 'message': '模拟加密记录没有可下载的文件', 'key_ids': simulated}), 400
+    
+    # 在开始输出前取出所需字段，生成器运行时不再访问数据库
+    used_names = set()
+    jobs = [{
+        'key_id': k,
+        'arcname': unique_name(records[k].file_name or k, used_names),
+        'storage_path': records[k].storage_path,
+        'wrapped_key': records[k].wrapped_key,
+        'nonce': records[k].nonce,
+        'algorithm': records[k].algorithm or 'AES-256-GCM'
+    } for k in key_ids]
+    
+    KeyRecord.query.filter(KeyRecord.id.in_(key_ids)).update(
+        {KeyRecord.decrypt_count: KeyRecord.decrypt_count + 1}, synchronize_session=False
+    )
+    log = AuditLog(
+        user=current_user.username,
+        action_type='DECRYPT_BUNDLE',
+        message=f'批量解密下载 {len(key_ids)} 个文件',
+        detail=f"密钥ID: {', '.join(key_ids)}",
+        level='info',
+        ip_address=request.remote_addr,
+        user_agent=str(request.user_agent)
+    )
+    db.session.add(log)
+    db.session.commit()
+    
+    logger = current_app.logger
+    workers = current_app.config.get('BUNDLE_WORKERS', 4)
+    
+    def entries():
+        failures = []
+        for job, plain, error in decrypt_many(jobs, workers=workers):
+            if error is not None:
+                logger.error(f"打包解密失败 {job['key_id']}: {error}")
+                failures.append(f"{job['key_id']}\t{job['arcname']}\t{type(error).__name__}")
+                continue
+            with plain:
+                yield job['arcname'], plain
+        if failures:
+            yield unique_name('_errors.txt', used_names), '\n'.join(failures) + '\n'
+    
+    filename = f"vault-bundle-{datetime.now().strftime('%Y%m%d%H%M%S')}.zip"
+    return Response(
+        iter_zip(entries()),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 @keys_bp.route('/download/<key_id>', methods=['GET'])
 @login_required
+@require_trusted_device
 def download_decrypted(key_id):
     """下载解密后的文件，下载后自动删除"""
-    key_record = KeyRecord.query.get(key_id)
+    # 只取下载需要的文件名
+    row = scope_keys(db.session.query(KeyRecord.file_name)).filter(KeyRecord.id == key_id).first()
     
-    if not key_record:
+    if row is None:
         return jsonify({'success': False, 'message': '密钥不存在'}), 404
-    
-    if current_user.role != 'admin' and key_record.owner != current_user.username:
-        return jsonify({'success': False, 'message': '无权访问'}), 403
+    file_name = row.file_name
     
     # 获取临时文件名 token（防止下载旧文件）
     temp_filename = request.args.get('token', '')
@@ -413,4 +566,4 @@ def download_decrypted(key_id):
             current_app.logger.error(f'清理临时文件失败: {e}')
         return response
     
-    return send_file(decrypted_path, as_attachment=True, download_name=key_record.file_name)
+    return send_file(decrypted_path, as_attachment=True, download_name=file_name)
@@ -1,18 +1,33 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
-from models import AuditLog, KeyRecord
+from models import AuditLog, AuditLogIndex, KeyRecord
 from extensions import db
+from utils.db_routing import read_replica
+from utils.policy import admin_required, get_policy, scope_logs
+from utils.serialize import list_response
+from utils.http_cache import conditional
+from utils.audit_seal import lookup_condition, unseal_rows
+from utils.audit_chain import chain_status, inclusion_proof, reset_chain, verify_range
+from utils.anomaly import invalidate as invalidate_alerts
+from datetime import datetime
+from sqlalchemy import or_
 
 logs_bp = Blueprint('logs', __name__, url_prefix='/api')
 
+LOG_LIST_FIELDS = ('id', 'user', 'action_type', 'message', 'detail', 'level', 'timestamp', 'ip_address', 'user_agent')
+LOG_LIST_COLUMNS = tuple(getattr(AuditLog, field) for field in LOG_LIST_FIELDS)
+
 @logs_bp.route('/logs', methods=['GET'])
 @login_required
+@read_replica
+@conditional('audit_logs', 'users')
 def get_logs():
     """
     获取审计日志（带分页和过滤）
     
-    权限策略：
+    权限策略（utils.policy）：
     - 管理员：可查看所有日志
+    - 部门管理员：可查看本部门用户的日志
     - 普通用户：只能查看自己的操作日志
     """
     # 分页
@@ -24,51 +39,85 @@ def get_logs():
     level = request.args.get('level')  # info, warning, error
     action_type = request.args.get('action_type')  # LOGIN, ENCRYPT, etc.
     user_filter = request.args.get('user')
+    key_id = (request.args.get('key_id') or '').strip()  # 精确匹配日志中出现的密钥ID
+    ip = (request.args.get('ip') or '').strip()
     
-    query = AuditLog.query
+    query = scope_logs(db.session.query(*LOG_LIST_COLUMNS, AuditLog.sealed))
     
-    # 权限过滤：非管理员只能看自己的日志
-    if current_user.role != 'admin':
-        query = query.filter(AuditLog.user == current_user.username)
-        # 忽略 user 过滤参数，强制只看自己的
-        user_filter = None
-    elif user_filter:
-        # 管理员可按用户过滤
+    # 管理员与部门管理员可在可见范围内按用户过滤，普通用户忽略该参数
+    if user_filter and get_policy().is_manager:
         query = query.filter(AuditLog.user == user_filter)
     
     if level:
         query = query.filter(AuditLog.level == level)
     if action_type:
         query = query.filter(AuditLog.action_type == action_type)
+    # 密封日志走盲索引，不解密全表
+    if key_id:
+        query = query.filter(lookup_condition('key', key_id, or_(
+            AuditLog.message.contains(key_id, autoescape=True),
+            AuditLog.detail.contains(key_id, autoescape=True)
+        )))
+    if ip:
+        query = query.filter(lookup_condition('ip', ip, AuditLog.ip_address == ip))
     
     # 按时间倒序
     query = query.order_by(AuditLog.timestamp.desc())
     
     # 分页
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    logs = pagination.items
-    
-    return jsonify({
-        'success': True,
-        'logs': [{
-            'id': l.id,
-            'user': l.user,
-            'action_type': l.action_type,
-            'message': l.message,
-            'detail': l.detail,
-            'level': l.level,
-            'timestamp': l.timestamp.isoformat(),
-            'ip_address': l.ip_address,
-            'user_agent': l.user_agent
-        } for l in logs],
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total': pagination.total,
-            'pages': pagination.pages
-        }
+    
+    # 只解密当前页
+    rows = unseal_rows(pagination.items, LOG_LIST_FIELDS)
+    
+    return list_response('logs', LOG_LIST_FIELDS, rows, pagination={
+        'page': page,
+        'per_page': per_page,
+        'total': pagination.total,
+        'pages': pagination.pages
     })
 
+@logs_bp.route('/logs/<int:log_id>/proof', methods=['GET'])
+@login_required
+def get_log_proof(log_id):
+    """单条日志的 Merkle 包含证明（按访问策略只能查看可见的日志）"""
+    if not scope_logs(db.session.query(AuditLog.id)).filter(AuditLog.id == log_id).first():
+        return jsonify({'success': False, 'code': 'NOT_FOUND', 'message': '日志不存在'}), 404
+    return jsonify({'success': True, 'proof': inclusion_proof(log_id)})
+
+def _range_bound(id_arg, time_arg, first):
+    """区间端点：优先用 id，其次按时间换算为 id"""
+    if request.args.get(id_arg):
+        return int(request.args[id_arg])
+    value = request.args.get(time_arg)
+    if not value:
+        return None
+    at = datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    if first:
+        found = db.session.query(db.func.min(AuditLog.id)).filter(AuditLog.timestamp >= at).scalar()
+        return found if found is not None else 2 ** 62
+    found = db.session.query(db.func.max(AuditLog.id)).filter(AuditLog.timestamp <= at).scalar()
+    return found if found is not None else 0
+
+@logs_bp.route('/logs/integrity', methods=['GET'])
+@login_required
+@admin_required
+def get_log_integrity():
+    """
+    审计日志防篡改状态（管理员）
+    带 start/end（ISO 时间）或 from_id/to_id 时立即校验该区间：只读取检查点与区间所在的段
+    """
+    try:
+        start = _range_bound('from_id', 'start', True)
+        end = _range_bound('to_id', 'end', False)
+    except ValueError:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': '区间参数格式错误'}), 400
+    
+    result = {'success': True, 'status': chain_status()}
+    if start is not None or end is not None:
+        result['report'] = verify_range(start, end)
+    return jsonify(result)
+
 @logs_bp.route('/logs', methods=['POST'])
 @login_required
 def create_log():
@@ -114,7 +163,7 @@ def reset_db():
             'message': 'reset 端点仅在 DEBUG 模式下可用'
         }), 403
     
-    if current_user.role != 'admin':
+    if not get_policy().is_admin:
         log = AuditLog(
             user=current_user.username,
             action_type='RESET_ATTEMPT',
@@ -128,19 +177,21 @@ def reset_db():
         return jsonify({'success': False, 'code': 'FORBIDDEN', 'message': '需要管理员权限'}), 403
     
     try:
-        import os
         from flask import current_app
+        from utils.bulk import remove_files
+        from utils.quota import reset_usage
+        from utils.analytics import reset_analytics
         
-        keys = KeyRecord.query.all()
-        for key in keys:
-            if key.storage_path and os.path.exists(key.storage_path):
-                try:
-                    os.remove(key.storage_path)
-                except:
-                    pass
+        # 只取路径列，文件并行删除
+        paths = [p for (p,) in db.session.query(KeyRecord.storage_path).filter(KeyRecord.storage_path.isnot(None))]
+        remove_files(paths, current_app.config.get('BULK_IO_WORKERS', 8))
         
         KeyRecord.query.delete()
+        AuditLogIndex.query.delete()
         AuditLog.query.delete()
+        reset_chain()
+        reset_usage()
+        reset_analytics()
         
         log = AuditLog(
             user=current_user.username,
@@ -152,6 +203,7 @@ def reset_db():
         )
         db.session.add(log)
         db.session.commit()
+        invalidate_alerts()
         
         return jsonify({'success': True, 'message': '数据库已重置（用户保留）'})
     except Exception as e:
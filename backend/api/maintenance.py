@@ -0,0 +1,47 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from utils.policy import admin_required
+from utils.sweeper import run_sweep
+from utils.scrubber import run_scrub, scrub_status
+from utils.audit_chain import run_audit_chain
+
+maintenance_bp = Blueprint('maintenance', __name__, url_prefix='/api/maintenance')
+
+@maintenance_bp.route('/sweep', methods=['POST'])
+@login_required
+@admin_required
+def sweep_storage():
+    """立即执行一次存储回收（管理员），返回回收报告"""
+    report = run_sweep(user=current_user.username, ip_address=request.remote_addr)
+    return jsonify({'success': True, 'report': report})
+
+@maintenance_bp.route('/scrub', methods=['GET'])
+@login_required
+@admin_required
+def get_scrub_status():
+    """完整性巡检进度与各状态的记录数（管理员）"""
+    return jsonify({'success': True, 'status': scrub_status()})
+
+@maintenance_bp.route('/scrub', methods=['POST'])
+@login_required
+@admin_required
+def scrub_storage():
+    """从检查点继续执行一次完整性巡检（管理员），可用 limit 限制本次校验的记录数"""
+    data = request.get_json(silent=True) or {}
+    try:
+        limit = int(data['limit']) if data.get('limit') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'code': 'INVALID_LIMIT', 'message': 'limit 必须为整数'}), 400
+    if limit is not None and limit <= 0:
+        return jsonify({'success': False, 'code': 'INVALID_LIMIT', 'message': 'limit 必须为正整数'}), 400
+
+    report = run_scrub(user=current_user.username, ip_address=request.remote_addr, max_records=limit)
+    return jsonify({'success': True, 'report': report})
+
+@maintenance_bp.route('/audit-chain', methods=['POST'])
+@login_required
+@admin_required
+def audit_chain():
+    """立即补链、生成检查点并从游标处继续校验审计日志（管理员）"""
+    report = run_audit_chain(user=current_user.username, ip_address=request.remote_addr)
+    return jsonify({'success': True, 'report': report})
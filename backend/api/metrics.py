@@ -0,0 +1,18 @@
+from flask import Blueprint, Response, current_app, request, jsonify
+import hmac
+from utils.metrics import render_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 采集端点，需携带 Bearer Token；未配置 METRICS_TOKEN 时不对外提供"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if not current_app.config.get('METRICS_ENABLED', True) or not token:
+        return jsonify({'success': False, 'code': 'DISABLED', 'message': '指标端点未启用'}), 404
+
+    provided = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(provided, f'Bearer {token}'):
+        return jsonify({'success': False, 'code': 'AUTH_REQUIRED', 'message': '需要指标访问令牌'}), 401
+
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,87 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from models import StorageUsage, AuditLog
+from extensions import db
+from utils.quota import SCOPES, scopes_for, usage_dict, set_quota, rebuild_usage
+from utils.sizes import parse_size
+from utils.policy import admin_required, manager_required, scope_usage
+
+quotas_bp = Blueprint('quotas', __name__, url_prefix='/api/quotas')
+
+@quotas_bp.route('', methods=['GET'])
+@login_required
+@manager_required
+def list_quotas():
+    """可见范围内用户与部门的用量和上限（管理员看全部，部门管理员看本部门），可按 scope 过滤"""
+    query = scope_usage(StorageUsage.query)
+    scope = request.args.get('scope')
+    if scope:
+        query = query.filter_by(scope=scope)
+    rows = query.order_by(StorageUsage.scope, StorageUsage.name).all()
+    return jsonify({'success': True, 'quotas': [usage_dict(r) for r in rows]})
+
+@quotas_bp.route('/me', methods=['GET'])
+@login_required
+def my_quota():
+    """当前用户及其部门的用量和上限"""
+    result = []
+    for scope, name in scopes_for(current_user.username, current_user.department):
+        row = db.session.get(StorageUsage, (scope, name))
+        result.append(usage_dict(row) if row else {
+            'scope': scope, 'name': name, 'bytes_used': 0, 'files_used': 0,
+            'quota_bytes': None, 'quota_files': None
+        })
+    return jsonify({'success': True, 'quotas': result})
+
+@quotas_bp.route('/<scope>/<name>', methods=['PUT'])
+@login_required
+@admin_required
+def update_quota(scope, name):
+    """
+    设置用户或部门的上限（管理员）
+    quota_bytes 可为字节数或 "10 GB" 形式，null 表示不限
+    """
+    if scope not in SCOPES:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': f"scope 必须是 {' / '.join(SCOPES)}"}), 400
+    
+    data = request.json or {}
+    quota_bytes = data.get('quota_bytes')
+    quota_files = data.get('quota_files')
+    if quota_bytes is not None:
+        quota_bytes = parse_size(quota_bytes)
+        if quota_bytes is None:
+            return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'quota_bytes 无效'}), 400
+    if quota_files is not None and (not isinstance(quota_files, int) or isinstance(quota_files, bool) or quota_files < 0):
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'quota_files 必须是非负整数'}), 400
+    
+    row = set_quota(scope, name, quota_bytes, quota_files)
+    log = AuditLog(
+        user=current_user.username,
+        action_type='QUOTA_UPDATE',
+        message=f'设置 {scope} {name} 的存储配额',
+        detail=f'字节上限: {quota_bytes}, 文件数上限: {quota_files}',
+        level='info',
+        ip_address=request.remote_addr,
+        user_agent=str(request.user_agent)
+    )
+    db.session.add(log)
+    db.session.commit()
+    return jsonify({'success': True, 'quota': usage_dict(row)})
+
+@quotas_bp.route('/rebuild', methods=['POST'])
+@login_required
+@admin_required
+def rebuild_quotas():
+    """按现有记录重新计算全部用量计数器（管理员修复工具）"""
+    count = rebuild_usage()
+    log = AuditLog(
+        user=current_user.username,
+        action_type='QUOTA_REBUILD',
+        message=f'重新计算了 {count} 个存储用量计数器',
+        level='warning',
+        ip_address=request.remote_addr,
+        user_agent=str(request.user_agent)
+    )
+    db.session.add(log)
+    db.session.commit()
+    return jsonify({'success': True, 'rebuilt': count})
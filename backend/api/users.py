@@ -1,38 +1,58 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
 from models import User, AuditLog
 from extensions import db
+from utils.db_routing import read_replica
+from utils.quota import forget_user, move_department, stored_records
+from utils.directory import STATUSES, search_users, parse_import, import_users
+from utils.policy import ROLES, get_policy, manager_required, scope_users
+from utils.serialize import list_response
+from utils.http_cache import conditional
+import os
 
 users_bp = Blueprint('users', __name__, url_prefix='/api')
 
+USER_LIST_FIELDS = ('id', 'username', 'name', 'role', 'department', 'status', 'created_at')
+USER_LIST_COLUMNS = tuple(getattr(User, field) for field in USER_LIST_FIELDS)
+
 @users_bp.route('/users', methods=['GET'])
 @login_required
+@manager_required
+@read_replica
+@conditional('users')
 def get_users():
-    """Get all users (admin only)."""
-    if current_user.role != 'admin':
-        return jsonify({'success': False, 'code': 'FORBIDDEN', 'message': 'Admin access required'}), 403
-        
-    users = User.query.all()
-    return jsonify({
-        'success': True,
-        'users': [{
-            'id': u.id,
-            'username': u.username,
-            'name': u.name,
-            'role': u.role,
-            'department': u.department,
-            'status': u.status,
-            'created_at': u.created_at.isoformat()
-        } for u in users]
-    })
+    """List users with cursor pagination and prefix search (admins: everyone, department admins: their department)."""
+    limit = request.args.get('limit', 50, type=int)
+    limit = max(1, min(limit, 200))  # at most 200 per page
+    role = request.args.get('role')
+    status = request.args.get('status')
+    if role and role not in ROLES:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': f"Role must be one of {', '.join(ROLES)}"}), 400
+    if status and status not in STATUSES:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'Status must be active or locked'}), 400
+    
+    try:
+        users, next_cursor = search_users(
+            scope_users(db.session.query(*USER_LIST_COLUMNS)),
+            q=(request.args.get('q') or '').strip(),
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            role=role,
+            status=status,
+            department=request.args.get('department')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': str(e)}), 400
+    
+    return list_response('users', USER_LIST_FIELDS, users, next_cursor=next_cursor)
 
 @users_bp.route('/users', methods=['POST'])
 @login_required
+@manager_required
 def create_user():
-    """Create a new user (admin only)."""
-    if current_user.role != 'admin':
-        return jsonify({'success': False, 'code': 'FORBIDDEN', 'message': 'Admin access required'}), 403
-    
+    """Create a new user (admin; department admins create plain users in their own department)."""
+    policy = get_policy()
     data = request.json or {}
     username = data.get('username', '').strip()
     password = data.get('password', '')
@@ -47,12 +67,10 @@ def create_user():
         return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'Username too long'}), 400
     if not password or len(password) < 6:
         return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'Password must be at least 6 characters'}), 400
-    if role not in ['admin', 'user']:
+    if role not in policy.assignable_roles:
         role = 'user'
-    
-    # Check if username exists
-    if User.query.filter_by(username=username).first():
-        return jsonify({'success': False, 'code': 'DUPLICATE', 'message': 'Username already exists'}), 409
+    if not policy.is_admin:
+        department = policy.department
     
     user = User(
         username=username,
@@ -74,20 +92,87 @@ def create_user():
         user_agent=str(request.user_agent)
     )
     db.session.add(log)
-    db.session.commit()
+    # The unique constraint on username is the existence check
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'success': False, 'code': 'DUPLICATE', 'message': 'Username already exists'}), 409
     
     return jsonify({'success': True, 'user': {'id': user.id, 'username': user.username}}), 201
 
+IMPORT_FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson',
+                  'text/csv': 'csv', 'application/x-ndjson': 'ndjson', 'application/jsonl': 'ndjson'}
+
+@users_bp.route('/users/import', methods=['POST'])
+@login_required
+@manager_required
+def import_users_endpoint():
+    """Bulk-create users from a CSV or NDJSON upload (department admins import plain users into their department)."""
+    policy = get_policy()
+    
+    # Either a multipart file (format from the extension) or a raw body (format from Content-Type)
+    upload = request.files.get('file')
+    if upload:
+        fmt = IMPORT_FORMATS.get(os.path.splitext(upload.filename or '')[1].lower())
+        raw = upload.read()
+    else:
+        fmt = IMPORT_FORMATS.get(request.mimetype)
+        raw = request.get_data()
+    fmt = request.args.get('format') or fmt
+    on_duplicate = request.args.get('on_duplicate', 'skip')
+    if on_duplicate not in ('skip', 'fail'):
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'on_duplicate must be skip or fail'}), 400
+    if not raw:
+        return jsonify({'success': False, 'code': 'NO_FILE', 'message': 'No import data provided'}), 400
+    
+    try:
+        rows = parse_import(raw.decode('utf-8-sig'), fmt)
+        report = import_users(rows, on_duplicate, roles=policy.assignable_roles,
+                              force_department=None if policy.is_admin else policy.department)
+    except UnicodeDecodeError:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'Import data must be UTF-8'}), 400
+    except ValueError as e:
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': str(e)}), 400
+    
+    if report['invalid']:
+        db.session.rollback()
+        return jsonify({'success': False, 'code': 'VALIDATION_ERROR', 'message': 'Import contains invalid rows', 'report': report}), 400
+    if report['skipped'] and on_duplicate == 'fail':
+        db.session.rollback()
+        return jsonify({'success': False, 'code': 'DUPLICATE', 'message': 'Some usernames already exist', 'report': report}), 409
+    
+    log = AuditLog(
+        user=current_user.username,
+        action_type='USER_IMPORT',
+        message=f"Imported {report['created']} users",
+        detail=f"Rows: {len(rows)}, skipped existing: {len(report['skipped'])}, format: {fmt}",
+        level='info',
+        ip_address=request.remote_addr,
+        user_agent=str(request.user_agent)
+    )
+    db.session.add(log)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A username was created concurrently between the duplicate check and the insert
+        db.session.rollback()
+        return jsonify({'success': False, 'code': 'DUPLICATE', 'message': 'Usernames changed during import, retry'}), 409
+    
+    return jsonify({'success': True, 'report': report}), 201 if report['created'] else 200
+
 @users_bp.route('/users/<int:user_id>', methods=['PUT', 'PATCH'])
 @login_required
 def update_user(user_id):
-    """Update a user (admin or self)."""
-    user = User.query.get(user_id)
+    """Update a user (self, an admin, or the department admin of a plain user in their department)."""
+    policy = get_policy()
+    user = scope_users(User.query).filter(User.id == user_id).first()
     if not user:
         return jsonify({'success': False, 'code': 'NOT_FOUND', 'message': 'User not found'}), 404
     
-    # Only admin can update others
-    if current_user.role != 'admin' and current_user.id != user_id:
+    is_self = user.id == current_user.id
+    can_manage = policy.can_manage(user)
+    if not is_self and not can_manage:
         return jsonify({'success': False, 'code': 'FORBIDDEN', 'message': 'Access denied'}), 403
     
     data = request.json or {}
@@ -95,14 +180,18 @@ def update_user(user_id):
     # Update allowed fields
     if 'name' in data:
         user.name = data['name'][:80]
-    if 'department' in data:
-        user.department = data['department'][:80]
-    
-    # Admin-only fields
-    if current_user.role == 'admin':
-        if 'status' in data and data['status'] in ['active', 'locked']:
+    # Only admins change departments: the department decides quota and who can manage the user
+    if 'department' in data and policy.is_admin:
+        department = data['department'][:80]
+        move_department(user.username, user.department, department)
+        user.department = department
+    
+    # Management fields
+    if can_manage:
+        if 'status' in data and data['status'] in STATUSES:
             user.status = data['status']
-        if 'role' in data and data['role'] in ['admin', 'user']:
+    if policy.is_admin:
+        if 'role' in data and data['role'] in ROLES:
             user.role = data['role']
     
     # Password change
@@ -124,20 +213,27 @@ def update_user(user_id):
 
 @users_bp.route('/users/<int:user_id>', methods=['DELETE'])
 @login_required
+@manager_required
 def delete_user(user_id):
-    """Delete a user (admin only)."""
-    if current_user.role != 'admin':
-        return jsonify({'success': False, 'code': 'FORBIDDEN', 'message': 'Admin access required'}), 403
-    
+    """Delete a user (admin; department admins delete plain users in their department)."""
     # Prevent self-deletion
     if current_user.id == user_id:
         return jsonify({'success': False, 'code': 'FORBIDDEN', 'message': 'Cannot delete yourself'}), 403
     
-    user = User.query.get(user_id)
+    user = scope_users(User.query).filter(User.id == user_id).first()
     if not user:
         return jsonify({'success': False, 'code': 'NOT_FOUND', 'message': 'User not found'}), 404
+    if not get_policy().can_manage(user):
+        return jsonify({'success': False, 'code': 'FORBIDDEN', 'message': 'Access denied'}), 403
+    
+    # Usage is charged to the owner's department through the users table, so stored records must be transferred first
+    owned = stored_records(user.username)
+    if owned:
+        return jsonify({'success': False, 'code': 'HAS_RECORDS',
+                        'message': f'User still owns {owned} stored file(s); transfer or delete them first'}), 409
     
     username = user.username
+    forget_user(username, user.department)
     db.session.delete(user)
     
     log = AuditLog(
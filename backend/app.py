@@ -3,13 +3,47 @@ from werkzeug.exceptions import HTTPException
 from config import Config
 from extensions import db, cors, login_manager, migrate, sess
 from models import User, AuditLog
+from utils.db_profile import build_engine_options, apply_engine_profile
+from utils.db_routing import replica_binds
+from utils.audit_seal import init_audit_seal
+from utils.anomaly import init_anomaly
+from utils.compression import init_compression
+from utils.http_cache import init_http_cache, ensure_versions
+from utils.metrics import init_metrics
+from utils.profiling import init_profiling
+from utils.scheduler import init_scheduler, register_task
+from utils.ciphers import resolve_default_suite
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    # 数据库引擎调优（DB_PROFILE），显式配置的引擎参数优先
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **build_engine_options(app.config),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+    
+    # 只读副本注册为 replica_N 绑定，各自按自身 URI 生成引擎参数
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for key, uri in replica_binds(app.config.get('SQLALCHEMY_REPLICA_URIS') or []).items():
+        binds[key] = {'url': uri, **build_engine_options(app.config, uri)}
+    app.config['SQLALCHEMY_BINDS'] = binds
+
     # Initialize Extensions
     db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            apply_engine_profile(engine, app.config)
+        engines = list(db.engines.values())
+    
+    # 响应压缩（最先注册，最后执行）与列表端点的条件 GET 版本跟踪
+    init_compression(app)
+    init_http_cache(app, engines)
+    # 请求指标（每个蓝图自动生效）与 SQL 计数
+    init_metrics(app, engines)
+    # 请求剖析（按需开启）与慢查询日志
+    init_profiling(app, engines)
     
     # CORS - 使用 app.config 支持运行时动态配置
     cors.init_app(app, 
@@ -22,6 +56,14 @@ def create_app(config_class=Config):
     
     # Initialize config (create upload folder etc.)
     config_class.init_app(app)
+    
+    # 审计日志字段加密（AUDIT_SEAL_ENABLED）
+    init_audit_seal(app)
+    # 审计事件流式异常检测（采集钩子先于密封执行）
+    init_anomaly(app)
+    
+    # 默认文件加密算法（auto 时按本机基准测试选择）
+    app.extensions['cipher_default'] = resolve_default_suite(app.config)
 
     # User Loader
     @login_manager.user_loader
@@ -83,6 +125,11 @@ def create_app(config_class=Config):
     from api.devices import devices_bp
     from api.logs import logs_bp
     from api.dashboard import dashboard_bp
+    from api.metrics import metrics_bp
+    from api.diagnostics import diagnostics_bp
+    from api.maintenance import maintenance_bp
+    from api.quotas import quotas_bp
+    from api.analytics import analytics_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(keys_bp)
@@ -90,10 +137,36 @@ def create_app(config_class=Config):
     app.register_blueprint(devices_bp)
     app.register_blueprint(logs_bp)
     app.register_blueprint(dashboard_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(diagnostics_bp)
+    app.register_blueprint(maintenance_bp)
+    app.register_blueprint(quotas_bp)
+    app.register_blueprint(analytics_bp)
+    
+    # 后台周期任务（首个请求时启动）
+    from utils.sweeper import run_sweep
+    from utils.scrubber import run_scrub
+    from utils.device_trust import rebuild_index
+    from utils.heartbeat import flush_heartbeats, reload_view
+    from utils.audit_chain import run_audit_chain
+    from utils.anomaly import process_events, resync_errors
+    from utils.analytics import run_analytics
+    init_scheduler(app)
+    register_task(app, 'sweeper', app.config['SWEEP_INTERVAL_SECONDS'], run_sweep)
+    register_task(app, 'scrubber', app.config['SCRUB_INTERVAL_SECONDS'], run_scrub)
+    register_task(app, 'device_trust', app.config['DEVICE_TRUST_REFRESH_SECONDS'], rebuild_index)
+    register_task(app, 'heartbeat_flush', app.config['HEARTBEAT_FLUSH_SECONDS'], flush_heartbeats)
+    register_task(app, 'device_view', app.config['DEVICE_TRUST_REFRESH_SECONDS'], reload_view)
+    register_task(app, 'audit_chain', app.config['AUDIT_CHAIN_INTERVAL_SECONDS'], run_audit_chain)
+    if app.config.get('ANOMALY_ENABLED', True):
+        register_task(app, 'anomaly', app.config['ANOMALY_INTERVAL_SECONDS'], process_events)
+        register_task(app, 'anomaly_resync', app.config['ANOMALY_RESYNC_SECONDS'], resync_errors)
+    register_task(app, 'analytics', app.config['ANALYTICS_INTERVAL_SECONDS'], run_analytics)
     
     # Create tables on first request (dev convenience)
     with app.app_context():
         db.create_all()
+        ensure_versions()
 
     return app
 
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+文件加密算法基准：各算法在不同帧大小下的吞吐量（MB/s）
+
+Usage:
+    python -m benchmarks.ciphers
+    python -m benchmarks.ciphers --frame-sizes 4k,64k,1m --total 64m
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ciphers import SUITES, available_suites, benchmark_suites, has_aes_ni
+from benchmarks.common import run_metadata
+from benchmarks.run import parse_sizes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cipher suite throughput benchmark')
+    parser.add_argument('--frame-sizes', default='4k,16k,64k,256k,1m')
+    parser.add_argument('--total', default='32m', help='bytes encrypted per suite and frame size')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    results = benchmark_suites(parse_sizes(args.frame_sizes), parse_sizes(args.total)[0])
+    fastest = {}
+    for row in results:
+        best = fastest.get(row['frame_size'])
+        if best is None or row['mb_per_s'] > best['mb_per_s']:
+            fastest[row['frame_size']] = row
+
+    report = {
+        'metadata': {**run_metadata(), 'aes_ni': has_aes_ni()},
+        'benchmark': 'ciphers',
+        'unavailable': [name for name, suite in SUITES.items() if not suite.available],
+        'results': results,
+        'fastest': {str(size): row['suite'] for size, row in fastest.items()},
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return report
+
+
+if __name__ == '__main__':
+    main()
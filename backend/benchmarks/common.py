@@ -0,0 +1,92 @@
+"""压测公共工具：临时应用、百分位统计、结果元数据"""
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import Config
+from extensions import db
+
+
+def percentile(samples, pct):
+    """最近秩百分位数（samples 需已排序）"""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(pct / 100 * len(samples))) - 1))
+    return samples[index]
+
+
+def summarize(latencies, total_bytes=None, elapsed=None):
+    """把延迟样本（秒）汇总为 p50/p95/p99（毫秒），可选吞吐量"""
+    samples = sorted(latencies)
+    result = {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3) if samples else 0.0,
+    }
+    if elapsed:
+        result['ops_per_s'] = round(len(samples) / elapsed, 2)
+        if total_bytes is not None:
+            result['mb_per_s'] = round(total_bytes / (1024 * 1024) / elapsed, 2)
+    return result
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return value, time.perf_counter() - start
+
+
+@contextmanager
+def bench_app(**overrides):
+    """在临时目录中创建独立应用（数据库、上传目录、会话目录）"""
+    work_dir = tempfile.mkdtemp(prefix='qrng-bench-')
+
+    attrs = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(work_dir, 'bench.db')}",
+        'UPLOAD_FOLDER': os.path.join(work_dir, 'uploads'),
+        'SESSION_FILE_DIR': os.path.join(work_dir, 'sessions'),
+        'BACKGROUND_TASKS_ENABLED': False,
+    }
+    attrs.update(overrides)
+    os.makedirs(attrs['UPLOAD_FOLDER'], exist_ok=True)
+    bench_config = type('BenchConfig', (Config,), attrs)
+
+    app = create_app(bench_config)
+    try:
+        with app.app_context():
+            yield app
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_metadata():
+    """结果元数据，便于跨版本比对"""
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'timestamp': datetime.utcnow().isoformat(),
+        'git_revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+QRNG Secure Vault 压测套件
+
+结果为 JSON（p50/p95/p99、ops/s、MB/s），可保存后在版本之间比对回归
+
+Usage:
+    python -m benchmarks.run                                  # 全部场景，默认规模
+    python -m benchmarks.run --scenarios logs,dashboard --rows 1000000
+    python -m benchmarks.run --output results.json
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.common import bench_app, run_metadata
+from benchmarks import scenarios
+
+SCENARIOS = ('crypto', 'login', 'logs', 'dashboard')
+
+
+def parse_sizes(value):
+    units = {'k': 1024, 'm': 1024 * 1024}
+    sizes = []
+    for item in value.split(','):
+        item = item.strip().lower()
+        multiplier = units.get(item[-1], 1)
+        sizes.append(int(item.rstrip('km')) * multiplier)
+    return sizes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='QRNG Secure Vault benchmark suite')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"comma separated, any of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--rows', type=int, default=10 ** 4,
+                        help='seeded rows for logs/dashboard (10^4 .. 10^7)')
+    parser.add_argument('--sizes', default='1k,64k,1m,8m', help='file sizes for crypto')
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--samples', type=int, default=20)
+    parser.add_argument('--db-profile', default='auto')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    selected = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = {'metadata': {**run_metadata(), 'args': vars(args)}, 'scenarios': []}
+
+    # 每个场景使用独立的临时数据库，互不影响
+    for name in selected:
+        with bench_app(DB_PROFILE=args.db_profile) as app:
+            if name == 'crypto':
+                result = scenarios.encrypt_decrypt(app, parse_sizes(args.sizes), args.iterations)
+            elif name == 'login':
+                result = scenarios.login_concurrency(app, args.concurrency, args.iterations)
+            elif name == 'logs':
+                result = scenarios.logs_paging(app, args.rows, args.per_page, args.samples)
+            else:
+                result = scenarios.dashboard_stats(app, args.rows, args.samples)
+        report['scenarios'].append(result)
+        print(f"[bench] {name} done", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return report
+
+
+if __name__ == '__main__':
+    main()
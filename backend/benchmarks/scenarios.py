@@ -0,0 +1,151 @@
+"""压测场景：每个场景返回可序列化的结果字典"""
+import io
+import os
+import threading
+import time
+
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models import User
+from benchmarks.common import summarize, timed
+from benchmarks import datagen
+
+ADMIN_USERNAME = 'benchadmin'
+ADMIN_PASSWORD = 'bench123'
+
+
+def ensure_admin():
+    if not User.query.filter_by(username=ADMIN_USERNAME).first():
+        db.session.add(User(
+            username=ADMIN_USERNAME,
+            password_hash=generate_password_hash(ADMIN_PASSWORD),
+            name='Bench Admin',
+            role='admin',
+            status='active'
+        ))
+        db.session.commit()
+
+
+def admin_client(app):
+    ensure_admin()
+    client = app.test_client()
+    response = client.post('/api/login', json={'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    return client
+
+
+def encrypt_decrypt(app, sizes, iterations):
+    """加密/解密吞吐量（按文件大小）"""
+    client = admin_client(app)
+    results = []
+
+    for size in sizes:
+        payload = os.urandom(size)
+        enc_latencies, dec_latencies = [], []
+        key_ids = []
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            response, elapsed = timed(
+                client.post, '/api/encrypt',
+                data={'file': (io.BytesIO(payload), 'bench.bin.txt'), 'mode': 'real'},
+                content_type='multipart/form-data'
+            )
+            assert response.status_code == 200, response.get_json()
+            enc_latencies.append(elapsed)
+            key_ids.append(response.get_json()['key_id'])
+        enc_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for key_id in key_ids:
+            def decrypt_and_download():
+                result = client.post('/api/decrypt', json={'key_id': key_id}).get_json()
+                return client.get(result['download_url'])
+            response, elapsed = timed(decrypt_and_download)
+            assert response.status_code == 200
+            response.close()
+            dec_latencies.append(elapsed)
+        dec_elapsed = time.perf_counter() - started
+
+        results.append({
+            'size_bytes': size,
+            'encrypt': summarize(enc_latencies, size * iterations, enc_elapsed),
+            'decrypt': summarize(dec_latencies, size * iterations, dec_elapsed),
+        })
+
+    return {'scenario': 'encrypt_decrypt', 'results': results}
+
+
+def login_concurrency(app, concurrency, iterations):
+    """并发登录（PBKDF2 校验 + 审计写入）"""
+    ensure_admin()
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        local, failed = [], 0
+        for _ in range(iterations):
+            response, elapsed = timed(
+                client.post, '/api/login',
+                json={'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD}
+            )
+            if response.status_code == 200:
+                local.append(elapsed)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            failures.append(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'scenario': 'login_concurrency',
+        'concurrency': concurrency,
+        'failures': sum(failures),
+        'results': summarize(latencies, elapsed=elapsed),
+    }
+
+
+def logs_paging(app, rows, per_page, samples):
+    """/api/logs 深分页：首页、中间页、末页"""
+    datagen.seed_audit_logs(rows)
+    client = admin_client(app)
+    last_page = max(1, rows // per_page)
+    pages = {'first': 1, 'middle': max(1, last_page // 2), 'last': last_page}
+
+    results = {}
+    for label, page in pages.items():
+        latencies = []
+        for _ in range(samples):
+            response, elapsed = timed(client.get, f'/api/logs?page={page}&per_page={per_page}')
+            assert response.status_code == 200
+            latencies.append(elapsed)
+        results[label] = {'page': page, **summarize(latencies)}
+
+    return {'scenario': 'logs_paging', 'rows': rows, 'per_page': per_page, 'results': results}
+
+
+def dashboard_stats(app, rows, samples):
+    """/api/dashboard/stats（N 条密钥记录与审计日志）"""
+    datagen.seed_key_records(rows)
+    datagen.seed_audit_logs(rows)
+    datagen.seed_devices(max(1, rows // 100))
+    client = admin_client(app)
+
+    latencies = []
+    for _ in range(samples):
+        response, elapsed = timed(client.get, '/api/dashboard/stats')
+        assert response.status_code == 200
+        latencies.append(elapsed)
+
+    return {'scenario': 'dashboard_stats', 'rows': rows, 'results': summarize(latencies)}
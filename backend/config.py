@@ -16,6 +16,22 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///database.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Database engine profile: auto | default | sqlite-wal | postgres-pooled
+    # (auto picks sqlite-wal or postgres-pooled from the database URI)
+    DB_PROFILE = os.environ.get('DB_PROFILE', 'auto')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    
+    # Read replicas for read-only endpoints (comma separated URLs, empty = primary only)
+    SQLALCHEMY_REPLICA_URIS = [u for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u]
+    # After a user's own write, keep their reads on the primary for this long
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+    
     # Session Security
     SESSION_TYPE = 'filesystem'
     SESSION_COOKIE_SECURE = os.environ.get('FLASK_ENV') == 'production'  # True in production
@@ -27,6 +43,114 @@ class Config:
     MAX_CONTENT_LENGTH = 20 * 1024 * 1024  # 20MB max file size
     ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'zip'}
     
+    # File cipher: AES-256-GCM | ChaCha20-Poly1305 | AES-256-GCM-SIV | auto
+    # (auto benchmarks the available suites at startup and picks the fastest)
+    CIPHER_DEFAULT = os.environ.get('CIPHER_DEFAULT', 'auto')
+    CIPHER_FRAME_SIZE = int(os.environ.get('CIPHER_FRAME_SIZE', 64 * 1024))
+    
+    # Bundle download - max files per request, decrypt worker pool size
+    BUNDLE_MAX_FILES = int(os.environ.get('BUNDLE_MAX_FILES', 100))
+    BUNDLE_WORKERS = int(os.environ.get('BUNDLE_WORKERS', 4))
+    
+    # Bulk key-record operations - rows per SQL batch/commit, parallel file I/O workers
+    BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 500))
+    BULK_IO_WORKERS = int(os.environ.get('BULK_IO_WORKERS', 8))
+    
+    # User bulk import - max rows per request, INSERT batch size, password hashing workers
+    USER_IMPORT_MAX_ROWS = int(os.environ.get('USER_IMPORT_MAX_ROWS', 10000))
+    USER_IMPORT_BATCH_SIZE = int(os.environ.get('USER_IMPORT_BATCH_SIZE', 500))
+    USER_IMPORT_WORKERS = int(os.environ.get('USER_IMPORT_WORKERS', os.cpu_count() or 2))
+    
+    # List responses - row count above which the array is streamed, rows per streamed chunk
+    SERIALIZE_STREAM_THRESHOLD = int(os.environ.get('SERIALIZE_STREAM_THRESHOLD', 2000))
+    SERIALIZE_CHUNK_ROWS = int(os.environ.get('SERIALIZE_CHUNK_ROWS', 500))
+    
+    # Response compression - gzip always, br/zstd when brotli/zstandard are installed; bodies under COMPRESS_MIN_SIZE are sent as-is
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'True').lower() in ('true', '1', 'yes')
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+    COMPRESS_ZSTD_LEVEL = int(os.environ.get('COMPRESS_ZSTD_LEVEL', 3))
+    
+    # Conditional GET (ETag / Last-Modified from per-table change versions) on list endpoints
+    HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE_ENABLED', 'True').lower() in ('true', '1', 'yes')
+    
+    # Audit log sealing - message/detail/IP/user agent encrypted at rest with blind indexes for key id / IP lookups
+    # Key: AUDIT_LOG_KEY (base64, >= 32 bytes), otherwise derived from MASTER_KEY
+    AUDIT_SEAL_ENABLED = os.environ.get('AUDIT_SEAL_ENABLED', 'False').lower() in ('true', '1', 'yes')
+    AUDIT_LOG_KEY = os.environ.get('AUDIT_LOG_KEY')
+    
+    # Tamper-evident audit chain - background linking, Merkle checkpoint every N entries, incremental verification
+    AUDIT_CHAIN_INTERVAL_SECONDS = int(os.environ.get('AUDIT_CHAIN_INTERVAL_SECONDS', 60))
+    AUDIT_CHAIN_GRACE_SECONDS = int(os.environ.get('AUDIT_CHAIN_GRACE_SECONDS', 5))  # only link entries older than this
+    AUDIT_CHAIN_BATCH_SIZE = int(os.environ.get('AUDIT_CHAIN_BATCH_SIZE', 1000))
+    AUDIT_CHECKPOINT_SIZE = int(os.environ.get('AUDIT_CHECKPOINT_SIZE', 1024))
+    AUDIT_VERIFY_MAX_CHECKPOINTS = int(os.environ.get('AUDIT_VERIFY_MAX_CHECKPOINTS', 50))  # segments verified per run
+    
+    # Anomaly detection - streaming per-user / per-IP sliding-window counters over committed audit events
+    ANOMALY_ENABLED = os.environ.get('ANOMALY_ENABLED', 'True').lower() in ('true', '1', 'yes')
+    ANOMALY_INTERVAL_SECONDS = int(os.environ.get('ANOMALY_INTERVAL_SECONDS', 5))
+    ANOMALY_RESYNC_SECONDS = int(os.environ.get('ANOMALY_RESYNC_SECONDS', 300))  # recount today's error logs from the database
+    ANOMALY_WINDOW_SECONDS = int(os.environ.get('ANOMALY_WINDOW_SECONDS', 300))
+    ANOMALY_WINDOW_BUCKETS = int(os.environ.get('ANOMALY_WINDOW_BUCKETS', 10))
+    ANOMALY_SKETCH_WIDTH = int(os.environ.get('ANOMALY_SKETCH_WIDTH', 2048))
+    ANOMALY_SKETCH_DEPTH = int(os.environ.get('ANOMALY_SKETCH_DEPTH', 4))
+    ANOMALY_QUEUE_SIZE = int(os.environ.get('ANOMALY_QUEUE_SIZE', 10000))
+    ANOMALY_ALERT_HISTORY = int(os.environ.get('ANOMALY_ALERT_HISTORY', 200))
+    ANOMALY_FAILED_LOGIN_THRESHOLD = int(os.environ.get('ANOMALY_FAILED_LOGIN_THRESHOLD', 5))  # per user / IP per window
+    ANOMALY_DECRYPT_BURST_THRESHOLD = int(os.environ.get('ANOMALY_DECRYPT_BURST_THRESHOLD', 30))
+    ANOMALY_DISTINCT_KEYS_THRESHOLD = int(os.environ.get('ANOMALY_DISTINCT_KEYS_THRESHOLD', 50))
+    
+    # Admin analytics - top-K / distinct-count sketches folded incrementally from the audit log, snapshotted for restarts
+    ANALYTICS_INTERVAL_SECONDS = int(os.environ.get('ANALYTICS_INTERVAL_SECONDS', 60))
+    ANALYTICS_PERSIST_SECONDS = int(os.environ.get('ANALYTICS_PERSIST_SECONDS', 300))
+    ANALYTICS_GRACE_SECONDS = int(os.environ.get('ANALYTICS_GRACE_SECONDS', 5))  # only fold entries older than this
+    ANALYTICS_BATCH_SIZE = int(os.environ.get('ANALYTICS_BATCH_SIZE', 1000))
+    ANALYTICS_MAX_ROWS_PER_RUN = int(os.environ.get('ANALYTICS_MAX_ROWS_PER_RUN', 50000))
+    ANALYTICS_RESCAN_ROWS = int(os.environ.get('ANALYTICS_RESCAN_ROWS', 2000))  # recent ids re-checked for late commits
+    ANALYTICS_RETENTION_DAYS = int(os.environ.get('ANALYTICS_RETENTION_DAYS', 7))
+    ANALYTICS_TOPK_CAPACITY = int(os.environ.get('ANALYTICS_TOPK_CAPACITY', 1000))  # counters per space-saving summary
+    ANALYTICS_MAX_USERS = int(os.environ.get('ANALYTICS_MAX_USERS', 10000))  # per-day users with an IP sketch
+    
+    # Metrics - Prometheus scrape endpoint at /metrics; served only when METRICS_TOKEN is set (bearer auth)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() in ('true', '1', 'yes')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # Profiling - opt-in per request (X-Profile: 1) or by sampled fraction
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() in ('true', '1', 'yes')
+    PROFILE_HEADER = 'X-Profile'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0))
+    PROFILE_RING_SIZE = int(os.environ.get('PROFILE_RING_SIZE', 50))  # keep slowest N traces
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 200))  # 0 disables slow query log
+    
+    # Background tasks (started on first request, never under TESTING)
+    BACKGROUND_TASKS_ENABLED = os.environ.get('BACKGROUND_TASKS_ENABLED', 'True').lower() in ('true', '1', 'yes')
+    
+    # Storage sweeper - expire decrypted temp files, remove unreferenced .enc blobs
+    SWEEP_INTERVAL_SECONDS = int(os.environ.get('SWEEP_INTERVAL_SECONDS', 600))
+    TEMP_FILE_MAX_AGE_SECONDS = int(os.environ.get('TEMP_FILE_MAX_AGE_SECONDS', 900))
+    ORPHAN_BLOB_MIN_AGE_SECONDS = int(os.environ.get('ORPHAN_BLOB_MIN_AGE_SECONDS', 3600))
+    SWEEP_BATCH_SIZE = int(os.environ.get('SWEEP_BATCH_SIZE', 500))
+    SWEEP_MAX_BYTES_PER_SEC = int(os.environ.get('SWEEP_MAX_BYTES_PER_SEC', 50 * 1024 * 1024))
+    
+    # Integrity scrubber - re-verify stored .enc files in batches, resuming from a checkpoint
+    SCRUB_INTERVAL_SECONDS = int(os.environ.get('SCRUB_INTERVAL_SECONDS', 3600))
+    SCRUB_BATCH_SIZE = int(os.environ.get('SCRUB_BATCH_SIZE', 100))
+    SCRUB_MAX_RECORDS_PER_RUN = int(os.environ.get('SCRUB_MAX_RECORDS_PER_RUN', 1000))
+    SCRUB_MAX_BYTES_PER_SEC = int(os.environ.get('SCRUB_MAX_BYTES_PER_SEC', 20 * 1024 * 1024))
+    SCRUB_WORKERS = int(os.environ.get('SCRUB_WORKERS', os.cpu_count() or 2))
+    
+    # Device trust - only trusted device IPs/CIDRs may encrypt/decrypt (off by default);
+    # the in-memory index is updated on device changes and fully reloaded every N seconds
+    DEVICE_TRUST_ENFORCE = os.environ.get('DEVICE_TRUST_ENFORCE', 'False').lower() in ('true', '1', 'yes')
+    DEVICE_TRUST_REFRESH_SECONDS = int(os.environ.get('DEVICE_TRUST_REFRESH_SECONDS', 300))
+    
+    # Device heartbeats - coalesced in memory, last_active flushed in bulk every N seconds
+    HEARTBEAT_FLUSH_SECONDS = int(os.environ.get('HEARTBEAT_FLUSH_SECONDS', 10))
+    HEARTBEAT_MAX_BATCH = int(os.environ.get('HEARTBEAT_MAX_BATCH', 1000))
+    DEVICE_STALE_SECONDS = int(os.environ.get('DEVICE_STALE_SECONDS', 300))  # no heartbeat for this long = stale
+    
     # CORS - Whitelist specific origins
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:5173,http://127.0.0.1:5173').split(',')
     
@@ -0,0 +1,85 @@
+"""baseline schema (users, key_records, audit_logs, devices)
+
+Databases created by db.create_all() before migrations existed already have
+these tables; each table is only created when it is missing, so `flask db
+upgrade` works on both empty and existing databases.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'users' not in existing:
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('username', sa.String(80), nullable=False, unique=True),
+            sa.Column('password_hash', sa.String(128)),
+            sa.Column('name', sa.String(80)),
+            sa.Column('role', sa.String(20)),
+            sa.Column('department', sa.String(80)),
+            sa.Column('status', sa.String(20)),
+            sa.Column('created_at', sa.DateTime()),
+        )
+
+    if 'key_records' not in existing:
+        op.create_table(
+            'key_records',
+            sa.Column('id', sa.String(50), primary_key=True),
+            sa.Column('owner', sa.String(80), nullable=False),
+            sa.Column('file_name', sa.String(255)),
+            sa.Column('file_size', sa.String(20)),
+            sa.Column('algorithm', sa.String(20)),
+            sa.Column('key_type', sa.String(20)),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('key_fingerprint', sa.String(64)),
+            sa.Column('decrypt_count', sa.Integer()),
+            sa.Column('storage_path', sa.String(255)),
+            sa.Column('iv', sa.String(255)),
+            sa.Column('key_hex', sa.String(255)),
+        )
+
+    if 'audit_logs' not in existing:
+        op.create_table(
+            'audit_logs',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user', sa.String(80)),
+            sa.Column('action_type', sa.String(50)),
+            sa.Column('message', sa.String(255)),
+            sa.Column('detail', sa.Text()),
+            sa.Column('level', sa.String(20)),
+            sa.Column('timestamp', sa.DateTime()),
+            sa.Column('ip_address', sa.String(45)),
+            sa.Column('user_agent', sa.String(255)),
+        )
+
+    if 'devices' not in existing:
+        op.create_table(
+            'devices',
+            sa.Column('id', sa.String(50), primary_key=True),
+            sa.Column('name', sa.String(80)),
+            sa.Column('ip', sa.String(45)),
+            sa.Column('status', sa.String(20)),
+            sa.Column('last_active', sa.DateTime()),
+        )
+
+
+def downgrade():
+    op.drop_table('devices')
+    op.drop_table('audit_logs')
+    op.drop_table('key_records')
+    op.drop_table('users')
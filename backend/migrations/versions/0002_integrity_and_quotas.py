@@ -0,0 +1,71 @@
+"""content digests, integrity scrub state, job checkpoints, storage quotas
+
+Adds the KeyRecord columns and tables introduced for the integrity scrubber
+and storage quotas. Columns/tables that db.create_all() already created are
+skipped.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = (
+    ('content_sha256', sa.String(64)),
+    ('cipher_checksum', sa.String(64)),
+    ('integrity_status', sa.String(20)),
+    ('last_verified_at', sa.DateTime()),
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing_tables = set(inspector.get_table_names())
+    columns = {c['name'] for c in inspector.get_columns('key_records')}
+    indexes = {i['name'] for i in inspector.get_indexes('key_records')}
+
+    missing = [(name, type_) for name, type_ in NEW_COLUMNS if name not in columns]
+    if missing:
+        with op.batch_alter_table('key_records') as batch_op:
+            for name, type_ in missing:
+                batch_op.add_column(sa.Column(name, type_, nullable=True))
+    if 'ix_key_records_content_sha256' not in indexes:
+        op.create_index('ix_key_records_content_sha256', 'key_records', ['content_sha256'])
+
+    if 'job_checkpoints' not in existing_tables:
+        op.create_table(
+            'job_checkpoints',
+            sa.Column('name', sa.String(50), primary_key=True),
+            sa.Column('cursor', sa.String(255)),
+            sa.Column('cycles', sa.Integer()),
+            sa.Column('updated_at', sa.DateTime()),
+        )
+
+    if 'storage_usage' not in existing_tables:
+        op.create_table(
+            'storage_usage',
+            sa.Column('scope', sa.String(20), primary_key=True),
+            sa.Column('name', sa.String(80), primary_key=True),
+            sa.Column('bytes_used', sa.BigInteger(), nullable=False),
+            sa.Column('files_used', sa.Integer(), nullable=False),
+            sa.Column('quota_bytes', sa.BigInteger()),
+            sa.Column('quota_files', sa.Integer()),
+        )
+
+
+def downgrade():
+    op.drop_table('storage_usage')
+    op.drop_table('job_checkpoints')
+    op.drop_index('ix_key_records_content_sha256', table_name='key_records')
+    with op.batch_alter_table('key_records') as batch_op:
+        for name, _ in reversed(NEW_COLUMNS):
+            batch_op.drop_column(name)
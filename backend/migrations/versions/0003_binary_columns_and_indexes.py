@@ -0,0 +1,244 @@
+"""numeric file sizes, binary nonce / wrapped key, timestamp indexes
+
+- key_records.file_size: "1.20 MB" display strings -> BIGINT plaintext bytes
+- key_records.iv (hex text) -> nonce (binary, 7-byte frame prefix or 12-byte IV)
+- key_records.key_hex (hex or "iv:ciphertext" text) -> wrapped_key (binary,
+  first byte is the wrap format, see utils.crypto.wrap_key); legacy values are
+  re-encoded byte for byte, so no MASTER_KEY is needed to migrate
+- indexes for the listing / dashboard / audit queries
+
+The backfill walks key_records in keyset batches (MIGRATION_BATCH_SIZE rows,
+default 1000) and commits each batch on its own, only touching rows that still
+need converting: an interrupted upgrade can simply be re-run.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 00:00:00
+
+"""
+import os
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('key_records', 'ix_key_records_owner_created_at', ['owner', 'created_at']),
+    ('key_records', 'ix_key_records_created_at', ['created_at']),
+    ('key_records', 'ix_key_records_algorithm', ['algorithm']),
+    ('audit_logs', 'ix_audit_logs_timestamp', ['timestamp']),
+    ('audit_logs', 'ix_audit_logs_action_type', ['action_type']),
+    ('audit_logs', 'ix_audit_logs_user_timestamp', ['user', 'timestamp']),
+    ('audit_logs', 'ix_audit_logs_level_timestamp', ['level', 'timestamp']),
+)
+
+# Frozen copies of utils.sizes / utils.crypto as of this revision; migrations
+# must not import application code that may change later.
+UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+SIZE_RE = re.compile(r'^\s*([\d.]+)\s*([KMGT]?B)?\s*$', re.IGNORECASE)
+WRAP_PLAIN = 0
+WRAP_LEGACY_HEX = 2
+
+
+def parse_size(value):
+    match = SIZE_RE.match(value or '')
+    if not match:
+        return None
+    number, unit = match.groups()
+    try:
+        return int(float(number) * UNITS[(unit or 'B').upper()])
+    except ValueError:
+        return None
+
+
+def wrap_legacy(key_hex):
+    if not key_hex:
+        return None
+    if ':' in key_hex:
+        iv_hex, ciphertext_hex = key_hex.split(':', 1)
+        return bytes([WRAP_LEGACY_HEX]) + bytes.fromhex(iv_hex) + bytes.fromhex(ciphertext_hex)
+    return bytes([WRAP_PLAIN]) + bytes.fromhex(key_hex)
+
+
+def unwrap_legacy(wrapped):
+    if not wrapped:
+        return None
+    if wrapped[0] == WRAP_PLAIN:
+        return wrapped[1:].hex()
+    if wrapped[0] == WRAP_LEGACY_HEX:
+        return f'{wrapped[1:13].hex()}:{wrapped[13:].hex()}'
+    raise RuntimeError('key_records contains keys wrapped with MASTER_KEY; they cannot be stored as key_hex')
+
+
+def format_size(nbytes):
+    if nbytes is None:
+        return None
+    if nbytes < 1024 * 1024:
+        return f'{nbytes / 1024:.2f} KB'
+    return f'{nbytes / (1024 * 1024):.2f} MB'
+
+
+def batch_size():
+    return max(1, int(os.environ.get('MIGRATION_BATCH_SIZE', 1000)))
+
+
+def backfill(bind, select_columns, pending, convert):
+    """Keyset walk over key_records.id; each batch is one executemany UPDATE, committed on its own (autocommit block)."""
+    table = sa.table('key_records', sa.column('id', sa.String(50)),
+                     *(sa.column(name, type_) for name, type_ in {**select_columns, **convert.columns}.items()))
+    cursor = ''
+    size = batch_size()
+    while True:
+        rows = bind.execute(
+            sa.select(table.c.id, *(table.c[name] for name in select_columns))
+            .where(table.c.id > cursor, pending(table.c))
+            .order_by(table.c.id)
+            .limit(size)
+        ).all()
+        if not rows:
+            return
+        params = [dict(convert(row), _id=row.id) for row in rows]
+        bind.execute(
+            table.update().where(table.c.id == sa.bindparam('_id')).values({
+                name: sa.func.coalesce(table.c[name], sa.bindparam(name, type_=table.c[name].type))
+                for name in convert.columns
+            }),
+            params
+        )
+        cursor = rows[-1].id
+
+
+def to_binary(row):
+    return {
+        'nonce': bytes.fromhex(row.iv) if row.iv else None,
+        'wrapped_key': wrap_legacy(row.key_hex),
+        'file_size_bytes': parse_size(row.file_size),
+    }
+
+
+to_binary.columns = {'nonce': sa.LargeBinary(), 'wrapped_key': sa.LargeBinary(), 'file_size_bytes': sa.BigInteger()}
+
+
+def to_text(row):
+    return {
+        'iv_text': row.nonce.hex() if row.nonce else None,
+        'key_hex_text': unwrap_legacy(row.wrapped_key),
+        'file_size_text': format_size(row.file_size),
+    }
+
+
+to_text.columns = {'iv_text': sa.String(255), 'key_hex_text': sa.String(255), 'file_size_text': sa.String(20)}
+
+
+def rebuild_storage_usage(bind):
+    """Quota counters were charged with parsed sizes; recompute them from the converted rows."""
+    usage = sa.table('storage_usage', sa.column('scope'), sa.column('name'),
+                     sa.column('bytes_used', sa.BigInteger()), sa.column('files_used', sa.Integer()))
+    records = sa.table('key_records', sa.column('owner'), sa.column('file_size', sa.BigInteger()),
+                       sa.column('storage_path'), sa.column('id'))
+    users = sa.table('users', sa.column('username'), sa.column('department'))
+
+    totals = {}
+    rows = bind.execute(
+        sa.select(records.c.owner, users.c.department,
+                  sa.func.coalesce(sa.func.sum(records.c.file_size), 0), sa.func.count(records.c.id))
+        .select_from(records.outerjoin(users, users.c.username == records.c.owner))
+        .where(records.c.storage_path.isnot(None))
+        .group_by(records.c.owner, users.c.department)
+    ).all()
+    for owner, department, nbytes, nfiles in rows:
+        scopes = [('user', owner)] + ([('department', department)] if department else [])
+        for key in scopes:
+            current = totals.setdefault(key, [0, 0])
+            current[0] += int(nbytes)
+            current[1] += nfiles
+
+    bind.execute(usage.update().values(bytes_used=0, files_used=0))
+    existing = {(scope, name) for scope, name in bind.execute(sa.select(usage.c.scope, usage.c.name))}
+    for (scope, name), (nbytes, nfiles) in totals.items():
+        if (scope, name) in existing:
+            bind.execute(usage.update()
+                         .where(usage.c.scope == scope, usage.c.name == name)
+                         .values(bytes_used=nbytes, files_used=nfiles))
+        else:
+            bind.execute(usage.insert().values(scope=scope, name=name, bytes_used=nbytes, files_used=nfiles))
+
+
+def upgrade():
+    bind = op.get_bind()
+    columns = {c['name'] for c in sa.inspect(bind).get_columns('key_records')}
+
+    if 'iv' in columns:
+        missing = [(name, type_) for name, type_ in (
+            ('nonce', sa.LargeBinary(12)),
+            ('wrapped_key', sa.LargeBinary(96)),
+            ('file_size_bytes', sa.BigInteger()),
+        ) if name not in columns]
+        if missing:
+            with op.batch_alter_table('key_records') as batch_op:
+                for name, type_ in missing:
+                    batch_op.add_column(sa.Column(name, type_, nullable=True))
+
+        with op.get_context().autocommit_block():
+            backfill(
+                bind, {'iv': sa.String(255), 'key_hex': sa.String(255), 'file_size': sa.String(20)},
+                lambda c: sa.or_(
+                    sa.and_(c.iv.isnot(None), c.nonce.is_(None)),
+                    sa.and_(c.key_hex.isnot(None), c.wrapped_key.is_(None)),
+                    sa.and_(c.file_size.isnot(None), c.file_size_bytes.is_(None)),
+                ),
+                to_binary
+            )
+
+        with op.batch_alter_table('key_records') as batch_op:
+            batch_op.drop_column('iv')
+            batch_op.drop_column('key_hex')
+            batch_op.drop_column('file_size')
+            batch_op.alter_column('file_size_bytes', new_column_name='file_size',
+                                  existing_type=sa.BigInteger(), existing_nullable=True)
+
+        if 'storage_usage' in sa.inspect(bind).get_table_names():
+            rebuild_storage_usage(bind)
+
+    inspector = sa.inspect(bind)
+    for table, name, index_columns in INDEXES:
+        if name not in {i['name'] for i in inspector.get_indexes(table)}:
+            op.create_index(name, table, index_columns)
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table, name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+
+    with op.batch_alter_table('key_records') as batch_op:
+        batch_op.add_column(sa.Column('iv_text', sa.String(255), nullable=True))
+        batch_op.add_column(sa.Column('key_hex_text', sa.String(255), nullable=True))
+        batch_op.add_column(sa.Column('file_size_text', sa.String(20), nullable=True))
+
+    with op.get_context().autocommit_block():
+        backfill(
+            bind, {'nonce': sa.LargeBinary(), 'wrapped_key': sa.LargeBinary(), 'file_size': sa.BigInteger()},
+            lambda c: sa.or_(
+                sa.and_(c.nonce.isnot(None), c.iv_text.is_(None)),
+                sa.and_(c.wrapped_key.isnot(None), c.key_hex_text.is_(None)),
+                sa.and_(c.file_size.isnot(None), c.file_size_text.is_(None)),
+            ),
+            to_text
+        )
+
+    with op.batch_alter_table('key_records') as batch_op:
+        batch_op.drop_column('nonce')
+        batch_op.drop_column('wrapped_key')
+        batch_op.drop_column('file_size')
+    with op.batch_alter_table('key_records') as batch_op:
+        batch_op.alter_column('iv_text', new_column_name='iv', existing_type=sa.String(255))
+        batch_op.alter_column('key_hex_text', new_column_name='key_hex', existing_type=sa.String(255))
+        batch_op.alter_column('file_size_text', new_column_name='file_size', existing_type=sa.String(20))
@@ -0,0 +1,33 @@
+"""indexes for the user directory prefix search
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_users_name', ['name']),
+    ('ix_users_department', ['department']),
+)
+
+
+def upgrade():
+    existing = {i['name'] for i in sa.inspect(op.get_bind()).get_indexes('users')}
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'users', columns)
+
+
+def downgrade():
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='users')
@@ -0,0 +1,41 @@
+"""per-table change versions for conditional GET
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 00:00:00
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+TRACKED = ('users', 'key_records', 'audit_logs', 'devices', 'storage_usage')
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'table_versions' not in sa.inspect(bind).get_table_names():
+        op.create_table(
+            'table_versions',
+            sa.Column('name', sa.String(50), primary_key=True),
+            sa.Column('version', sa.BigInteger(), nullable=False),
+            sa.Column('updated_at', sa.DateTime()),
+        )
+    table = sa.table('table_versions', sa.column('name'), sa.column('version'), sa.column('updated_at'))
+    existing = set(bind.execute(sa.select(table.c.name)).scalars())
+    missing = [name for name in TRACKED if name not in existing]
+    if missing:
+        now = datetime.utcnow()
+        op.bulk_insert(table, [{'name': name, 'version': 0, 'updated_at': now} for name in missing])
+
+
+def downgrade():
+    op.drop_table('table_versions')
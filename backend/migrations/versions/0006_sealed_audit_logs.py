@@ -0,0 +1,38 @@
+"""sealed audit log fields and blind index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'sealed' not in {c['name'] for c in inspector.get_columns('audit_logs')}:
+        with op.batch_alter_table('audit_logs') as batch_op:
+            batch_op.add_column(sa.Column('sealed', sa.LargeBinary(), nullable=True))
+
+    if 'audit_log_index' not in inspector.get_table_names():
+        op.create_table(
+            'audit_log_index',
+            sa.Column('digest', sa.LargeBinary(16), primary_key=True),
+            sa.Column('log_id', sa.Integer(), sa.ForeignKey('audit_logs.id', ondelete='CASCADE'), primary_key=True),
+        )
+        op.create_index('ix_audit_log_index_log_id', 'audit_log_index', ['log_id'])
+
+
+def downgrade():
+    op.drop_index('ix_audit_log_index_log_id', table_name='audit_log_index')
+    op.drop_table('audit_log_index')
+    with op.batch_alter_table('audit_logs') as batch_op:
+        batch_op.drop_column('sealed')
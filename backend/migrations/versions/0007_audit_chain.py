@@ -0,0 +1,46 @@
+"""audit log hash chain and Merkle checkpoints
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'chain_hash' not in {c['name'] for c in inspector.get_columns('audit_logs')}:
+        with op.batch_alter_table('audit_logs') as batch_op:
+            batch_op.add_column(sa.Column('chain_hash', sa.LargeBinary(32), nullable=True))
+
+    if 'audit_checkpoints' not in inspector.get_table_names():
+        op.create_table(
+            'audit_checkpoints',
+            sa.Column('seq', sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column('first_id', sa.Integer(), nullable=False),
+            sa.Column('last_id', sa.Integer(), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.Column('merkle_root', sa.LargeBinary(32), nullable=False),
+            sa.Column('prev_chain', sa.LargeBinary(32), nullable=False),
+            sa.Column('chain_head', sa.LargeBinary(32), nullable=False),
+            sa.Column('digest', sa.LargeBinary(32), nullable=False),
+            sa.Column('mac', sa.LargeBinary(32)),
+            sa.Column('created_at', sa.DateTime()),
+        )
+        op.create_index('ix_audit_checkpoints_last_id', 'audit_checkpoints', ['last_id'])
+
+
+def downgrade():
+    op.drop_index('ix_audit_checkpoints_last_id', table_name='audit_checkpoints')
+    op.drop_table('audit_checkpoints')
+    with op.batch_alter_table('audit_logs') as batch_op:
+        batch_op.drop_column('chain_hash')
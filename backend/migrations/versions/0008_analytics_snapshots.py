@@ -0,0 +1,32 @@
+"""analytics sketch snapshots
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'analytics_snapshots' not in inspector.get_table_names():
+        op.create_table(
+            'analytics_snapshots',
+            sa.Column('name', sa.String(50), primary_key=True),
+            sa.Column('cursor', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('data', sa.LargeBinary(), nullable=False),
+            sa.Column('updated_at', sa.DateTime()),
+        )
+
+
+def downgrade():
+    op.drop_table('analytics_snapshots')
@@ -8,9 +8,9 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(128))
-    name = db.Column(db.String(80))
-    role = db.Column(db.String(20), default='user') # admin, user
-    department = db.Column(db.String(80))
+    name = db.Column(db.String(80), index=True)
+    role = db.Column(db.String(20), default='user') # admin, dept_admin, user
+    department = db.Column(db.String(80), index=True)
     status = db.Column(db.String(20), default='active') # active, locked
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -22,32 +22,67 @@ class User(UserMixin, db.Model):
 
 class KeyRecord(db.Model):
     __tablename__ = 'key_records'
+    __table_args__ = (
+        db.Index('ix_key_records_owner_created_at', 'owner', 'created_at'),
+    )
     id = db.Column(db.String(50), primary_key=True) # KEY-YYYYMMDD-XXXX
     owner = db.Column(db.String(80), nullable=False)
     file_name = db.Column(db.String(255))
-    file_size = db.Column(db.String(20))
-    algorithm = db.Column(db.String(20))
+    file_size = db.Column(db.BigInteger) # plaintext bytes
+    algorithm = db.Column(db.String(20), index=True)
     key_type = db.Column(db.String(20)) # QRNG-Auto, Custom-Seed
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     key_fingerprint = db.Column(db.String(64))
     decrypt_count = db.Column(db.Integer, default=0)
     
     # Real storage fields
     storage_path = db.Column(db.String(255), nullable=True)
-    iv = db.Column(db.String(255), nullable=True) # Hex string
-    key_hex = db.Column(db.String(255), nullable=True) # Hex string (Encrypted in real app, plain for demo)
+    nonce = db.Column(db.LargeBinary(12), nullable=True) # 7-byte frame nonce prefix, or 12-byte IV (legacy single-shot)
+    wrapped_key = db.Column(db.LargeBinary(96), nullable=True) # see utils.crypto.wrap_key
+
+    # Content digests computed while encrypting
+    content_sha256 = db.Column(db.String(64), nullable=True, index=True) # SHA-256 of the plaintext
+    cipher_checksum = db.Column(db.String(64), nullable=True) # BLAKE2b-256 of the .enc file
+
+    # Integrity scrubbing
+    integrity_status = db.Column(db.String(20), nullable=True) # ok, corrupt, missing
+    last_verified_at = db.Column(db.DateTime, nullable=True)
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        db.Index('ix_audit_logs_user_timestamp', 'user', 'timestamp'),
+        db.Index('ix_audit_logs_level_timestamp', 'level', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user = db.Column(db.String(80))
-    action_type = db.Column(db.String(50)) # LOGIN, ENCRYPT, SYSTEM
+    action_type = db.Column(db.String(50), index=True) # LOGIN, ENCRYPT, SYSTEM
     message = db.Column(db.String(255))
     detail = db.Column(db.Text)
     level = db.Column(db.String(20), default='info')
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     ip_address = db.Column(db.String(45))
     user_agent = db.Column(db.String(255))
+    sealed = db.Column(db.LargeBinary, nullable=True) # message/detail/ip_address/user_agent sealed under the log key (utils.audit_seal); those columns are then NULL
+    chain_hash = db.Column(db.LargeBinary(32), nullable=True) # hash chain link (utils.audit_chain), NULL until chained
+
+class AuditLogIndex(db.Model):
+    __tablename__ = 'audit_log_index'
+    digest = db.Column(db.LargeBinary(16), primary_key=True) # keyed hash of a key id or IP mentioned by a sealed log
+    log_id = db.Column(db.Integer, db.ForeignKey('audit_logs.id', ondelete='CASCADE'), primary_key=True, index=True)
+
+class AuditCheckpoint(db.Model):
+    __tablename__ = 'audit_checkpoints'
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=False) # 1, 2, ...
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False, index=True)
+    count = db.Column(db.Integer, nullable=False)
+    merkle_root = db.Column(db.LargeBinary(32), nullable=False)
+    prev_chain = db.Column(db.LargeBinary(32), nullable=False) # chain hash before the first entry
+    chain_head = db.Column(db.LargeBinary(32), nullable=False) # chain hash of the last entry
+    digest = db.Column(db.LargeBinary(32), nullable=False) # links to the previous checkpoint's digest
+    mac = db.Column(db.LargeBinary(32), nullable=True) # HMAC of digest under the log key, when one is configured
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Device(db.Model):
     __tablename__ = 'devices'
@@ -56,3 +91,32 @@ class Device(db.Model):
     ip = db.Column(db.String(45))
     status = db.Column(db.String(20), default='pending') # trusted, pending, revoked
     last_active = db.Column(db.DateTime, default=datetime.utcnow)
+
+class JobCheckpoint(db.Model):
+    __tablename__ = 'job_checkpoints'
+    name = db.Column(db.String(50), primary_key=True) # scrubber
+    cursor = db.Column(db.String(255)) # last processed id, empty = start of a new pass
+    cycles = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class StorageUsage(db.Model):
+    __tablename__ = 'storage_usage'
+    scope = db.Column(db.String(20), primary_key=True) # user, department
+    name = db.Column(db.String(80), primary_key=True)
+    bytes_used = db.Column(db.BigInteger, nullable=False, default=0)
+    files_used = db.Column(db.Integer, nullable=False, default=0)
+    quota_bytes = db.Column(db.BigInteger, nullable=True) # NULL = unlimited
+    quota_files = db.Column(db.Integer, nullable=True)
+
+class AnalyticsSnapshot(db.Model):
+    __tablename__ = 'analytics_snapshots'
+    name = db.Column(db.String(50), primary_key=True) # analytics
+    cursor = db.Column(db.Integer, nullable=False, default=0) # last audit log id folded into the snapshot
+    data = db.Column(db.LargeBinary, nullable=False) # zlib-compressed JSON of the sketches (utils.analytics)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TableVersion(db.Model):
+    __tablename__ = 'table_versions'
+    name = db.Column(db.String(50), primary_key=True) # table name
+    version = db.Column(db.BigInteger, nullable=False, default=0) # bumped by every committed transaction that wrote the table
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
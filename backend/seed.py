@@ -91,13 +91,13 @@ def seed_data(force=False):
             id='KEY-SAMPLE-001',
             owner='admin',
             file_name='demo_report.pdf',
-            file_size='1.2 MB',
+            file_size=1258291,  # 1.2 MB
             algorithm='AES-256-GCM',
             key_type='QRNG-Auto',
             created_at=datetime.utcnow(),
             key_fingerprint='a1b2c3d4e5f6...',
             decrypt_count=0
-            # storage_path, iv, key_hex left NULL (simulated mode)
+            # storage_path, nonce, wrapped_key left NULL (simulated mode)
         )
         db.session.add(key1)
 
@@ -0,0 +1,197 @@
+"""
+审计分析（Top-K / 去重计数）测试
+"""
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models import AnalyticsSnapshot, AuditLog, KeyRecord
+from utils.analytics import SpaceSaving, catch_up, get_state, merge_top, persist
+
+
+def _log(user, action, detail='', ip='10.0.0.1', at=None):
+    return AuditLog(user=user, action_type=action, message='', detail=detail, level='info',
+                    ip_address=ip, timestamp=at or datetime.utcnow())
+
+
+@pytest.fixture
+def analytics_app(app):
+    app.config['ANALYTICS_GRACE_SECONDS'] = 0
+    db.session.add_all([
+        KeyRecord(id='KEY-20260101-AAA', owner='testuser', file_name='a.txt', decrypt_count=7),
+        KeyRecord(id='KEY-20260101-BBB', owner='testuser', file_name='b.txt', decrypt_count=2),
+        KeyRecord(id='KEY-20260101-CCC', owner='testadmin', file_name='c.txt', decrypt_count=0),
+    ])
+    db.session.commit()
+    return app
+
+
+class TestSpaceSaving:
+    """Space-Saving 摘要"""
+
+    def test_exact_under_capacity(self):
+        """不超过容量时计数精确"""
+        summary = SpaceSaving(10)
+        for item in 'aabbbc':
+            summary.add(item)
+        top, max_error = merge_top([summary], 2)
+        assert top == [('b', 3, 0), ('a', 2, 0)]
+        assert max_error == 0
+
+    def test_error_bounds_over_capacity(self):
+        """超过容量时真实值落在 [count - error, count]，重项保留"""
+        rng = random.Random(7)
+        stream = [f'hot{i}' for i in range(5) for _ in range(200)] + [f'cold{rng.randrange(2000)}' for _ in range(3000)]
+        rng.shuffle(stream)
+        summary = SpaceSaving(50)
+        for item in stream:
+            summary.add(item)
+        truth = Counter(stream)
+        top, max_error = merge_top([summary], 5)
+        assert {item for item, _, _ in top} == {f'hot{i}' for i in range(5)}
+        for item, (count, error) in summary.counts.items():
+            assert count - error <= truth[item] <= count
+        assert all(truth[item] <= max_error for item in truth if item not in summary.counts)
+
+    def test_merge_bounds(self):
+        """多个摘要合并后上下界仍成立"""
+        days = [SpaceSaving(3), SpaceSaving(3)]
+        for item in 'aaaabcd':
+            days[0].add(item)
+        for item in 'aeeef':
+            days[1].add(item)
+        top, _ = merge_top(days, 2)
+        assert top[0] == ('a', 5, 0)
+        item, count, error = top[1]
+        assert item == 'e' and count - error <= 3 <= count
+
+
+class TestAnalyticsEndpoints:
+    """/api/analytics/*"""
+
+    def test_top_users(self, analytics_app, admin_client):
+        """按解密次数排序，批量解密按密钥数计"""
+        db.session.add_all([_log('alice', 'DECRYPT', '临时文件: decrypt_KEY-20260101-AAA_x.txt') for _ in range(3)])
+        db.session.add(_log('bob', 'DECRYPT_BUNDLE', '密钥ID: KEY-20260101-AAA, KEY-20260101-BBB, KEY-20260101-CCC, KEY-20260101-DDD'))
+        db.session.add(_log('carol', 'LOGIN'))
+        db.session.commit()
+
+        data = admin_client.get('/api/analytics/top-users?days=7&limit=2').get_json()
+        assert data['success'] and data['approximate']
+        assert [(u['user'], u['decrypts']) for u in data['users']] == [('bob', 4), ('alice', 3)]
+
+    def test_distinct_ips(self, analytics_app, admin_client):
+        """各用户访问的不同 IP 数"""
+        for i in range(20):
+            db.session.add(_log('alice', 'LOGIN', ip=f'10.0.0.{i % 10}'))
+        db.session.add(_log('bob', 'LOGIN', ip='10.1.0.1'))
+        db.session.commit()
+
+        data = admin_client.get('/api/analytics/distinct-ips').get_json()
+        counts = {u['user']: u['distinct_ips'] for u in data['users']}
+        assert data['users'][0]['user'] == 'alice'
+        assert abs(counts['alice'] - 10) <= 1 and counts['bob'] == 1
+        one = admin_client.get('/api/analytics/distinct-ips?user=bob').get_json()
+        assert [u['user'] for u in one['users']] == ['bob']
+
+    def test_top_files_seeded_from_decrypt_count(self, analytics_app, admin_client):
+        """文件计数以 decrypt_count 为初值，之后按新日志累加，不重复计入已有日志"""
+        state = get_state()
+        assert state.files.counts['KEY-20260101-AAA'][0] == 7
+        for _ in range(6):
+            db.session.add(_log('alice', 'DECRYPT_SIMULATE', '密钥ID: KEY-20260101-BBB'))
+        db.session.commit()
+
+        files = admin_client.get('/api/analytics/top-files').get_json()['files']
+        assert [(f['key_id'], f['decrypts']) for f in files] == [('KEY-20260101-BBB', 8), ('KEY-20260101-AAA', 7)]
+        assert files[0]['file_name'] == 'b.txt'
+
+        # 已删除的记录不返回
+        db.session.delete(db.session.get(KeyRecord, 'KEY-20260101-BBB'))
+        db.session.commit()
+        files = admin_client.get('/api/analytics/top-files').get_json()['files']
+        assert [f['key_id'] for f in files] == ['KEY-20260101-AAA']
+
+    def test_entries_outside_retention_ignored(self, analytics_app, admin_client):
+        """超出保留天数的日志不计入"""
+        old = datetime.utcnow() - timedelta(days=analytics_app.config['ANALYTICS_RETENTION_DAYS'] + 1)
+        get_state()
+        db.session.add(_log('old', 'DECRYPT', 'KEY-20260101-CCC', at=old))
+        db.session.commit()
+        users = admin_client.get('/api/analytics/top-users').get_json()['users']
+        assert 'old' not in [u['user'] for u in users]
+
+    def test_requires_admin(self, analytics_app, user_client):
+        """普通用户无权访问"""
+        assert user_client.get('/api/analytics/top-users').status_code == 403
+        assert user_client.get('/api/analytics/top-files').status_code == 403
+
+
+class TestPersistence:
+    """快照与重启恢复"""
+
+    def test_restore_from_snapshot_and_resume(self, analytics_app):
+        """从快照恢复后只读取游标之后的日志，不重复计数"""
+        get_state()
+        db.session.add_all([_log('alice', 'DECRYPT', 'KEY-20260101-CCC') for _ in range(2)])
+        db.session.commit()
+        catch_up()
+        assert persist()
+        assert db.session.get(AnalyticsSnapshot, 'analytics').cursor == get_state().cursor
+
+        # 模拟重启：丢弃内存状态，快照之后又写入日志
+        analytics_app.extensions.pop('analytics')
+        db.session.add(_log('alice', 'DECRYPT', 'KEY-20260101-CCC'))
+        db.session.commit()
+        catch_up()
+        state = get_state()
+        assert state.files.counts['KEY-20260101-CCC'][0] == 3
+        top, _ = merge_top([day.decrypts for day in state.recent(7)], 1)
+        assert top[0][:2] == ('alice', 3)
+
+    def test_late_commit_below_cursor_counted(self, analytics_app):
+        """游标越过之后才提交的小 id 日志补读一次，重启后不重复计数"""
+        get_state()
+        base = (db.session.query(db.func.max(AuditLog.id)).scalar() or 0) + 1
+        early = _log('alice', 'DECRYPT', 'KEY-20260101-CCC')
+        early.id = base + 1
+        db.session.add(early)
+        db.session.commit()
+        catch_up()
+        assert get_state().cursor == base + 1
+
+        late = _log('alice', 'DECRYPT', 'KEY-20260101-CCC')
+        late.id = base
+        db.session.add(late)
+        db.session.commit()
+        assert catch_up() == 1
+        assert catch_up() == 0
+        persist()
+        analytics_app.extensions.pop('analytics')
+        catch_up()
+        state = get_state()
+        assert state.files.counts['KEY-20260101-CCC'][0] == 2
+        top, _ = merge_top([day.decrypts for day in state.recent(7)], 1)
+        assert top[0][:2] == ('alice', 2)
+
+    def test_rescan_window_bounded(self, analytics_app):
+        """只记住最近 ANALYTICS_RESCAN_ROWS 个已计入的 id"""
+        analytics_app.config['ANALYTICS_RESCAN_ROWS'] = 3
+        analytics_app.extensions.pop('analytics', None)
+        get_state()
+        db.session.add_all([_log('alice', 'LOGIN') for _ in range(5)])
+        db.session.commit()
+        catch_up()
+        state = get_state()
+        assert len(state.seen) == 3 and state.floor == min(state.seen) - 1
+
+    def test_stale_snapshot_not_written_over_newer(self, analytics_app):
+        """其他进程已写入更新的游标时不覆盖"""
+        catch_up()
+        persist()
+        db.session.get(AnalyticsSnapshot, 'analytics').cursor = get_state().cursor + 100
+        db.session.commit()
+        assert persist() is False
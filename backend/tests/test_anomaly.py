@@ -0,0 +1,150 @@
+"""
+审计事件异常检测测试
+"""
+from extensions import db
+from models import AuditLog
+from utils.anomaly import (AnomalyDetector, AuditEvent, CountMinSketch, HyperLogLog,
+                           SlidingCounter, get_stream)
+from utils.metrics import AUDIT_QUEUE_DEPTH
+
+
+def _event(action, user='alice', ip='10.0.0.1', level='info', key_ids=(), log_id=None):
+    return AuditEvent(log_id, 0, user, action, level, ip, tuple(key_ids))
+
+
+class TestSketches:
+    """概率结构"""
+
+    def test_count_min_never_underestimates(self):
+        """Count-Min 估计值不小于真实值"""
+        cms = CountMinSketch(width=64, depth=4)
+        for i in range(500):
+            cms.add(f'k{i % 50}')
+        assert all(cms.estimate(f'k{i}') >= 10 for i in range(50))
+        assert cms.estimate('absent') <= 500
+
+    def test_hyperloglog_estimate(self):
+        """HyperLogLog 误差在几个标准差内，重复值不计数"""
+        hll = HyperLogLog(p=8)
+        for i in range(2000):
+            hll.add(f'KEY-{i}')
+            hll.add(f'KEY-{i}')
+        assert abs(hll.count() - 2000) < 2000 * 0.2
+        small = HyperLogLog(p=8)
+        for i in range(10):
+            small.add(str(i))
+        assert abs(small.count() - 10) <= 1
+
+    def test_sliding_counter_expires(self):
+        """窗口外的桶不再计入"""
+        counter = SlidingCounter(window=60, buckets=6, width=64, depth=3)
+        counter.add('a', now=1000, count=3)
+        counter.add('a', now=1030, count=2)
+        assert counter.estimate('a', now=1035) == 5
+        assert counter.estimate('a', now=1065) == 2
+        assert counter.estimate('a', now=1200) == 0
+
+
+class TestDetector:
+    """滑动窗口规则"""
+
+    def _detector(self, **overrides):
+        config = {'ANOMALY_WINDOW_SECONDS': 60, 'ANOMALY_FAILED_LOGIN_THRESHOLD': 3,
+                  'ANOMALY_DECRYPT_BURST_THRESHOLD': 5, 'ANOMALY_DISTINCT_KEYS_THRESHOLD': 4}
+        config.update(overrides)
+        return AnomalyDetector(config)
+
+    def test_failed_logins_per_user_and_ip(self):
+        """失败登录按用户与 IP 分别告警，同一窗口内只告警一次"""
+        detector = self._detector()
+        raised = detector.process([_event('LOGIN_FAIL') for _ in range(5)], now=100)
+        assert {(a.rule, a.subject_kind, a.subject) for a in raised} == {
+            ('failed_login', 'user', 'alice'), ('failed_login', 'ip', '10.0.0.1')}
+        assert detector.process([_event('LOGIN_FAIL')], now=110) == []
+        # 窗口过后重新累计
+        assert detector.process([_event('LOGIN_FAIL')], now=300) == []
+
+    def test_ip_spread_across_users(self):
+        """同一 IP 尝试多个用户名时按 IP 告警"""
+        detector = self._detector()
+        raised = detector.process([_event('LOGIN_FAIL', user=f'u{i}') for i in range(3)], now=100)
+        assert [(a.subject_kind, a.subject) for a in raised] == [('ip', '10.0.0.1')]
+
+    def test_decrypt_burst_counts_bundle_keys(self):
+        """批量解密按包含的密钥数计入解密突发"""
+        detector = self._detector()
+        raised = detector.process([_event('DECRYPT_BUNDLE', key_ids=['KEY-1', 'KEY-2', 'KEY-1', 'KEY-3', 'KEY-4', 'KEY-5'])], now=100)
+        assert {a.rule for a in raised} == {'decrypt_burst', 'distinct_keys'}
+
+    def test_distinct_keys(self):
+        """反复解密同一密钥不触发不同密钥数规则"""
+        detector = self._detector(ANOMALY_DECRYPT_BURST_THRESHOLD=1000)
+        assert detector.process([_event('DECRYPT', key_ids=['KEY-1']) for _ in range(20)], now=100) == []
+        raised = detector.process([_event('DECRYPT', key_ids=[f'KEY-{i}']) for i in range(2, 6)], now=101)
+        assert [(a.rule, a.value) for a in raised if a.subject_kind == 'user'] == [('distinct_keys', 4)]
+
+    def test_summary_scope(self):
+        """按用户范围汇总错误事件与告警；IP 告警只计入全局"""
+        detector = self._detector()
+        detector.process([_event('ERROR', user='bob', level='error', log_id=5),
+                          _event('ERROR', user='alice', level='error', log_id=6)]
+                         + [_event('LOGIN_FAIL') for _ in range(3)], now=100)
+        assert detector.summary()['alerts'] == 4
+        assert detector.summary({'alice'}) == {'errors': 1, 'anomalies': 1, 'alerts': 2,
+                                               'recent': [a for a in detector.summary()['recent'] if a.user == 'alice']}
+        assert detector.summary({'carol'})['alerts'] == 0
+
+    def test_resynced_errors_not_double_counted(self):
+        """已由数据库重算覆盖的日志 id 不再累加"""
+        detector = self._detector()
+        detector.load_errors([('bob', 2)], synced_id=10)
+        detector.process([_event('ERROR', user='bob', level='error', log_id=9),
+                          _event('ERROR', user='bob', level='error', log_id=11)], now=100)
+        assert detector.summary({'bob'})['errors'] == 3
+
+
+class TestAuditStream:
+    """审计写入路径与仪表盘"""
+
+    def test_failed_logins_raise_dashboard_alert(self, app, client):
+        """连续失败登录经事件流产生告警，仪表盘从内存读取"""
+        for _ in range(app.config['ANOMALY_FAILED_LOGIN_THRESHOLD']):
+            client.post('/api/login', json={'username': 'testuser', 'password': 'wrong-password'})
+        assert len(get_stream()) > 0
+        assert AUDIT_QUEUE_DEPTH.value() == len(get_stream())
+
+        client.post('/api/login', json={'username': 'testadmin', 'password': 'admin123'})
+        data = client.get('/api/dashboard/stats').get_json()
+        assert AUDIT_QUEUE_DEPTH.value() == 0
+        assert data['stats']['anomalies'] >= 1
+        rules = {(a['rule'], a['subject_kind'], a['subject']) for a in data['recent_alerts']}
+        assert ('failed_login', 'user', 'testuser') in rules
+
+    def test_error_events_counted_by_scope(self, app, client):
+        """今日错误事件按访问范围计数"""
+        client.post('/api/login', json={'username': 'testuser', 'password': 'user123'})
+        before = client.get('/api/dashboard/stats').get_json()['stats']['alerts']
+        client.post('/api/logs', json={'action_type': 'FRONTEND', 'message': 'boom', 'level': 'error'})
+        assert client.get('/api/dashboard/stats').get_json()['stats']['alerts'] == before + 1
+
+        db.session.add(AuditLog(user='testadmin', action_type='ERROR', message='x', level='error'))
+        db.session.commit()
+        assert client.get('/api/dashboard/stats').get_json()['stats']['alerts'] == before + 1
+
+    def test_existing_errors_loaded_on_first_use(self, app, admin_client):
+        """进程启动前已有的今日错误日志在首次读取时载入"""
+        db.session.add(AuditLog(user='testuser', action_type='ERROR', message='x', level='error'))
+        db.session.commit()
+        get_stream().synced = False
+        get_stream().drain()
+        stats = admin_client.get('/api/dashboard/stats').get_json()['stats']
+        assert stats['alerts'] == 1
+
+    def test_rolled_back_logs_not_published(self, app):
+        """回滚的日志不进入事件流"""
+        stream = get_stream()
+        stream.drain()
+        db.session.add(AuditLog(user='testuser', action_type='LOGIN_FAIL', level='error'))
+        db.session.flush()
+        db.session.rollback()
+        assert len(stream) == 0
@@ -0,0 +1,165 @@
+"""
+审计日志哈希链与 Merkle 检查点测试
+"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from extensions import db
+from models import AuditLog, AuditCheckpoint
+from utils.audit_chain import (
+    inclusion_path, merkle_root, verify_inclusion, run_audit_chain, verify_range, _sha256, LEAF
+)
+
+
+@pytest.fixture
+def chained(app):
+    """41 条日志，每 8 条一个检查点"""
+    app.config.update(AUDIT_CHECKPOINT_SIZE=8, AUDIT_CHAIN_GRACE_SECONDS=0)
+    start = datetime.utcnow() - timedelta(hours=1)
+    db.session.add_all([
+        AuditLog(user='testuser', action_type='TEST', message=f'entry {i}', level='info',
+                 timestamp=start + timedelta(seconds=i))
+        for i in range(40)
+    ] + [AuditLog(user='testadmin', action_type='TEST', message='admin entry', level='info', timestamp=start)])
+    db.session.commit()
+    report = run_audit_chain()
+    assert report['failures'] == []
+    return report
+
+
+def _tamper(log_id, **values):
+    table = AuditLog.__table__
+    db.session.execute(update(table).where(table.c.id == log_id).values(**values))
+    db.session.commit()
+
+
+class TestMerkle:
+    """Merkle 树与包含证明"""
+
+    def test_every_inclusion_proof_verifies(self):
+        for size in range(1, 18):
+            leaves = [_sha256(LEAF, os.urandom(8)) for _ in range(size)]
+            root = merkle_root(leaves)
+            for index in range(size):
+                path = inclusion_path(leaves, index)
+                assert verify_inclusion(leaves[index], index, size, path, root)
+                assert not verify_inclusion(_sha256(LEAF, b'forged'), index, size, path, root)
+            assert not verify_inclusion(leaves[0], size, size, [], root)
+
+
+class TestAuditChain:
+    """补链、检查点与增量校验"""
+
+    def test_chain_and_checkpoints(self, chained):
+        total = AuditLog.query.count()
+        assert chained['chained'] == total
+        assert chained['checkpoints_created'] == total // 8
+        assert AuditLog.query.filter(AuditLog.chain_hash.is_(None)).count() == 0
+        assert verify_range()['ok']
+
+    def test_recent_entries_wait_for_grace_period(self, app):
+        app.config['AUDIT_CHAIN_GRACE_SECONDS'] = 3600
+        db.session.add(AuditLog(user='testuser', action_type='TEST', message='new'))
+        db.session.commit()
+        run_audit_chain()
+        assert AuditLog.query.filter(AuditLog.chain_hash.is_(None)).count() > 0
+
+    def test_edit_detected_and_alerted_once(self, chained):
+        checkpoint = db.session.get(AuditCheckpoint, 2)
+        _tamper(checkpoint.first_id + 1, message='rewritten')
+
+        report = verify_range(checkpoint.first_id, checkpoint.last_id)
+        assert not report['ok']
+        assert {f['reason'] for f in report['failures']} >= {'chain', 'merkle_root'}
+        # 只读取与区间相交的段
+        assert report['checkpoints'] == 1
+
+        run_audit_chain(max_checkpoints=100)
+        run_audit_chain(max_checkpoints=100)
+        assert AuditLog.query.filter_by(action_type='AUDIT_TAMPER', message='审计日志校验失败: chain').count() == 1
+
+    def test_deletion_detected(self, chained):
+        checkpoint = db.session.get(AuditCheckpoint, 1)
+        db.session.delete(db.session.get(AuditLog, checkpoint.first_id + 2))
+        db.session.commit()
+        reasons = {f['reason'] for f in verify_range()['failures']}
+        assert {'entry_count', 'chain'} <= reasons
+
+    def test_forged_checkpoint_detected(self, chained):
+        checkpoint = db.session.get(AuditCheckpoint, 3)
+        checkpoint.merkle_root = bytes(32)
+        db.session.commit()
+        reasons = {f['reason'] for f in verify_range()['failures']}
+        assert {'checkpoint_digest', 'merkle_root'} <= reasons
+
+    def test_tail_edit_detected(self, chained):
+        tail = AuditLog(user='testuser', action_type='TEST', message='tail',
+                        timestamp=datetime.utcnow() - timedelta(minutes=1))
+        db.session.add(tail)
+        db.session.commit()
+        run_audit_chain()
+        assert tail.id > AuditCheckpoint.query.order_by(AuditCheckpoint.seq.desc()).first().last_id
+        assert verify_range(tail.id, tail.id)['ok']
+        _tamper(tail.id, level='error')
+        assert not verify_range(tail.id, tail.id)['ok']
+
+    def test_late_commit_below_cursor_rechained(self, chained):
+        """游标越过之后才提交的小 id 日志从缺口处重新链接，检查点照常生成"""
+        start = datetime.utcnow() - timedelta(minutes=5)
+        cursor = max(i for (i,) in db.session.query(AuditLog.id))
+        db.session.add(AuditLog(id=cursor + 2, user='testuser', action_type='TEST', message='early', timestamp=start))
+        db.session.commit()
+        run_audit_chain()
+
+        late = AuditLog(id=cursor + 1, user='testuser', action_type='TEST', message='late', timestamp=start)
+        db.session.add(late)
+        db.session.add_all([AuditLog(user='testuser', action_type='TEST', message=f'more {i}', timestamp=start)
+                            for i in range(8)])
+        db.session.commit()
+        report = run_audit_chain(max_checkpoints=100)
+        assert report['failures'] == []
+        assert report['checkpoints_created'] == 1
+        assert db.session.get(AuditLog, late.id).chain_hash is not None
+        assert AuditLog.query.filter(AuditLog.chain_hash.is_(None)).count() == 0
+        assert verify_range()['ok']
+
+
+class TestAuditChainAPI:
+    """包含证明与校验接口"""
+
+    def test_inclusion_proof(self, admin_client, chained):
+        log_id = db.session.get(AuditCheckpoint, 1).first_id + 3
+        proof = admin_client.get(f'/api/logs/{log_id}/proof').get_json()['proof']
+        assert proof['status'] == 'checkpointed'
+        assert proof['verified'] is True
+        assert verify_inclusion(bytes.fromhex(proof['leaf']), proof['index'], proof['tree_size'],
+                                [bytes.fromhex(p) for p in proof['path']], bytes.fromhex(proof['root']))
+
+    def test_proof_respects_visibility(self, user_client, chained):
+        admin_log = AuditLog.query.filter_by(user='testadmin', action_type='TEST').first()
+        assert user_client.get(f'/api/logs/{admin_log.id}/proof').status_code == 404
+        own = AuditLog.query.filter_by(user='testuser', action_type='TEST').first()
+        assert user_client.get(f'/api/logs/{own.id}/proof').status_code == 200
+
+    def test_integrity_endpoint(self, admin_client, chained):
+        data = admin_client.get('/api/logs/integrity').get_json()
+        assert data['status']['checkpoints'] == chained['checkpoints_created']
+        assert 'report' not in data
+
+        report = admin_client.get('/api/logs/integrity?from_id=1&to_id=10').get_json()['report']
+        assert report['ok'] and report['checkpoints'] >= 1
+        start = (datetime.utcnow() - timedelta(hours=2)).isoformat()
+        assert admin_client.get(f'/api/logs/integrity?start={start}').get_json()['report']['ok']
+        assert admin_client.get('/api/logs/integrity?start=yesterday').status_code == 400
+
+    def test_admin_only(self, user_client):
+        assert user_client.get('/api/logs/integrity').status_code == 403
+        assert user_client.post('/api/maintenance/audit-chain').status_code == 403
+
+    def test_maintenance_run(self, admin_client, app):
+        app.config['AUDIT_CHAIN_GRACE_SECONDS'] = 0
+        report = admin_client.post('/api/maintenance/audit-chain').get_json()['report']
+        assert report['chained'] > 0 and report['failures'] == []
@@ -0,0 +1,112 @@
+"""
+审计日志字段加密测试
+"""
+import base64
+import io
+import os
+
+import pytest
+
+from config import Config
+from extensions import db
+from models import AuditLog, AuditLogIndex
+from utils.audit_seal import LogSealer, init_audit_seal, open_fields, SEALED_PLACEHOLDER
+
+
+@pytest.fixture
+def sealed_app(app):
+    app.config.update(AUDIT_SEAL_ENABLED=True, AUDIT_LOG_KEY=base64.b64encode(os.urandom(32)).decode())
+    init_audit_seal(app)
+    yield app
+    app.config['AUDIT_SEAL_ENABLED'] = False
+    init_audit_seal(app)
+
+
+def _encrypt(client, name='secret-plan.txt'):
+    return client.post('/api/encrypt',
+        data={'file': (io.BytesIO(b'sealed'), name)},
+        content_type='multipart/form-data'
+    ).get_json()['key_id']
+
+
+class TestLogSealer:
+    """批量密封与解封"""
+
+    def test_batch_round_trip(self):
+        sealer = LogSealer(os.urandom(32))
+        items = [(b'alice', b''), (b'bob', b'x' * 17), (b'carol', '中文'.encode() * 40)]
+        blobs = sealer.seal_many(items)
+        assert [sealer.open(blob, aad) for blob, (aad, _) in zip(blobs, items)] == [p for _, p in items]
+        # 同一批内各条 IV 不同
+        assert len({blob[1:17] for blob in blobs}) == 3
+
+    def test_tamper_and_wrong_user_rejected(self):
+        sealer = LogSealer(os.urandom(32))
+        blob = sealer.seal_many([(b'alice', b'KEY-20260101-ABCDEF12')])[0]
+        with pytest.raises(ValueError):
+            sealer.open(blob, b'mallory')
+        with pytest.raises(ValueError):
+            sealer.open(blob[:-1] + bytes([blob[-1] ^ 1]), b'alice')
+
+    def test_blind_index_keyed_and_typed(self):
+        a, b = LogSealer(os.urandom(32)), LogSealer(os.urandom(32))
+        assert a.blind_index('ip', '10.0.0.1') == a.blind_index('ip', '10.0.0.1')
+        assert a.blind_index('ip', '10.0.0.1') != b.blind_index('ip', '10.0.0.1')
+        assert a.blind_index('ip', '10.0.0.1') != a.blind_index('key', '10.0.0.1')
+
+
+class TestSealedLogs:
+    """开启密封后的写入与查询"""
+
+    def test_fields_sealed_at_rest(self, admin_client, sealed_app):
+        key_id = _encrypt(admin_client)
+        log = AuditLog.query.filter_by(action_type='ENCRYPT').order_by(AuditLog.id.desc()).first()
+        assert log.sealed is not None
+        assert (log.message, log.detail, log.ip_address, log.user_agent) == (None, None, None, None)
+        assert b'secret-plan' not in log.sealed and key_id.encode() not in log.sealed
+
+        listed = admin_client.get('/api/logs?action_type=ENCRYPT').get_json()['logs'][0]
+        assert key_id in (listed['message'] or '') + (listed['detail'] or '')
+        assert listed['ip_address'] == '127.0.0.1'
+
+    def test_lookup_by_key_id_and_ip(self, admin_client, sealed_app):
+        first, second = _encrypt(admin_client, 'a.txt'), _encrypt(admin_client, 'b.txt')
+        admin_client.post('/api/decrypt', json={'key_id': first})
+        assert AuditLogIndex.query.count() > 0
+
+        logs = admin_client.get(f'/api/logs?key_id={first}').get_json()['logs']
+        assert sorted(l['action_type'] for l in logs) == ['DECRYPT', 'ENCRYPT']
+        assert all(second not in (l['detail'] or '') + (l['message'] or '') for l in logs)
+
+        by_ip = admin_client.get('/api/logs?ip=127.0.0.1&per_page=100').get_json()['logs']
+        assert {'DECRYPT', 'ENCRYPT'} <= {l['action_type'] for l in by_ip}
+        assert admin_client.get('/api/logs?ip=10.1.1.1').get_json()['logs'] == []
+
+    def test_plaintext_rows_still_searchable(self, admin_client, app):
+        """开启密封前写入的明文日志仍可按密钥ID / IP 查找"""
+        key_id = _encrypt(admin_client)
+        app.config.update(AUDIT_SEAL_ENABLED=True, AUDIT_LOG_KEY=base64.b64encode(os.urandom(32)).decode())
+        init_audit_seal(app)
+        try:
+            logs = admin_client.get(f'/api/logs?key_id={key_id}').get_json()['logs']
+            assert [l['action_type'] for l in logs] == ['ENCRYPT']
+        finally:
+            app.config['AUDIT_SEAL_ENABLED'] = False
+            init_audit_seal(app)
+
+    def test_without_key_shows_placeholder(self, admin_client, sealed_app):
+        _encrypt(admin_client)
+        log = AuditLog.query.filter_by(action_type='ENCRYPT').first()
+        assert open_fields(log.sealed, log.user, LogSealer(os.urandom(32)))['message'] == SEALED_PLACEHOLDER
+
+        sealed_app.config['AUDIT_SEAL_ENABLED'] = False
+        init_audit_seal(sealed_app)
+        listed = admin_client.get('/api/logs?action_type=ENCRYPT').get_json()['logs'][0]
+        assert listed['message'] == SEALED_PLACEHOLDER
+
+    def test_requires_key(self, app, monkeypatch):
+        monkeypatch.setattr(Config, 'MASTER_KEY', None)
+        app.config.update(AUDIT_SEAL_ENABLED=True, AUDIT_LOG_KEY=None)
+        with pytest.raises(RuntimeError):
+            init_audit_seal(app)
+        app.config['AUDIT_SEAL_ENABLED'] = False
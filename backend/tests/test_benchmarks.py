@@ -0,0 +1,28 @@
+"""
+压测套件冒烟测试（极小规模，确保场景可运行、输出格式稳定）
+"""
+from benchmarks import run
+
+
+class TestBenchmarkSuite:
+    """压测套件测试"""
+
+    def test_parse_sizes(self):
+        """文件大小参数解析"""
+        assert run.parse_sizes('1k,2m,100') == [1024, 2 * 1024 * 1024, 100]
+
+    def test_smoke_run(self, tmp_path):
+        """全部场景小规模运行并输出 JSON"""
+        import json
+        output = tmp_path / 'bench.json'
+        run.main([
+            '--rows', '200', '--sizes', '1k', '--iterations', '2',
+            '--concurrency', '2', '--samples', '2', '--output', str(output)
+        ])
+        report = json.loads(output.read_text())
+        names = [s['scenario'] for s in report['scenarios']]
+        assert names == ['encrypt_decrypt', 'login_concurrency', 'logs_paging', 'dashboard_stats']
+
+        crypto = report['scenarios'][0]['results'][0]
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'mb_per_s'):
+            assert key in crypto['encrypt']
@@ -0,0 +1,122 @@
+"""
+密钥记录批量操作测试
+"""
+import io
+import os
+import time
+
+from extensions import db
+from models import KeyRecord, AuditLog
+
+
+def _encrypt(client, name, content=b'bulk content'):
+    return client.post('/api/encrypt',
+        data={'file': (io.BytesIO(content), name), 'algorithm': 'AES-256-GCM'},
+        content_type='multipart/form-data'
+    ).get_json()['key_id']
+
+
+def _bulk(client, **body):
+    body.setdefault('async', False)
+    return client.post('/api/keys/bulk', json=body)
+
+
+class TestBulkOperations:
+    """批量删除、转移、重新加密测试"""
+
+    def test_delete_by_ids(self, admin_client, app):
+        """按 ID 删除：记录与密文文件一起删除，分块提交"""
+        app.config['BULK_CHUNK_SIZE'] = 2
+        ids = [_encrypt(admin_client, f'{i}.txt') for i in range(5)]
+        keep = _encrypt(admin_client, 'keep.txt')
+        paths = [db.session.get(KeyRecord, i).storage_path for i in ids]
+
+        response = _bulk(admin_client, action='delete', key_ids=ids)
+        assert response.status_code == 200
+        job = response.get_json()['job']
+        assert (job['status'], job['total'], job['processed']) == ('done', 5, 5)
+
+        db.session.expire_all()
+        assert KeyRecord.query.filter(KeyRecord.id.in_(ids)).count() == 0
+        assert db.session.get(KeyRecord, keep) is not None
+        assert not any(os.path.exists(p) for p in paths)
+        assert AuditLog.query.filter_by(action_type='BULK_DELETE').count() == 1
+
+    def test_transfer_by_owner_filter(self, admin_client):
+        """按所有者过滤转移全部记录（人员离职场景）"""
+        ids = [_encrypt(admin_client, f'{i}.txt') for i in range(3)]
+        response = _bulk(admin_client, action='transfer', filter={'owner': 'testadmin'}, new_owner='testuser')
+        assert response.get_json()['job']['processed'] == 3
+
+        db.session.expire_all()
+        assert {db.session.get(KeyRecord, i).owner for i in ids} == {'testuser'}
+
+    def test_transfer_to_unknown_user(self, admin_client):
+        """目标用户必须存在"""
+        response = _bulk(admin_client, action='transfer', filter={'owner': 'testadmin'}, new_owner='ghost')
+        assert response.status_code == 400
+        assert response.get_json()['code'] == 'USER_NOT_FOUND'
+
+    def test_reencrypt_with_new_algorithm(self, admin_client):
+        """重新加密：换算法与密钥，内容不变，旧密文删除"""
+        key_id = _encrypt(admin_client, 'r.txt', b'reencrypt me')
+        old = db.session.get(KeyRecord, key_id)
+        old_path, old_fingerprint, old_sha = old.storage_path, old.key_fingerprint, old.content_sha256
+
+        job = _bulk(admin_client, action='reencrypt', key_ids=[key_id],
+                    algorithm='ChaCha20-Poly1305').get_json()['job']
+        assert (job['status'], job['failed']) == ('done', 0)
+
+        db.session.expire_all()
+        record = db.session.get(KeyRecord, key_id)
+        assert record.algorithm == 'ChaCha20-Poly1305'
+        assert record.key_fingerprint != old_fingerprint
+        assert record.content_sha256 == old_sha
+        assert record.storage_path != old_path and not os.path.exists(old_path)
+
+        result = admin_client.post('/api/decrypt', json={'key_id': key_id}).get_json()
+        assert admin_client.get(result['download_url']).data == b'reencrypt me'
+
+    def test_reencrypt_reports_failures(self, admin_client):
+        """损坏的文件单独记为失败，其余记录照常处理"""
+        good = _encrypt(admin_client, 'g.txt')
+        bad = _encrypt(admin_client, 'b.txt')
+        with open(db.session.get(KeyRecord, bad).storage_path, 'r+b') as f:
+            f.seek(20)
+            f.write(b'\xff\xff')
+
+        job = _bulk(admin_client, action='reencrypt', key_ids=[good, bad],
+                    algorithm='ChaCha20-Poly1305').get_json()['job']
+        assert (job['processed'], job['failed']) == (2, 1)
+        assert job['errors'][0]['key_id'] == bad
+
+        db.session.expire_all()
+        assert db.session.get(KeyRecord, good).algorithm == 'ChaCha20-Poly1305'
+        assert db.session.get(KeyRecord, bad).algorithm == 'AES-256-GCM'
+
+    def test_async_job_progress(self, admin_client):
+        """异步执行时返回 202 与任务 ID，可轮询进度"""
+        ids = [_encrypt(admin_client, f'{i}.txt') for i in range(2)]
+        response = admin_client.post('/api/keys/bulk', json={
+            'action': 'transfer', 'key_ids': ids, 'new_owner': 'testuser'})
+        assert response.status_code == 202
+        job_id = response.get_json()['job']['id']
+
+        for _ in range(100):
+            job = admin_client.get(f'/api/keys/bulk/{job_id}').get_json()['job']
+            if job['status'] in ('done', 'failed'):
+                break
+            time.sleep(0.05)
+        assert job['status'] == 'done'
+        assert job['progress'] == 1.0
+
+    def test_requires_target(self, admin_client):
+        """不给 key_ids 也不给 filter 时拒绝，防止误删全部"""
+        assert _bulk(admin_client, action='delete').status_code == 400
+        assert _bulk(admin_client, action='delete', filter={'size': 1}).status_code == 400
+        assert _bulk(admin_client, action='explode', key_ids=['x']).status_code == 400
+
+    def test_requires_admin(self, user_client):
+        """普通用户无权批量操作"""
+        assert _bulk(user_client, action='delete', key_ids=['x']).status_code == 403
+        assert user_client.get('/api/keys/bulk/abc').status_code == 403
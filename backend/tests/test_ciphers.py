@@ -0,0 +1,206 @@
+"""
+加密算法套件与分帧格式测试
+"""
+import hashlib
+import io
+import os
+import tracemalloc
+
+import pytest
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from utils.ciphers import (
+    SUITES, available_suites, get_suite, encrypt_stream, decrypt_stream,
+    HEADER_SIZE, TAG_SIZE
+)
+from models import KeyRecord
+from utils.crypto import wrap_key
+from utils.vault import decrypt_blob
+
+FRAME = 1024
+
+
+def _roundtrip(suite, data, frame_size=FRAME):
+    key = suite.generate_key()
+    sealed = io.BytesIO()
+    _, plain_size, cipher_size = encrypt_stream(io.BytesIO(data), sealed, suite, key, frame_size)
+    assert plain_size == len(data)
+    assert cipher_size == len(sealed.getvalue())
+    opened = io.BytesIO()
+    decrypt_stream(io.BytesIO(sealed.getvalue()), opened, key)
+    return key, sealed.getvalue(), opened.getvalue()
+
+
+class TestCipherSuites:
+    """算法注册表与分帧流测试"""
+
+    @pytest.mark.parametrize('size', [0, 1, FRAME - 1, FRAME, FRAME + 1, 3 * FRAME])
+    def test_roundtrip_all_suites(self, size):
+        """各算法在帧边界附近往返一致"""
+        data = os.urandom(size)
+        for suite in available_suites():
+            _, sealed, opened = _roundtrip(suite, data)
+            assert opened == data
+            frames = max(1, -(-size // FRAME))
+            assert len(sealed) == HEADER_SIZE + size + frames * TAG_SIZE
+
+    def test_tampered_frame_rejected(self):
+        """篡改任意字节都无法解密"""
+        key, sealed, _ = _roundtrip(get_suite('AES-256-GCM'), os.urandom(2 * FRAME))
+        tampered = bytearray(sealed)
+        tampered[HEADER_SIZE + FRAME + 5] ^= 1
+        with pytest.raises(InvalidTag):
+            decrypt_stream(io.BytesIO(bytes(tampered)), io.BytesIO(), key)
+
+    def test_truncation_rejected(self):
+        """在帧边界截断也会被发现（末帧标志）"""
+        key, sealed, _ = _roundtrip(get_suite('ChaCha20-Poly1305'), os.urandom(3 * FRAME))
+        truncated = sealed[:HEADER_SIZE + 2 * (FRAME + TAG_SIZE)]
+        with pytest.raises(InvalidTag):
+            decrypt_stream(io.BytesIO(truncated), io.BytesIO(), key)
+
+    def test_encrypt_memory_independent_of_payload(self):
+        """流式加密的内存峰值只与帧大小有关，与文件大小无关"""
+        frame_size = 64 * 1024
+        src = io.BytesIO(os.urandom(8 * 1024 * 1024))
+        suite = get_suite('AES-256-GCM')
+        with open(os.devnull, 'wb') as sink:
+            tracemalloc.start()
+            try:
+                encrypt_stream(src, sink, suite, suite.generate_key(), frame_size)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        assert peak < 5 * frame_size
+
+    def test_stream_without_readinto(self):
+        """只实现 read 的流也能加解密（短读也要读满一帧）"""
+        class ShortReader:
+            def __init__(self, data):
+                self._src = io.BytesIO(data)
+
+            def read(self, size=-1):
+                return self._src.read(min(size, 100))
+
+        data = os.urandom(3 * FRAME + 7)
+        suite = get_suite('AES-256-GCM')
+        key = suite.generate_key()
+        sealed = io.BytesIO()
+        encrypt_stream(ShortReader(data), sealed, suite, key, FRAME)
+        opened = io.BytesIO()
+        decrypt_stream(ShortReader(sealed.getvalue()), opened, key)
+        assert opened.getvalue() == data
+
+    def test_unknown_suite(self):
+        """未知算法"""
+        with pytest.raises(ValueError):
+            get_suite('ROT13')
+
+    def test_unavailable_suite_reported(self):
+        """底层库不支持的算法不可选"""
+        for suite in SUITES.values():
+            if not suite.available:
+                with pytest.raises(ValueError):
+                    get_suite(suite.name)
+
+    def test_gcm_siv_available(self):
+        """AES-256-GCM-SIV 可用且可往返"""
+        suite = get_suite('AES-256-GCM-SIV')
+        data = os.urandom(2 * FRAME + 7)
+        assert _roundtrip(suite, data)[2] == data
+
+    @pytest.mark.parametrize('name', ['AES-256-GCM', 'ChaCha20-Poly1305', 'AES-256-GCM-SIV'])
+    def test_mapped_file_tamper_and_truncation(self, tmp_path, name):
+        """mmap 解密：篡改或截断的文件报 InvalidTag（而不是关闭映射失败）"""
+        suite = get_suite(name)
+        key = suite.generate_key()
+        sealed = io.BytesIO()
+        prefix, _, _ = encrypt_stream(io.BytesIO(os.urandom(3 * FRAME)), sealed, suite, key, FRAME)
+        path = tmp_path / 'blob.enc'
+
+        path.write_bytes(sealed.getvalue())
+        assert len(decrypt_blob(str(path), wrap_key(key), prefix)) == 3 * FRAME
+
+        tampered = bytearray(sealed.getvalue())
+        tampered[HEADER_SIZE + FRAME + TAG_SIZE + 3] ^= 1
+        path.write_bytes(bytes(tampered))
+        with pytest.raises(InvalidTag):
+            decrypt_blob(str(path), wrap_key(key), prefix)
+
+        path.write_bytes(sealed.getvalue()[:HEADER_SIZE + FRAME + TAG_SIZE])
+        with pytest.raises(InvalidTag):
+            decrypt_blob(str(path), wrap_key(key), prefix)
+
+    def test_legacy_blob_still_decrypts(self, tmp_path):
+        """旧格式（单次 AES-GCM，12 字节 IV）仍可解密"""
+        key, iv = AESGCM.generate_key(bit_length=256), os.urandom(12)
+        path = tmp_path / 'legacy.enc'
+        path.write_bytes(AESGCM(key).encrypt(iv, b'legacy content', None))
+        assert decrypt_blob(str(path), wrap_key(key), iv) == b'legacy content'
+
+        path.write_bytes(b'\0' + path.read_bytes()[1:])
+        with pytest.raises(InvalidTag):
+            decrypt_blob(str(path), wrap_key(key), iv)
+
+
+class TestAlgorithmSelection:
+    """加密接口按记录选择算法"""
+
+    def test_encrypt_with_chacha(self, admin_client):
+        """选择 ChaCha20-Poly1305 加密并可解密下载"""
+        response = admin_client.post('/api/encrypt',
+            data={'file': (io.BytesIO(b'chacha secret'), 'c.txt'), 'algorithm': 'ChaCha20-Poly1305'},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 200
+        key_id = response.get_json()['key_id']
+
+        keys = admin_client.get('/api/keys').get_json()['keys']
+        assert keys[0]['algorithm'] == 'ChaCha20-Poly1305'
+
+        result = admin_client.post('/api/decrypt', json={'key_id': key_id}).get_json()
+        assert admin_client.get(result['download_url']).data == b'chacha secret'
+
+    def test_digests_computed_while_encrypting(self, admin_client):
+        """加密时同一遍算出明文 SHA-256 与密文 BLAKE2b，并标出重复内容"""
+        content = os.urandom(200 * 1024)
+        first = admin_client.post('/api/encrypt',
+            data={'file': (io.BytesIO(content), 'd1.txt')},
+            content_type='multipart/form-data'
+        ).get_json()
+        assert first['content_sha256'] == hashlib.sha256(content).hexdigest()
+        assert first['duplicate_of'] is None
+
+        record = KeyRecord.query.get(first['key_id'])
+        with open(record.storage_path, 'rb') as f:
+            assert first['cipher_checksum'] == hashlib.blake2b(f.read(), digest_size=32).hexdigest()
+
+        second = admin_client.post('/api/encrypt',
+            data={'file': (io.BytesIO(content), 'd2.txt')},
+            content_type='multipart/form-data'
+        ).get_json()
+        assert second['duplicate_of'] == first['key_id']
+        assert second['cipher_checksum'] != first['cipher_checksum']
+
+        keys = {k['id']: k for k in admin_client.get('/api/keys').get_json()['keys']}
+        assert keys[first['key_id']]['content_sha256'] == first['content_sha256']
+        assert keys[first['key_id']]['cipher_checksum'] == first['cipher_checksum']
+
+    def test_auto_uses_default_suite(self, app, admin_client):
+        """未指定算法时使用启动时选出的默认算法"""
+        admin_client.post('/api/encrypt',
+            data={'file': (io.BytesIO(b'auto'), 'a.txt')},
+            content_type='multipart/form-data'
+        )
+        keys = admin_client.get('/api/keys').get_json()['keys']
+        assert keys[0]['algorithm'] == app.extensions['cipher_default'].name
+
+    def test_unsupported_algorithm(self, admin_client):
+        """不支持的算法返回 400"""
+        response = admin_client.post('/api/encrypt',
+            data={'file': (io.BytesIO(b'x'), 'x.txt'), 'algorithm': 'DES'},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 400
+        assert response.get_json()['code'] == 'UNSUPPORTED_ALGORITHM'
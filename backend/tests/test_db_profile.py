@@ -0,0 +1,45 @@
+"""
+数据库引擎调优测试
+"""
+import pytest
+from sqlalchemy import text
+
+from extensions import db
+from utils.db_profile import resolve_profile, build_engine_options
+
+
+class TestDbProfile:
+    """DB_PROFILE 配置档测试"""
+
+    def test_auto_profile_from_uri(self):
+        """auto 根据 URI 选择配置档"""
+        assert resolve_profile({'SQLALCHEMY_DATABASE_URI': 'sqlite:///x.db'}) == 'sqlite-wal'
+        assert resolve_profile({'SQLALCHEMY_DATABASE_URI': 'postgresql://db/vault'}) == 'postgres-pooled'
+        assert resolve_profile({'SQLALCHEMY_DATABASE_URI': 'mysql://db/vault'}) == 'default'
+
+    def test_unknown_profile_rejected(self):
+        """未知配置档报错"""
+        with pytest.raises(ValueError):
+            resolve_profile({'DB_PROFILE': 'turbo'})
+
+    def test_postgres_pool_options(self):
+        """PostgreSQL 连接池参数"""
+        options = build_engine_options({
+            'DB_PROFILE': 'postgres-pooled',
+            'DB_POOL_SIZE': 5,
+            'DB_STATEMENT_TIMEOUT_MS': 1500
+        })
+        assert options['pool_size'] == 5
+        assert options['pool_pre_ping'] is True
+        assert 'statement_timeout=1500' in options['connect_args']['options']
+
+    def test_default_profile_has_no_options(self):
+        """default 不做调优"""
+        assert build_engine_options({'DB_PROFILE': 'default'}) == {}
+
+    def test_sqlite_pragmas_applied(self, app):
+        """SQLite 连接设置了 PRAGMA"""
+        journal_mode = db.session.execute(text('PRAGMA journal_mode')).scalar()
+        assert journal_mode in ('wal', 'memory')
+        assert db.session.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+        assert db.session.execute(text('PRAGMA busy_timeout')).scalar() == app.config['SQLITE_BUSY_TIMEOUT_MS']
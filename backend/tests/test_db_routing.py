@@ -0,0 +1,108 @@
+"""
+只读副本路由测试
+"""
+import pytest
+from sqlalchemy import select
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from config import Config
+from extensions import db
+from models import User, Device
+from utils.db_routing import read_replica
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """主库 + 两个本地 SQLite 副本"""
+    class ReplicaConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        SQLALCHEMY_REPLICA_URIS = [f"sqlite:///{tmp_path / 'replica0.db'}", f"sqlite:///{tmp_path / 'replica1.db'}"]
+        REPLICA_STICKY_SECONDS = 0
+        SESSION_FILE_DIR = str(tmp_path / 'sessions')
+
+    app = create_app(ReplicaConfig)
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        replicas = [db.engines['replica_0'], db.engines['replica_1']]
+        for replica in replicas:
+            db.metadata.create_all(replica)
+
+        # 各库都有管理员；设备只存在于副本，用于区分数据来源
+        for engine in [db.engine] + replicas:
+            with engine.begin() as conn:
+                conn.execute(User.__table__.insert(), [{
+                    'username': 'testadmin',
+                    'password_hash': generate_password_hash('admin123'),
+                    'role': 'admin',
+                    'status': 'active'
+                }])
+        for replica in replicas:
+            with replica.begin() as conn:
+                conn.execute(Device.__table__.insert(), [{
+                    'id': 'DEV-REPLICA', 'name': 'Replica Only', 'ip': '10.0.0.1', 'status': 'trusted'
+                }])
+
+        yield app
+
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+    # 副本绑定的 metadata 注册在全局 db 上，避免影响其它测试的 create_all/drop_all
+    db.metadatas.pop('replica_0', None)
+    db.metadatas.pop('replica_1', None)
+
+
+@pytest.fixture
+def replica_client(replica_app):
+    client = replica_app.test_client()
+    client.post('/api/login', json={'username': 'testadmin', 'password': 'admin123'})
+    return client
+
+
+class TestReadReplicaRouting:
+    """只读端点路由到副本"""
+
+    def test_read_endpoint_uses_replica(self, replica_client):
+        """只读端点读取副本数据"""
+        devices = replica_client.get('/api/devices').get_json()['devices']
+        assert [d['id'] for d in devices] == ['DEV-REPLICA']
+
+    def test_one_replica_per_request(self, replica_app):
+        """同一请求内的所有读取使用同一个副本，不同请求轮流使用各副本"""
+        @read_replica
+        def view():
+            return [db.session.get_bind(clause=select(Device.id)) for _ in range(4)]
+
+        chosen = set()
+        for _ in range(2):
+            with replica_app.test_request_context():
+                binds = view()
+                assert len(set(binds)) == 1
+                chosen.add(binds[0])
+        assert chosen == {db.engines['replica_0'], db.engines['replica_1']}
+
+    def test_writes_go_to_primary(self, replica_app, replica_client):
+        """写操作始终写入主库"""
+        response = replica_client.post('/api/devices', json={'name': 'Primary Device'})
+        assert response.status_code == 201
+
+        with db.engine.connect() as conn:
+            names = [row.name for row in conn.execute(Device.__table__.select())]
+        assert names == ['Primary Device']
+
+    def test_sticky_after_own_write(self, replica_app, replica_client):
+        """自己写入后的粘滞窗口内读主库"""
+        replica_app.config['REPLICA_STICKY_SECONDS'] = 60
+        replica_client.post('/api/devices', json={'name': 'Primary Device'})
+
+        devices = replica_client.get('/api/devices').get_json()['devices']
+        assert [d['name'] for d in devices] == ['Primary Device']
+
+    def test_no_replica_configured(self, admin_client):
+        """未配置副本时只读端点照常工作"""
+        response = admin_client.get('/api/devices')
+        assert response.status_code == 200
+        assert len(response.get_json()['devices']) == 1
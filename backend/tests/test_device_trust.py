@@ -0,0 +1,168 @@
+"""
+设备信任索引与请求校验测试
+"""
+import io
+import sys
+import threading
+
+from models import AuditLog
+from utils.device_trust import DeviceIndex, parse_network
+
+
+class TestDeviceIndex:
+    """最长前缀匹配索引测试"""
+
+    def test_longest_prefix_wins(self):
+        """网段内单独吊销的地址优先于整段信任"""
+        index = DeviceIndex()
+        index.add('LAN', '10.1.0.0/16', 'trusted')
+        index.add('BAD', '10.1.2.3', 'revoked')
+        assert index.lookup('10.1.9.9') == ('LAN', 'trusted')
+        assert index.lookup('10.1.2.3') == ('BAD', 'revoked')
+        assert index.lookup('10.2.0.1') is None
+
+    def test_incremental_update_and_remove(self):
+        """状态变更与删除立即生效（包括已缓存的查询结果）"""
+        index = DeviceIndex()
+        index.add('D1', '192.168.1.5', 'pending')
+        assert index.lookup('192.168.1.5') == ('D1', 'pending')
+        index.add('D1', '192.168.1.5', 'trusted')
+        assert index.lookup('192.168.1.5') == ('D1', 'trusted')
+        index.add('D1', '192.168.2.0/24', 'trusted')
+        assert index.lookup('192.168.1.5') is None
+        index.remove('D1')
+        assert index.lookup('192.168.2.7') is None
+        assert len(index) == 0
+
+    def test_ipv6_and_mapped_addresses(self):
+        """IPv6 网段匹配，IPv4 映射地址按 IPv4 处理"""
+        index = DeviceIndex()
+        index.add('V6', '2001:db8::/32', 'trusted')
+        index.add('V4', '172.16.0.1', 'trusted')
+        assert index.lookup('2001:db8:1::5') == ('V6', 'trusted')
+        assert index.lookup('::ffff:172.16.0.1') == ('V4', 'trusted')
+        assert index.lookup('not-an-ip') is None
+
+    def test_same_network_takes_strictest_status(self):
+        """同一地址登记多台设备时取最严格的状态"""
+        index = DeviceIndex()
+        index.add('A', '10.0.0.1', 'trusted')
+        index.add('B', '10.0.0.1/32', 'revoked')
+        assert index.lookup('10.0.0.1') == ('B', 'revoked')
+
+    def test_unparseable_ip_not_indexed(self):
+        """Unknown 之类的 IP 不进入索引"""
+        index = DeviceIndex()
+        index.add('X', 'Unknown', 'trusted')
+        assert len(index) == 0
+        assert parse_network('Unknown') is None
+        assert parse_network('10.0.0.7/24') == (4, 24, 0x0A0000)
+
+
+    def test_lookup_during_concurrent_updates(self):
+        """管理员增删设备的同时查询不会抛出异常，也不会看到写到一半的索引"""
+        index = DeviceIndex()
+        index.add('LAN', '10.9.0.0/16', 'trusted')
+        stop = threading.Event()
+        errors = []
+
+        def writer(n):
+            try:
+                while not stop.is_set():
+                    for i in range(50):
+                        index.add(f'W{n}-{i}', f'10.9.{n}.{i}/{24 + i % 9}', 'revoked')
+                    for i in range(50):
+                        index.remove(f'W{n}-{i}')
+            except Exception as e:  # pragma: no cover - 失败时记录
+                errors.append(e)
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    for i in range(256):
+                        match = index.lookup(f'10.9.{i % 4}.{i}')
+                        assert match is not None and match[1] in ('trusted', 'revoked')
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+        threads += [threading.Thread(target=reader) for _ in range(4)]
+        # 缩短线程切换间隔，让读写交错在表更新的中途
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for t in threads:
+                t.start()
+            stop.wait(1.0)
+            stop.set()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setswitchinterval(interval)
+        assert errors == []
+        assert len(index) == 1
+        assert index.lookup('10.9.1.1') == ('LAN', 'trusted')
+
+def _encrypt(client, remote_addr):
+    return client.post('/api/encrypt',
+        data={'file': (io.BytesIO(b'device'), 'd.txt')},
+        content_type='multipart/form-data',
+        environ_base={'REMOTE_ADDR': remote_addr}
+    )
+
+
+class TestDeviceEnforcement:
+    """加密 / 解密接口的设备校验测试"""
+
+    def test_disabled_by_default(self, admin_client):
+        """未开启强制校验时不检查来源设备"""
+        assert _encrypt(admin_client, '203.0.113.9').status_code == 200
+
+    def test_only_trusted_devices_allowed(self, admin_client, app):
+        """开启后只有受信任设备可以加密，拒绝时写审计日志"""
+        app.config['DEVICE_TRUST_ENFORCE'] = True
+        assert _encrypt(admin_client, '192.168.1.100').status_code == 200
+
+        response = _encrypt(admin_client, '203.0.113.9')
+        assert response.status_code == 403
+        assert response.get_json()['code'] == 'DEVICE_NOT_TRUSTED'
+        assert AuditLog.query.filter_by(action_type='DEVICE_DENIED').count() == 1
+
+    def test_device_changes_apply_immediately(self, admin_client, app):
+        """新增、吊销、删除设备后索引立即更新"""
+        app.config['DEVICE_TRUST_ENFORCE'] = True
+        device_id = admin_client.post('/api/devices', json={
+            'name': 'Office', 'ip': '198.51.100.0/24', 'status': 'trusted'
+        }).get_json()['device']['id']
+        assert _encrypt(admin_client, '198.51.100.20').status_code == 200
+
+        admin_client.patch(f'/api/devices/{device_id}/status', json={'status': 'revoked'})
+        assert _encrypt(admin_client, '198.51.100.20').status_code == 403
+
+        admin_client.patch(f'/api/devices/{device_id}/status', json={'status': 'trusted'})
+        admin_client.delete(f'/api/devices/{device_id}')
+        assert _encrypt(admin_client, '198.51.100.20').status_code == 403
+
+    def test_decrypt_checked(self, admin_client, app):
+        """解密同样需要受信任设备"""
+        key_id = _encrypt(admin_client, '192.168.1.100').get_json()['key_id']
+        app.config['DEVICE_TRUST_ENFORCE'] = True
+        response = admin_client.post('/api/decrypt', json={'key_id': key_id},
+                                     environ_base={'REMOTE_ADDR': '203.0.113.9'})
+        assert response.status_code == 403
+
+    def test_invalid_device_ip_rejected(self, admin_client):
+        """添加设备时 IP 必须是地址或 CIDR"""
+        response = admin_client.post('/api/devices', json={'name': 'Bad', 'ip': '10.0.0.300'})
+        assert response.status_code == 400
+
+    def test_list_filters(self, admin_client):
+        """按状态过滤，按 IP 查出匹配的设备"""
+        admin_client.post('/api/devices', json={'name': 'Lab', 'ip': '10.9.0.0/16', 'status': 'pending'})
+        pending = admin_client.get('/api/devices?status=pending').get_json()['devices']
+        assert [d['name'] for d in pending] == ['Lab']
+
+        matched = admin_client.get('/api/devices?ip=10.9.3.4').get_json()['devices']
+        assert [d['name'] for d in matched] == ['Lab']
+        assert admin_client.get('/api/devices?ip=8.8.8.8').get_json()['devices'] == []
+        assert admin_client.get('/api/devices?status=bogus').status_code == 400
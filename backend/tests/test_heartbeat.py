@@ -0,0 +1,148 @@
+"""
+设备心跳合并写回测试
+"""
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import Device
+from utils.heartbeat import DeviceView, flush_heartbeats, get_view
+
+
+DEVICE_ADDR = {'REMOTE_ADDR': '192.168.1.100'}  # DEV-TEST-001 登记的 IP
+
+
+def _last_active(device_id):
+    db.session.expire_all()
+    return db.session.get(Device, device_id).last_active
+
+
+class TestHeartbeat:
+    """心跳接收与批量写回测试"""
+
+    def test_heartbeats_coalesced_until_flush(self, admin_client):
+        """多次心跳只在内存中合并，写回时一条记录只更新一次"""
+        before = _last_active('DEV-TEST-001')
+        for _ in range(3):
+            response = admin_client.post('/api/devices/heartbeat', json={'device_id': 'DEV-TEST-001'},
+                                         environ_base=DEVICE_ADDR)
+            assert response.status_code == 202
+            assert response.get_json()['accepted'] == 1
+        assert _last_active('DEV-TEST-001') == before
+
+        assert flush_heartbeats() == 1
+        assert _last_active('DEV-TEST-001') > before
+        assert flush_heartbeats() == 0
+
+    def test_batch_rejects_unknown_devices(self, admin_client):
+        """批量心跳中未登记的设备计为拒绝，不回显设备ID"""
+        response = admin_client.post('/api/devices/heartbeat', json={'heartbeats': [
+            {'device_id': 'DEV-TEST-001', 'timestamp': '2030-01-01T00:00:00Z'},
+            {'device_id': 'DEV-NOPE'}
+        ]}, environ_base=DEVICE_ADDR)
+        data = response.get_json()
+        assert (data['accepted'], data['rejected']) == (1, 1)
+        assert 'DEV-NOPE' not in response.get_data(as_text=True)
+
+        # 晚于服务器时间的时间戳按服务器时间计
+        flush_heartbeats()
+        assert _last_active('DEV-TEST-001') <= datetime.utcnow()
+
+    def test_heartbeat_must_come_from_device_address(self, admin_client):
+        """来源地址不在设备登记的 IP / 网段内时拒绝，结果与未登记设备一致"""
+        before = _last_active('DEV-TEST-001')
+        for addr in ('127.0.0.1', '192.168.1.101'):
+            data = admin_client.post('/api/devices/heartbeat', json={'device_id': 'DEV-TEST-001'},
+                                     environ_base={'REMOTE_ADDR': addr}).get_json()
+            assert (data['accepted'], data['rejected']) == (0, 1)
+        unknown = admin_client.post('/api/devices/heartbeat', json={'device_id': 'DEV-NOPE'},
+                                    environ_base=DEVICE_ADDR).get_json()
+        assert (unknown['accepted'], unknown['rejected']) == (0, 1)
+        assert flush_heartbeats() == 0
+        assert _last_active('DEV-TEST-001') == before
+
+    def test_network_device_and_revoked_device(self, admin_client):
+        """网段登记的设备接受段内地址；吊销后不再接受心跳"""
+        device = admin_client.post('/api/devices', json={'name': 'LAN', 'ip': '10.20.0.0/16', 'status': 'trusted'}).get_json()['device']
+        beat = {'device_id': device['id']}
+        lan = {'REMOTE_ADDR': '10.20.3.4'}
+        assert admin_client.post('/api/devices/heartbeat', json=beat, environ_base=lan).get_json()['accepted'] == 1
+        admin_client.patch(f"/api/devices/{device['id']}/status", json={'status': 'revoked'})
+        assert admin_client.post('/api/devices/heartbeat', json=beat, environ_base=lan).get_json()['rejected'] == 1
+
+    def test_validation(self, admin_client, app):
+        """缺少 device_id、时间格式错误或超过批量上限时拒绝"""
+        app.config['HEARTBEAT_MAX_BATCH'] = 1
+        assert admin_client.post('/api/devices/heartbeat', json={'heartbeats': [
+            {'device_id': 'DEV-TEST-001'}, {'device_id': 'DEV-TEST-001'}]}).status_code == 400
+        assert admin_client.post('/api/devices/heartbeat', json={}).status_code == 400
+        assert admin_client.post('/api/devices/heartbeat', json={
+            'device_id': 'DEV-TEST-001', 'timestamp': 'yesterday'}).status_code == 400
+        assert admin_client.post('/api/devices/heartbeat', json={'heartbeats': []}).status_code == 400
+
+    def test_requires_login(self, client):
+        assert client.post('/api/devices/heartbeat', json={'device_id': 'DEV-TEST-001'}).status_code == 401
+
+    def test_deleted_device_not_flushed(self, admin_client):
+        """删除设备后丢弃其未写回的心跳"""
+        device_id = admin_client.post('/api/devices', json={'name': 'Tmp', 'ip': '10.0.0.9'}).get_json()['device']['id']
+        assert admin_client.post('/api/devices/heartbeat', json={'device_id': device_id},
+                                 environ_base={'REMOTE_ADDR': '10.0.0.9'}).get_json()['accepted'] == 1
+        admin_client.delete(f'/api/devices/{device_id}')
+        assert flush_heartbeats() == 0
+
+    def test_list_and_dashboard_use_memory_view(self, admin_client, app):
+        """设备列表与仪表盘读取内存视图中的最近心跳和失联状态"""
+        view = get_view()
+        view.beat('DEV-TEST-001', datetime.utcnow() + timedelta(seconds=5))
+        listed = admin_client.get('/api/devices').get_json()['devices'][0]
+        assert listed['stale'] is False
+        assert datetime.fromisoformat(listed['last_active']) > _last_active('DEV-TEST-001')
+
+        admin_client.post('/api/devices', json={'name': 'New', 'ip': '10.0.0.8', 'status': 'pending'})
+        devices = admin_client.get('/api/dashboard/stats').get_json()['devices']
+        assert (devices['total'], devices['trusted'], devices['pending']) == (2, 1, 1)
+        assert devices['stale'] == 0
+
+        app.config['DEVICE_STALE_SECONDS'] = -60
+        assert admin_client.get('/api/dashboard/stats').get_json()['devices']['stale'] == 2
+
+
+class TestDeviceView:
+    """内存视图测试"""
+
+    def test_reload_keeps_unflushed_heartbeats(self):
+        """从数据库重新加载时保留尚未写回的更新心跳"""
+        old, new = datetime(2026, 1, 1), datetime(2026, 1, 2)
+        view = DeviceView()
+        view.load([('D1', 'trusted', old)])
+        view.beat('D1', new)
+        view.load([('D1', 'revoked', old)])
+        assert view.last_seen('D1') == new
+        assert view.drain() == {'D1': new}
+
+    def test_stale_counts(self):
+        now = datetime(2026, 1, 1, 12, 0)
+        view = DeviceView()
+        view.load([('A', 'trusted', now - timedelta(minutes=1)),
+                   ('B', 'trusted', now - timedelta(hours=1)),
+                   ('C', 'pending', None)])
+        stats = view.stats(300, now=now)
+        assert stats == {'total': 3, 'trusted': 2, 'pending': 1, 'revoked': 0, 'stale': 2}
+
+    def test_restore_after_failed_flush(self):
+        """写回失败后放回，不覆盖期间收到的更新心跳"""
+        t1, t2 = datetime(2026, 1, 1), datetime(2026, 1, 2)
+        view = DeviceView()
+        view.load([('D1', 'trusted', None)])
+        view.beat('D1', t1)
+        pending = view.drain()
+        view.beat('D1', t2)
+        view.restore(pending)
+        assert view.drain() == {'D1': t2}
+
+    def test_flush_ignores_rows_deleted_elsewhere(self, app):
+        """其他进程已删除的设备写回时被忽略"""
+        view = get_view()
+        view.track('DEV-GONE', 'trusted', None)
+        view.beat('DEV-GONE', datetime.utcnow())
+        assert flush_heartbeats() == 1
@@ -0,0 +1,112 @@
+"""
+响应压缩与条件 GET 测试
+"""
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import Device, TableVersion
+
+
+def _version(name):
+    db.session.expire_all()
+    return db.session.get(TableVersion, name).version
+
+
+class TestCompression:
+    """响应压缩测试"""
+
+    def test_gzip_large_json(self, admin_client, app):
+        app.config['COMPRESS_MIN_SIZE'] = 0
+        response = admin_client.get('/api/logs', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert json.loads(gzip.decompress(response.data))['success'] is True
+
+    def test_small_or_not_accepted_left_alone(self, admin_client, app):
+        assert 'Content-Encoding' not in admin_client.get('/api/me', headers={'Accept-Encoding': 'gzip'}).headers
+        app.config['COMPRESS_MIN_SIZE'] = 0
+        assert 'Content-Encoding' not in admin_client.get('/api/logs').headers
+        assert 'Content-Encoding' not in admin_client.get('/api/logs', headers={'Accept-Encoding': 'identity'}).headers
+
+    def test_streamed_list_compressed(self, admin_client, app):
+        """流式输出的列表逐块压缩"""
+        app.config.update(COMPRESS_MIN_SIZE=0, SERIALIZE_STREAM_THRESHOLD=0, SERIALIZE_CHUNK_ROWS=1)
+        plain = admin_client.get('/api/logs?per_page=5').get_json()
+        response = admin_client.get('/api/logs?per_page=5', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(response.data)) == plain
+
+    def test_downloads_never_compressed(self, admin_client, app):
+        """解密下载与打包下载不压缩"""
+        app.config['COMPRESS_MIN_SIZE'] = 0
+        key_id = admin_client.post('/api/encrypt',
+            data={'file': (io.BytesIO(b'x' * 4096), 'a.txt')},
+            content_type='multipart/form-data'
+        ).get_json()['key_id']
+        url = admin_client.post('/api/decrypt', json={'key_id': key_id}).get_json()['download_url']
+        assert 'Content-Encoding' not in admin_client.get(url, headers={'Accept-Encoding': 'gzip'}).headers
+        bundle = admin_client.post('/api/download/bundle', json={'key_ids': [key_id]},
+                                   headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in bundle.headers
+
+
+class TestConditionalGet:
+    """ETag / Last-Modified 测试"""
+
+    def test_unchanged_poll_returns_304(self, admin_client):
+        first = admin_client.get('/api/keys')
+        etag = first.headers['ETag']
+        assert etag.startswith('W/')
+        assert 'no-cache' in first.headers['Cache-Control']
+
+        second = admin_client.get('/api/keys', headers={'If-None-Match': etag})
+        assert second.status_code == 304
+        assert second.data == b''
+        assert second.headers['ETag'] == etag
+
+    def test_write_changes_etag(self, admin_client):
+        etag = admin_client.get('/api/keys').headers['ETag']
+        before = _version('key_records')
+        admin_client.post('/api/encrypt',
+            data={'file': (io.BytesIO(b'new'), 'b.txt')},
+            content_type='multipart/form-data'
+        )
+        assert _version('key_records') == before + 1
+        response = admin_client.get('/api/keys', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def test_rolled_back_write_keeps_version(self, app):
+        before = _version('devices')
+        db.session.add(Device(id='DEV-RB', name='x', ip='10.9.9.9'))
+        db.session.flush()
+        db.session.rollback()
+        assert _version('devices') == before
+
+    def test_etag_depends_on_caller_and_format(self, client, admin_client):
+        """不同用户、不同参数或格式的 ETag 不同，不会互相命中"""
+        admin_etag = admin_client.get('/api/logs').headers['ETag']
+        assert admin_client.get('/api/logs?per_page=5').headers['ETag'] != admin_etag
+        columnar = admin_client.get('/api/logs', headers={'Accept': 'application/vnd.qrng.columnar+json'})
+        assert columnar.headers['ETag'] != admin_etag
+
+        client.post('/api/logout')
+        client.post('/api/login', json={'username': 'testuser', 'password': 'user123'})
+        assert client.get('/api/logs', headers={'If-None-Match': admin_etag}).status_code == 200
+
+    def test_if_modified_since(self, admin_client, app):
+        """变更超过一秒后提供 Last-Modified，可用 If-Modified-Since 重新验证"""
+        TableVersion.query.update({'updated_at': datetime.utcnow() - timedelta(minutes=5)})
+        db.session.commit()
+
+        response = admin_client.get('/api/users')
+        last_modified = response.headers.get('Last-Modified')
+        assert last_modified
+        assert admin_client.get('/api/users', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+    def test_disabled(self, admin_client, app):
+        app.config['HTTP_CACHE_ENABLED'] = False
+        assert 'ETag' not in admin_client.get('/api/keys').headers
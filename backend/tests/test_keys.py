@@ -189,3 +189,88 @@ class TestKeySecurity:
         # 尝试路径遍历
         response = admin_client.get(f'/api/download/{key_id}?token=../../../etc/passwd')
         assert response.status_code == 400
+
+
+class TestBundleDownload:
+    """批量打包下载测试"""
+    
+    def _encrypt(self, client, content, name):
+        response = client.post('/api/encrypt',
+            data={'file': (io.BytesIO(content), name), 'mode': 'real'},
+            content_type='multipart/form-data'
+        )
+        return response.get_json()['key_id']
+    
+    def test_bundle_zip_contents(self, admin_client):
+        """打包下载得到包含全部明文的 ZIP"""
+        import zipfile
+        files = {'a.txt': b'alpha' * 1000, 'b.txt': b'bravo', 'c.txt': b''}
+        key_ids = [self._encrypt(admin_client, content, name) for name, content in files.items()]
+        # 同名文件在归档中去重
+        key_ids.append(self._encrypt(admin_client, b'second', 'a.txt'))
+        
+        response = admin_client.post('/api/download/bundle', json={'key_ids': key_ids})
+        assert response.status_code == 200
+        assert response.mimetype == 'application/zip'
+        
+        archive = zipfile.ZipFile(io.BytesIO(response.data))
+        assert archive.testzip() is None
+        contents = {name: archive.read(name) for name in archive.namelist()}
+        assert contents == {**files, 'a (1).txt': b'second'}
+        for info in archive.infolist():
+            assert info.compress_type == zipfile.ZIP_STORED
+    
+    def test_bundle_large_entry_spooled(self, admin_client, app):
+        """超过内存上限的明文落到临时文件，按块写入归档"""
+        import os
+        import zipfile
+        from extensions import db
+        from models import KeyRecord
+        from utils.vault import SPOOL_SIZE, decrypt_spooled
+        content = os.urandom(SPOOL_SIZE * 2 + 123)
+        key_id = self._encrypt(admin_client, content, 'big.txt')
+
+        record = db.session.get(KeyRecord, key_id)
+        with decrypt_spooled(record.storage_path, record.wrapped_key, record.nonce) as plain:
+            assert plain._rolled and plain.read() == content
+
+        response = admin_client.post('/api/download/bundle', json={'key_ids': [key_id]})
+        archive = zipfile.ZipFile(io.BytesIO(response.data))
+        assert archive.testzip() is None
+        assert archive.read('big.txt') == content
+
+    def test_bundle_increments_decrypt_count(self, admin_client):
+        """打包计入解密次数"""
+        key_id = self._encrypt(admin_client, b'count me', 'count.txt')
+        admin_client.post('/api/download/bundle', json={'key_ids': [key_id]}).get_data()
+        keys = admin_client.get('/api/keys').get_json()['keys']
+        assert keys[0]['decrypt_count'] == 1
+    
+    def test_bundle_forbidden_for_others_keys(self, client):
+        """不能打包他人的文件"""
+        client.post('/api/login', json={'username': 'testadmin', 'password': 'admin123'})
+        key_id = self._encrypt(client, b'admin only', 'admin.txt')
+        client.post('/api/logout')
+        
+        client.post('/api/login', json={'username': 'testuser', 'password': 'user123'})
+        response = client.post('/api/download/bundle', json={'key_ids': [key_id]})
+        assert response.status_code == 404
+        assert response.get_json()['key_ids'] == [key_id]
+    
+    def test_bundle_validation(self, admin_client):
+        """参数校验"""
+        assert admin_client.post('/api/download/bundle', json={}).status_code == 400
+        assert admin_client.post('/api/download/bundle', json={'key_ids': 'KEY-1'}).status_code == 400
+    
+    def test_bundle_reports_failed_entries(self, admin_client, app):
+        """解密失败的条目列在 _errors.txt 中，其余照常输出"""
+        import os
+        import zipfile
+        ok_id = self._encrypt(admin_client, b'fine', 'ok.txt')
+        broken_id = self._encrypt(admin_client, b'gone', 'gone.txt')
+        os.remove(os.path.join(app.config['UPLOAD_FOLDER'], f'{broken_id}.enc'))
+        
+        response = admin_client.post('/api/download/bundle', json={'key_ids': [ok_id, broken_id]})
+        archive = zipfile.ZipFile(io.BytesIO(response.data))
+        assert archive.read('ok.txt') == b'fine'
+        assert broken_id in archive.read('_errors.txt').decode()
@@ -0,0 +1,74 @@
+"""
+存储回收测试
+"""
+import io
+import os
+import time
+
+from utils.sweeper import sweep_temp_files, sweep_orphan_blobs, Throttle
+
+
+def _write(path, size, age_seconds=0):
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    if age_seconds:
+        past = time.time() - age_seconds
+        os.utime(path, (past, past))
+
+
+class TestSweeper:
+    """临时文件与孤立密文回收测试"""
+
+    def test_expired_temp_files_removed(self, app):
+        """过期的解密临时文件被删除，新文件保留"""
+        folder = app.config['UPLOAD_FOLDER']
+        _write(os.path.join(folder, 'decrypt_KEY-1_old.txt'), 100, age_seconds=7200)
+        _write(os.path.join(folder, 'decrypt_KEY-2_new.txt'), 100)
+
+        report = sweep_temp_files(folder, max_age_seconds=3600)
+        assert report == {'files': 1, 'bytes': 100, 'errors': 0}
+        assert sorted(os.listdir(folder)) == ['decrypt_KEY-2_new.txt']
+
+    def test_orphan_blobs_removed(self, admin_client, app):
+        """无 KeyRecord 引用的 .enc 被删除，仍被引用的保留"""
+        folder = app.config['UPLOAD_FOLDER']
+        result = admin_client.post('/api/encrypt',
+            data={'file': (io.BytesIO(b'keep me'), 'keep.txt'), 'mode': 'real'},
+            content_type='multipart/form-data'
+        ).get_json()
+        # 把刚加密的密文改成超过宽限期的旧文件
+        kept = os.path.join(folder, f"{result['key_id']}.enc")
+        past = time.time() - 7200
+        os.utime(kept, (past, past))
+        _write(os.path.join(folder, 'KEY-ORPHAN-1.enc'), 256, age_seconds=7200)
+        _write(os.path.join(folder, 'KEY-ORPHAN-2.enc'), 256)  # 宽限期内
+
+        report = sweep_orphan_blobs(folder, min_age_seconds=3600, batch_size=1)
+        assert report['files'] == 1
+        assert report['bytes'] == 256
+        assert os.path.exists(kept)
+        assert os.path.exists(os.path.join(folder, 'KEY-ORPHAN-2.enc'))
+
+    def test_sweep_endpoint(self, admin_client, app):
+        """管理员触发回收并获得报告"""
+        folder = app.config['UPLOAD_FOLDER']
+        _write(os.path.join(folder, 'decrypt_KEY-3_old.txt'), 10, age_seconds=7200)
+        response = admin_client.post('/api/maintenance/sweep')
+        assert response.status_code == 200
+        report = response.get_json()['report']
+        assert report['temp']['files'] == 1
+        assert report['reclaimed_bytes'] == 10
+
+        logs = admin_client.get('/api/logs?action_type=SYSTEM_SWEEP').get_json()['logs']
+        assert len(logs) == 1
+
+    def test_sweep_endpoint_admin_only(self, user_client):
+        """普通用户无权触发"""
+        assert user_client.post('/api/maintenance/sweep').status_code == 403
+
+    def test_throttle_limits_rate(self):
+        """限速器按字节数休眠"""
+        throttle = Throttle(bytes_per_sec=1000)
+        started = time.monotonic()
+        throttle.consume(100)
+        assert time.monotonic() - started >= 0.09
@@ -0,0 +1,69 @@
+"""
+指标端点测试
+"""
+import io
+
+from utils.metrics import Histogram, HTTP_REQUESTS, CRYPTO_BYTES
+
+SCRAPE = {'Authorization': 'Bearer scrape-secret'}
+
+
+class TestMetrics:
+    """/metrics 与请求埋点测试"""
+
+    def test_metrics_endpoint(self, app, client):
+        """携带令牌即可采集，无需登录"""
+        app.config['METRICS_TOKEN'] = 'scrape-secret'
+        response = client.get('/metrics', headers=SCRAPE)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        body = response.get_data(as_text=True)
+        for name in ('qrng_http_request_duration_seconds', 'qrng_http_requests_in_flight',
+                     'qrng_db_queries_per_request', 'qrng_crypto_bytes_total',
+                     'qrng_audit_queue_depth', 'qrng_temp_files'):
+            assert f'# TYPE {name}' in body
+
+    def test_metrics_token(self, app, client):
+        """需要 Bearer 认证"""
+        app.config['METRICS_TOKEN'] = 'scrape-secret'
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        assert client.get('/metrics', headers=SCRAPE).status_code == 200
+
+    def test_closed_without_token(self, app, client):
+        """未配置令牌时端点不开放"""
+        app.config['METRICS_TOKEN'] = None
+        assert client.get('/metrics').status_code == 404
+        assert client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code == 404
+
+    def test_route_counter(self, app, admin_client):
+        """按蓝图和路由模板计数"""
+        labels = dict(blueprint='keys', route='/api/keys', method='GET', status='200')
+        before = HTTP_REQUESTS.value(**labels)
+        admin_client.get('/api/keys')
+        assert HTTP_REQUESTS.value(**labels) == before + 1
+
+        app.config['METRICS_TOKEN'] = 'scrape-secret'
+        body = admin_client.get('/metrics', headers=SCRAPE).get_data(as_text=True)
+        assert 'qrng_db_queries_per_request_count{blueprint="keys",route="/api/keys"}' in body
+
+    def test_crypto_bytes(self, admin_client):
+        """加密字节数计数"""
+        before = CRYPTO_BYTES.value(operation='encrypt', algorithm='AES-256-GCM')
+        admin_client.post('/api/encrypt',
+            data={'file': (io.BytesIO(b'x' * 1000), 'metrics.txt'), 'algorithm': 'AES-256-GCM', 'mode': 'real'},
+            content_type='multipart/form-data'
+        )
+        assert CRYPTO_BYTES.value(operation='encrypt', algorithm='AES-256-GCM') == before + 1000
+
+    def test_histogram_render(self):
+        """直方图按累计桶输出"""
+        histogram = Histogram('test_latency', 'test', ('route',), buckets=(0.1, 1.0))
+        histogram.observe(0.05, route='/a')
+        histogram.observe(0.5, route='/a')
+        histogram.observe(5, route='/a')
+        lines = histogram.render()
+        assert 'test_latency_bucket{route="/a",le="0.1"} 1' in lines
+        assert 'test_latency_bucket{route="/a",le="1.0"} 2' in lines
+        assert 'test_latency_bucket{route="/a",le="+Inf"} 3' in lines
+        assert 'test_latency_count{route="/a"} 3' in lines
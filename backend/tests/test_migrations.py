@@ -0,0 +1,136 @@
+"""
+数据库迁移测试（旧版文本列 -> 二进制 / 整数列）
+"""
+import os
+import sqlite3
+import tempfile
+
+import pytest
+import sqlalchemy as sa
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from flask_migrate import upgrade, downgrade
+
+from app import create_app
+from config import Config
+from extensions import db
+from models import KeyRecord, StorageUsage
+from utils.vault import decrypt_blob
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+OLD_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, password_hash VARCHAR(128),
+    name VARCHAR(80), role VARCHAR(20), department VARCHAR(80), status VARCHAR(20), created_at DATETIME
+);
+CREATE TABLE key_records (
+    id VARCHAR(50) PRIMARY KEY, owner VARCHAR(80) NOT NULL, file_name VARCHAR(255), file_size VARCHAR(20),
+    algorithm VARCHAR(20), key_type VARCHAR(20), created_at DATETIME, key_fingerprint VARCHAR(64),
+    decrypt_count INTEGER, storage_path VARCHAR(255), iv VARCHAR(255), key_hex VARCHAR(255)
+);
+CREATE TABLE audit_logs (
+    id INTEGER PRIMARY KEY, user VARCHAR(80), action_type VARCHAR(50), message VARCHAR(255), detail TEXT,
+    level VARCHAR(20), timestamp DATETIME, ip_address VARCHAR(45), user_agent VARCHAR(255)
+);
+CREATE TABLE devices (
+    id VARCHAR(50) PRIMARY KEY, name VARCHAR(80), ip VARCHAR(45), status VARCHAR(20), last_active DATETIME
+);
+"""
+
+
+@pytest.fixture
+def workdir():
+    with tempfile.TemporaryDirectory() as path:
+        yield path
+
+
+def _make_app(db_path):
+    class MigrationConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+    return create_app(MigrationConfig)
+
+
+def _legacy_database(workdir):
+    """按旧表结构建库，写入一条真实的单次 AES-GCM 加密文件记录"""
+    db_path = os.path.join(workdir, 'legacy.db')
+    key, iv = os.urandom(32), os.urandom(12)
+    storage_path = os.path.join(workdir, 'KEY-1.enc')
+    with open(storage_path, 'wb') as f:
+        f.write(AESGCM(key).encrypt(iv, b'legacy plaintext', None))
+
+    wrapped_iv, wrapped_ct = os.urandom(12), os.urandom(80)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(OLD_SCHEMA)
+    conn.execute("INSERT INTO users (id, username, role, department, status) "
+                 "VALUES (1, 'alice', 'user', 'R&D', 'active')")
+    conn.executemany(
+        "INSERT INTO key_records (id, owner, file_name, file_size, algorithm, decrypt_count, storage_path, iv, key_hex) "
+        "VALUES (?, 'alice', ?, ?, 'AES-256-GCM', 0, ?, ?, ?)", [
+            ('KEY-1', 'a.txt', '1.20 MB', storage_path, iv.hex(), key.hex()),
+            ('KEY-2', 'b.txt', '16 KB', None, wrapped_iv.hex(), f'{wrapped_iv.hex()}:{wrapped_ct.hex()}'),
+            ('KEY-3', 'c.txt', 'Unknown', None, None, None),
+        ])
+    conn.commit()
+    conn.close()
+    return db_path, key, wrapped_iv + wrapped_ct
+
+
+class TestMigrations:
+    """Alembic 迁移测试"""
+
+    def test_upgrade_converts_legacy_rows(self, workdir, monkeypatch):
+        """旧文本列转换为二进制 / 整数，旧文件仍可解密，索引与配额计数器就位"""
+        monkeypatch.setenv('MIGRATION_BATCH_SIZE', '2')
+        db_path, key, wrapped = _legacy_database(workdir)
+        app = _make_app(db_path)
+
+        with app.app_context():
+            upgrade(directory=MIGRATIONS)
+            db.session.remove()
+
+            first = db.session.get(KeyRecord, 'KEY-1')
+            assert first.file_size == int(1.2 * 1024 * 1024)
+            assert isinstance(first.nonce, bytes) and len(first.nonce) == 12
+            assert first.wrapped_key == b'\x00' + key
+            assert decrypt_blob(first.storage_path, first.wrapped_key, first.nonce) == b'legacy plaintext'
+
+            second = db.session.get(KeyRecord, 'KEY-2')
+            assert second.file_size == 16 * 1024
+            assert second.wrapped_key == b'\x02' + wrapped
+            assert db.session.get(KeyRecord, 'KEY-3').file_size is None
+
+            inspector = sa.inspect(db.engine)
+            columns = {c['name'] for c in inspector.get_columns('key_records')}
+            assert not columns & {'iv', 'key_hex', 'file_size_bytes'}
+            indexes = {i['name'] for i in inspector.get_indexes('key_records')}
+            assert {'ix_key_records_owner_created_at', 'ix_key_records_created_at'} <= indexes
+            indexes = {i['name'] for i in inspector.get_indexes('audit_logs')}
+            assert {'ix_audit_logs_timestamp', 'ix_audit_logs_user_timestamp'} <= indexes
+
+            # 只有带密文文件的记录计入配额
+            usage = db.session.get(StorageUsage, ('department', 'R&D'))
+            assert (usage.bytes_used, usage.files_used) == (first.file_size, 1)
+
+    def test_upgrade_is_idempotent_on_current_schema(self, workdir):
+        """db.create_all() 建出的新库可以直接升级，重复升级无副作用"""
+        app = _make_app(os.path.join(workdir, 'fresh.db'))
+        with app.app_context():
+            upgrade(directory=MIGRATIONS)
+            upgrade(directory=MIGRATIONS)
+            version = db.session.execute(sa.text('SELECT version_num FROM alembic_version')).scalar()
+            assert version == '0008'
+
+    def test_downgrade_restores_text_columns(self, workdir):
+        """降级把二进制列还原为旧的 hex 文本"""
+        db_path, key, wrapped = _legacy_database(workdir)
+        app = _make_app(db_path)
+        with app.app_context():
+            upgrade(directory=MIGRATIONS)
+            downgrade(directory=MIGRATIONS, revision='0002')
+            rows = dict(db.session.execute(sa.text('SELECT id, key_hex FROM key_records')).all())
+            sizes = dict(db.session.execute(sa.text('SELECT id, file_size FROM key_records')).all())
+
+        assert rows['KEY-1'] == key.hex()
+        assert rows['KEY-2'] == f'{wrapped[:12].hex()}:{wrapped[12:].hex()}'
+        assert sizes == {'KEY-1': '1.20 MB', 'KEY-2': '16.00 KB', 'KEY-3': None}
@@ -0,0 +1,170 @@
+"""
+访问策略（行级过滤）测试
+"""
+import io
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models import User, KeyRecord
+
+
+@pytest.fixture
+def org(app):
+    """两个部门：R&D（部门管理员 lead、成员 dev1）与 Sales（成员 rep1）"""
+    users = [
+        User(username='lead', name='Lead', role='dept_admin', department='R&D', status='active'),
+        User(username='dev1', name='Dev', role='user', department='R&D', status='active'),
+        User(username='rep1', name='Rep', role='user', department='Sales', status='active'),
+    ]
+    for user in users:
+        user.password_hash = generate_password_hash('secret1')
+    db.session.add_all(users)
+    db.session.commit()
+    return {u.username: u.id for u in users}
+
+
+def _login(client, username, password='secret1'):
+    client.post('/api/logout')
+    assert client.post('/api/login', json={'username': username, 'password': password}).status_code == 200
+
+
+def _encrypt(client, name):
+    return client.post('/api/encrypt',
+        data={'file': (io.BytesIO(b'policy'), name)},
+        content_type='multipart/form-data'
+    ).get_json()['key_id']
+
+
+class TestKeyVisibility:
+    """密钥记录按角色与部门过滤"""
+
+    def test_department_admin_sees_department_keys(self, client, org):
+        _login(client, 'dev1')
+        dev_key = _encrypt(client, 'dev.txt')
+        _login(client, 'rep1')
+        rep_key = _encrypt(client, 'rep.txt')
+
+        _login(client, 'lead')
+        assert [k['id'] for k in client.get('/api/keys').get_json()['keys']] == [dev_key]
+        assert client.post('/api/decrypt', json={'key_id': dev_key}).status_code == 200
+        # 其他部门的记录与不存在的记录一样返回 404
+        assert client.post('/api/decrypt', json={'key_id': rep_key}).status_code == 404
+
+        _login(client, 'dev1')
+        assert client.post('/api/decrypt', json={'key_id': rep_key}).status_code == 404
+        _login(client, 'testadmin', 'admin123')
+        assert len(client.get('/api/keys').get_json()['keys']) == 2
+
+    def test_bundle_and_download_scoped(self, client, org):
+        _login(client, 'rep1')
+        rep_key = _encrypt(client, 'rep.txt')
+        token = client.post('/api/decrypt', json={'key_id': rep_key}).get_json()['download_url'].split('token=')[1]
+
+        _login(client, 'lead')
+        assert client.get(f'/api/download/{rep_key}?token={token}').status_code == 404
+        response = client.post('/api/download/bundle', json={'key_ids': [rep_key]})
+        assert response.status_code == 404
+
+    def test_bulk_limited_to_department(self, client, org):
+        _login(client, 'dev1')
+        dev_key = _encrypt(client, 'dev.txt')
+        _login(client, 'rep1')
+        rep_key = _encrypt(client, 'rep.txt')
+
+        _login(client, 'lead')
+        # 不能转移给其他部门的用户
+        assert client.post('/api/keys/bulk', json={
+            'action': 'transfer', 'key_ids': [dev_key], 'new_owner': 'rep1', 'async': False}).status_code == 400
+        job = client.post('/api/keys/bulk', json={
+            'action': 'delete', 'key_ids': [dev_key, rep_key], 'async': False}).get_json()['job']
+        assert job['total'] == 1
+        assert db.session.get(KeyRecord, rep_key) is not None
+
+    def test_department_admin_cannot_reach_managers_keys(self, client, org):
+        """同部门的全局管理员、其他部门管理员的密钥不在部门范围内"""
+        for username, role in (('boss', 'admin'), ('lead2', 'dept_admin')):
+            db.session.add(User(username=username, name=username, role=role, department='R&D', status='active',
+                                password_hash=generate_password_hash('secret1')))
+        db.session.commit()
+        _login(client, 'boss')
+        boss_key = _encrypt(client, 'boss.txt')
+        _login(client, 'lead2')
+        lead2_key = _encrypt(client, 'lead2.txt')
+
+        _login(client, 'lead')
+        assert client.get('/api/keys').get_json()['keys'] == []
+        for key_id in (boss_key, lead2_key):
+            assert client.post('/api/decrypt', json={'key_id': key_id}).status_code == 404
+        client.post('/api/keys/bulk', json={
+            'action': 'transfer', 'key_ids': [boss_key, lead2_key], 'new_owner': 'dev1', 'async': False})
+        client.post('/api/keys/bulk', json={'action': 'delete', 'key_ids': [boss_key], 'async': False})
+        assert db.session.get(KeyRecord, boss_key).owner == 'boss'
+        assert db.session.get(KeyRecord, lead2_key).owner == 'lead2'
+
+    def test_plain_user_cannot_bulk(self, client, org):
+        _login(client, 'dev1')
+        assert client.post('/api/keys/bulk', json={'action': 'delete', 'key_ids': ['x']}).status_code == 403
+
+
+class TestUserManagement:
+    """部门管理员管理本部门用户"""
+
+    def test_list_scoped_to_department(self, client, org):
+        _login(client, 'lead')
+        users = client.get('/api/users').get_json()['users']
+        assert sorted(u['username'] for u in users) == ['dev1', 'lead']
+
+    def test_create_forces_department_and_role(self, client, org):
+        _login(client, 'lead')
+        response = client.post('/api/users', json={
+            'username': 'newdev', 'password': 'secret1', 'role': 'admin', 'department': 'Sales'})
+        assert response.status_code == 201
+        user = User.query.filter_by(username='newdev').first()
+        assert (user.role, user.department) == ('user', 'R&D')
+
+    def test_manage_only_plain_department_users(self, client, org):
+        _login(client, 'lead')
+        assert client.patch(f"/api/users/{org['dev1']}", json={'status': 'locked', 'role': 'admin',
+                                                               'department': 'Sales'}).status_code == 200
+        dev = db.session.get(User, org['dev1'])
+        assert (dev.status, dev.role, dev.department) == ('locked', 'user', 'R&D')
+
+        assert client.patch(f"/api/users/{org['rep1']}", json={'status': 'locked'}).status_code == 404
+        assert client.delete(f"/api/users/{org['rep1']}").status_code == 404
+        admin_id = User.query.filter_by(username='testadmin').first().id
+        assert client.delete(f'/api/users/{admin_id}').status_code == 404
+        assert client.delete(f"/api/users/{org['dev1']}").status_code == 200
+
+    def test_import_forced_into_department(self, client, org):
+        _login(client, 'lead')
+        body = 'username,password,department\nimp1,secret1,Sales\n'
+        response = client.post('/api/users/import', data={'file': (io.BytesIO(body.encode()), 'u.csv')},
+                               content_type='multipart/form-data')
+        assert response.status_code == 201
+        assert User.query.filter_by(username='imp1').first().department == 'R&D'
+
+    def test_user_sees_only_self(self, client, org):
+        _login(client, 'dev1')
+        assert client.get('/api/users').status_code == 403
+        assert client.patch(f"/api/users/{org['rep1']}", json={'name': 'x'}).status_code == 404
+        assert client.patch(f"/api/users/{org['dev1']}", json={'name': 'Me'}).status_code == 200
+
+
+class TestLogsAndAdminEndpoints:
+    """日志范围与全局管理接口"""
+
+    def test_logs_scoped_to_department(self, client, org):
+        _login(client, 'rep1')
+        _login(client, 'dev1')
+        _login(client, 'lead')
+        users = {l['user'] for l in client.get('/api/logs?per_page=100').get_json()['logs']}
+        assert 'rep1' not in users and {'dev1', 'lead'} <= users
+
+    def test_dept_admin_not_global_admin(self, client, org):
+        _login(client, 'lead')
+        assert client.post('/api/devices', json={'name': 'x', 'ip': '10.0.0.1'}).status_code == 403
+        assert client.post('/api/maintenance/sweep').status_code == 403
+        assert client.put('/api/quotas/department/R&D', json={'quota_files': 1}).status_code == 403
+        assert client.get('/api/quotas').status_code == 200
@@ -0,0 +1,55 @@
+"""
+请求剖析与慢查询测试
+"""
+from utils.profiling import TraceBuffer, detect_repeated_queries
+
+
+class TestProfiling:
+    """请求剖析测试"""
+
+    def test_profiling_disabled_by_default(self, admin_client):
+        """未开启时请求头无效"""
+        response = admin_client.get('/api/keys', headers={'X-Profile': '1'})
+        assert 'X-Profile-Id' not in response.headers
+
+    def test_profile_by_header(self, app, admin_client):
+        """通过请求头开启并由管理员查看"""
+        app.config['PROFILING_ENABLED'] = True
+        response = admin_client.get('/api/dashboard/stats', headers={'X-Profile': '1'})
+        trace_id = response.headers['X-Profile-Id']
+
+        profiles = admin_client.get('/api/diagnostics/profiles').get_json()['profiles']
+        assert trace_id in [p['id'] for p in profiles]
+
+        trace = admin_client.get(f'/api/diagnostics/profiles/{trace_id}').get_json()['profile']
+        assert trace['path'] == '/api/dashboard/stats'
+        assert trace['query_count'] == len(trace['queries']) > 0
+        assert 'function calls' in trace['profile']
+
+    def test_profiles_admin_only(self, user_client):
+        """普通用户无权查看"""
+        response = user_client.get('/api/diagnostics/profiles')
+        assert response.status_code == 403
+
+    def test_sample_rate(self, app, admin_client):
+        """按采样比例开启"""
+        app.config['PROFILING_ENABLED'] = True
+        app.config['PROFILE_SAMPLE_RATE'] = 1.0
+        response = admin_client.get('/api/keys')
+        assert 'X-Profile-Id' in response.headers
+
+    def test_detect_repeated_queries(self):
+        """重复语句被标记为疑似 N+1"""
+        queries = [{'statement': 'SELECT count(*) FROM key_records WHERE owner = ?', 'duration_ms': 1.0}] * 6
+        queries += [{'statement': 'SELECT * FROM users WHERE id = ?', 'duration_ms': 0.5}]
+        flagged = detect_repeated_queries(queries, threshold=5)
+        assert len(flagged) == 1
+        assert flagged[0]['count'] == 6
+        assert flagged[0]['total_ms'] == 6.0
+
+    def test_trace_buffer_keeps_slowest(self):
+        """环形缓冲只保留最慢的 N 条"""
+        buffer = TraceBuffer(capacity=2)
+        for i, duration in enumerate([5, 50, 1, 20]):
+            buffer.add({'id': str(i), 'duration_ms': duration})
+        assert [t['duration_ms'] for t in buffer.list()] == [50, 20]
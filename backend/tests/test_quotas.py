@@ -0,0 +1,181 @@
+"""
+存储配额测试
+"""
+import io
+import os
+
+import pytest
+
+from extensions import db
+from models import KeyRecord, StorageUsage, User
+from utils.quota import QuotaExceeded, charge
+from utils.sizes import format_size, parse_size
+
+
+def _encrypt(client, name, size):
+    return client.post('/api/encrypt',
+        data={'file': (io.BytesIO(b'q' * size), name)},
+        content_type='multipart/form-data'
+    )
+
+
+def _usage(scope, name):
+    row = db.session.get(StorageUsage, (scope, name), populate_existing=True)
+    return (row.bytes_used, row.files_used) if row else (0, 0)
+
+
+def _set_department(username, department):
+    user = User.query.filter_by(username=username).first()
+    user.department = department
+    db.session.commit()
+
+
+class TestQuotaAccounting:
+    """用量计数器维护测试"""
+
+    def test_encrypt_updates_counters(self, admin_client):
+        """加密时用户与部门计数器同步增加，file_size 为整数字节"""
+        _set_department('testadmin', 'R&D')
+        response = _encrypt(admin_client, 'a.txt', 3000)
+        assert response.status_code == 200
+        assert response.get_json()['file_size_bytes'] == 3000
+        assert response.get_json()['file_size'] == '2.93 KB'
+
+        assert _usage('user', 'testadmin') == (3000, 1)
+        assert _usage('department', 'R&D') == (3000, 1)
+        assert db.session.get(KeyRecord, response.get_json()['key_id']).file_size == 3000
+
+    def test_simulated_records_not_counted(self, admin_client):
+        """模拟加密不占用存储配额，大小字符串解析为字节数"""
+        result = admin_client.post('/api/encrypt/simulate',
+                                   json={'filename': 's.txt', 'filesize': '1.5 KB'}).get_json()
+        assert db.session.get(KeyRecord, result['key_id']).file_size == 1536
+        assert _usage('user', 'testadmin') == (0, 0)
+
+    def test_bulk_delete_and_transfer_adjust_counters(self, admin_client):
+        """批量删除归还配额，转移把用量移给新所有者"""
+        ids = [_encrypt(admin_client, f'{i}.txt', 100).get_json()['key_id'] for i in range(3)]
+        admin_client.post('/api/keys/bulk', json={
+            'action': 'transfer', 'key_ids': ids[:2], 'new_owner': 'testuser', 'async': False})
+        assert _usage('user', 'testadmin') == (100, 1)
+        assert _usage('user', 'testuser') == (200, 2)
+
+        admin_client.post('/api/keys/bulk', json={
+            'action': 'delete', 'filter': {'owner': 'testuser'}, 'async': False})
+        assert _usage('user', 'testuser') == (0, 0)
+
+    def test_department_change_moves_usage(self, admin_client):
+        """用户换部门时用量随之迁移"""
+        _set_department('testadmin', 'Ops')
+        _encrypt(admin_client, 'd.txt', 500)
+        user = User.query.filter_by(username='testadmin').first()
+        admin_client.put(f'/api/users/{user.id}', json={'department': 'Sec'})
+        assert _usage('department', 'Ops') == (0, 0)
+        assert _usage('department', 'Sec') == (500, 1)
+
+    def test_user_cannot_change_own_department(self, user_client):
+        """普通用户不能修改自己的部门（部门决定配额与管理范围）"""
+        _set_department('testuser', 'Ops')
+        user = User.query.filter_by(username='testuser').first()
+        for department in ('', 'Sec'):
+            assert user_client.put(f'/api/users/{user.id}', json={'department': department}).status_code == 200
+            assert db.session.get(User, user.id, populate_existing=True).department == 'Ops'
+
+    def test_delete_user_releases_usage(self, admin_client):
+        """仍有文件的用户不能删除；删除后部门计数器不残留，同名新用户不继承"""
+        user_id = admin_client.post('/api/users', json={
+            'username': 'leaver', 'password': 'secret1', 'department': 'Ops'}).get_json()['user']['id']
+        db.session.add(KeyRecord(id='KEY-LEAVER-1', owner='leaver', file_name='l.txt', file_size=300,
+                                 storage_path='missing.enc'))
+        charge('leaver', 'Ops', 300)
+        db.session.commit()
+
+        response = admin_client.delete(f'/api/users/{user_id}')
+        assert (response.status_code, response.get_json()['code']) == (409, 'HAS_RECORDS')
+
+        admin_client.post('/api/keys/bulk', json={
+            'action': 'transfer', 'key_ids': ['KEY-LEAVER-1'], 'new_owner': 'testadmin', 'async': False})
+        # 计数器与记录不一致时，剩余部分也随用户一起从部门中扣除
+        charge('leaver', 'Ops', 50)
+        db.session.commit()
+        assert admin_client.delete(f'/api/users/{user_id}').status_code == 200
+        assert _usage('department', 'Ops') == (0, 0)
+        assert db.session.get(StorageUsage, ('user', 'leaver')) is None
+
+    def test_dashboard_reads_counters(self, admin_client):
+        """仪表盘存储量来自计数器"""
+        _encrypt(admin_client, 'x.txt', 2048)
+        stats = admin_client.get('/api/dashboard/stats').get_json()
+        assert stats['stats']['storage_bytes'] == 2048
+        assert stats['stats']['storage_used'] == '2.0 KB'
+
+    def test_rebuild_matches_records(self, admin_client):
+        """重建计数器得到与增量维护相同的结果"""
+        _encrypt(admin_client, 'r1.txt', 10)
+        _encrypt(admin_client, 'r2.txt', 20)
+        db.session.query(StorageUsage).update({'bytes_used': 999, 'files_used': 9})
+        db.session.commit()
+
+        assert admin_client.post('/api/quotas/rebuild').status_code == 200
+        assert _usage('user', 'testadmin') == (30, 2)
+
+
+class TestQuotaEnforcement:
+    """配额限制测试"""
+
+    def test_user_quota_blocks_upload(self, admin_client, app):
+        """超出用户配额时拒绝上传，不留下记录和密文"""
+        response = admin_client.put('/api/quotas/user/testadmin', json={'quota_bytes': '1 KB', 'quota_files': 10})
+        assert response.get_json()['quota']['quota_bytes'] == 1024
+
+        assert _encrypt(admin_client, 'ok.txt', 1000).status_code == 200
+        response = _encrypt(admin_client, 'big.txt', 100)
+        assert response.status_code == 403
+        assert response.get_json()['code'] == 'QUOTA_EXCEEDED'
+        assert KeyRecord.query.count() == 1
+        assert len([f for f in os.listdir(app.config['UPLOAD_FOLDER']) if f.endswith('.enc')]) == 1
+
+    def test_department_file_quota(self, admin_client):
+        """部门文件数上限对成员生效"""
+        _set_department('testadmin', 'Legal')
+        admin_client.put('/api/quotas/department/Legal', json={'quota_files': 1})
+        assert _encrypt(admin_client, '1.txt', 1).status_code == 200
+        assert _encrypt(admin_client, '2.txt', 1).status_code == 403
+
+    def test_conditional_charge(self, app):
+        """占用配额是一条带条件的 UPDATE：越过上限时抛出且不修改计数器"""
+        charge('racer', None, 0, 0)
+        db.session.get(StorageUsage, ('user', 'racer')).quota_bytes = 100
+        db.session.commit()
+
+        charge('racer', None, 60)
+        db.session.commit()
+        with pytest.raises(QuotaExceeded):
+            charge('racer', None, 60)
+        db.session.rollback()
+        assert _usage('user', 'racer') == (60, 1)
+
+    def test_quota_admin_api(self, admin_client):
+        """配额接口校验参数，用户可查看自己的用量"""
+        assert admin_client.put('/api/quotas/team/x', json={}).status_code == 400
+        assert admin_client.put('/api/quotas/user/x', json={'quota_bytes': 'lots'}).status_code == 400
+        assert admin_client.put('/api/quotas/user/x', json={'quota_files': -1}).status_code == 400
+        quotas = admin_client.get('/api/quotas/me').get_json()['quotas']
+        assert quotas[0]['name'] == 'testadmin'
+
+    def test_requires_admin(self, user_client):
+        """普通用户不能设置配额"""
+        assert user_client.put('/api/quotas/user/testuser', json={'quota_bytes': None}).status_code == 403
+        assert user_client.get('/api/quotas').status_code == 403
+
+
+class TestSizes:
+    """大小格式转换"""
+
+    def test_parse_and_format(self):
+        assert parse_size('1.2 MB') == int(1.2 * 1024 * 1024)
+        assert parse_size('10 GB') == 10 * 1024 ** 3
+        assert parse_size(512) == 512
+        assert parse_size('Unknown') is None
+        assert format_size(1536) == '1.50 KB'
+        assert format_size(3 * 1024 * 1024) == '3.00 MB'
@@ -0,0 +1,122 @@
+"""
+完整性巡检测试
+"""
+import io
+import os
+
+from extensions import db
+from models import KeyRecord, AuditLog, JobCheckpoint
+from utils.scrubber import run_scrub
+
+
+def _encrypt(client, name, content):
+    return client.post('/api/encrypt',
+        data={'file': (io.BytesIO(content), name)},
+        content_type='multipart/form-data'
+    ).get_json()['key_id']
+
+
+def _corrupt(path, offset=20):
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+
+class TestScrubber:
+    """认证标签巡检测试"""
+
+    def test_intact_files_marked_ok(self, admin_client, app):
+        """完好的文件标记为 ok 并记录校验时间"""
+        key_id = _encrypt(admin_client, 'a.txt', b'intact')
+        report = run_scrub()
+        assert report['ok'] == 1
+        assert report['cycle_completed'] is True
+
+        record = db.session.get(KeyRecord, key_id)
+        assert record.integrity_status == 'ok'
+        assert record.last_verified_at is not None
+
+    def test_corrupt_and_missing_files_reported(self, admin_client, app):
+        """损坏与丢失的文件写 error 级审计日志，重复巡检不重复告警"""
+        corrupt_id = _encrypt(admin_client, 'c.txt', b'x' * 1000)
+        missing_id = _encrypt(admin_client, 'm.txt', b'y' * 10)
+        _corrupt(db.session.get(KeyRecord, corrupt_id).storage_path)
+        os.remove(db.session.get(KeyRecord, missing_id).storage_path)
+
+        report = run_scrub()
+        assert (report['corrupt'], report['missing']) == (1, 1)
+        assert db.session.get(KeyRecord, corrupt_id).integrity_status == 'corrupt'
+        assert db.session.get(KeyRecord, missing_id).integrity_status == 'missing'
+
+        run_scrub()
+        alerts = AuditLog.query.filter_by(action_type='INTEGRITY_FAIL').all()
+        assert len(alerts) == 2
+        assert {a.level for a in alerts} == {'error'}
+
+    def test_resumes_from_checkpoint(self, admin_client, app):
+        """每次只处理一部分，游标保存在检查点中，下次从断点继续"""
+        app.config['SCRUB_BATCH_SIZE'] = 2
+        ids = sorted(_encrypt(admin_client, f'{i}.txt', b'data') for i in range(5))
+
+        first = run_scrub(max_records=3)
+        assert first['checked'] == 3
+        assert db.session.get(JobCheckpoint, 'scrubber').cursor == ids[2]
+
+        # 模拟重启：丢弃会话中的对象，只依赖数据库中的检查点
+        db.session.expunge_all()
+        second = run_scrub(max_records=10)
+        assert second['checked'] == 2
+        assert second['cycle_completed'] is True
+        assert second['cycles'] == 1
+        assert all(db.session.get(KeyRecord, i).integrity_status == 'ok' for i in ids)
+
+    def test_checksum_path_needs_no_key(self, admin_client, app):
+        """有密文校验和时不解包密钥；没有校验和的旧记录回退到解密校验"""
+        with_checksum = _encrypt(admin_client, 'k.txt', b'checksum')
+        legacy = _encrypt(admin_client, 'l.txt', b'legacy')
+        record = db.session.get(KeyRecord, with_checksum)
+        record.wrapped_key = b'\x09not-a-key'
+        db.session.get(KeyRecord, legacy).cipher_checksum = None
+        db.session.commit()
+
+        report = run_scrub()
+        assert report['ok'] == 2
+
+        _corrupt(db.session.get(KeyRecord, legacy).storage_path)
+        assert run_scrub()['corrupt'] == 1
+
+    def test_simulated_records_skipped(self, admin_client, app):
+        """没有密文文件的模拟记录不参与巡检"""
+        admin_client.post('/api/encrypt/simulate', json={'filename': 'sim.txt', 'filesize': '1 KB'})
+        assert run_scrub()['checked'] == 0
+
+    def test_scrub_endpoints(self, admin_client):
+        """管理员触发巡检并查看进度"""
+        _encrypt(admin_client, 'e.txt', b'endpoint')
+        response = admin_client.post('/api/maintenance/scrub', json={'limit': 10})
+        assert response.status_code == 200
+        assert response.get_json()['report']['ok'] == 1
+
+        status = admin_client.get('/api/maintenance/scrub').get_json()['status']
+        assert status['records'] == {'ok': 1}
+
+        keys = admin_client.get('/api/keys').get_json()['keys']
+        assert keys[0]['integrity_status'] == 'ok'
+
+        assert admin_client.post('/api/maintenance/scrub', json={'limit': 'x'}).status_code == 400
+
+    def test_non_positive_limit_rejected(self, admin_client, app):
+        """limit 为 0 或负数时返回 400，不会退化为默认值或不限条数"""
+        for limit in (0, -1):
+            response = admin_client.post('/api/maintenance/scrub', json={'limit': limit})
+            assert response.status_code == 400
+            assert response.get_json()['code'] == 'INVALID_LIMIT'
+
+        _encrypt(admin_client, 'f.txt', b'zero')
+        assert run_scrub(max_records=0)['checked'] == 0
+
+    def test_scrub_requires_admin(self, user_client):
+        """普通用户不能触发巡检"""
+        assert user_client.post('/api/maintenance/scrub').status_code == 403
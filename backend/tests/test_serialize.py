@@ -0,0 +1,72 @@
+"""
+列表序列化测试
+"""
+import json
+from datetime import datetime
+
+import pytest
+
+from utils import serialize
+from utils.serialize import COLUMNAR, dumps
+
+
+class TestEncoding:
+    """编码测试"""
+
+    def test_datetime_matches_isoformat(self):
+        for value in (datetime(2026, 1, 2, 3, 4, 5), datetime(2026, 1, 2, 3, 4, 5, 123456)):
+            assert json.loads(dumps({'at': value})) == {'at': value.isoformat()}
+
+    def test_stdlib_fallback(self, monkeypatch):
+        """未安装 orjson 时退回标准库 json，输出相同"""
+        value = {'name': '密钥', 'at': datetime(2026, 1, 2), 'rows': [(1, None)]}
+        expected = json.loads(dumps(value))
+        monkeypatch.setattr(serialize, 'orjson', None)
+        assert json.loads(dumps(value)) == expected
+
+
+class TestListResponses:
+    """列表端点的格式协商与流式输出"""
+
+    def test_json_default(self, admin_client):
+        response = admin_client.get('/api/users')
+        assert response.mimetype == 'application/json'
+        assert 'Accept' in response.headers['Vary']
+        user = response.get_json()['users'][0]
+        assert set(user) == {'id', 'username', 'name', 'role', 'department', 'status', 'created_at'}
+        datetime.fromisoformat(user['created_at'])
+
+    def test_columnar(self, admin_client):
+        """列式格式与对象数组内容一致"""
+        expected = admin_client.get('/api/logs').get_json()
+        response = admin_client.get('/api/logs', headers={'Accept': COLUMNAR})
+        assert response.mimetype == COLUMNAR
+        data = json.loads(response.data)
+        assert data['pagination'] == expected['pagination']
+        rows = [dict(zip(data['logs']['columns'], row)) for row in data['logs']['rows']]
+        assert rows == expected['logs']
+
+    def test_streamed_matches_buffered(self, admin_client, app):
+        """超过阈值时分块流式输出，结果与一次性输出相同"""
+        admin_client.post('/api/devices', json={'name': 'Second', 'ip': '10.0.0.2'})
+        for accept in ('application/json', COLUMNAR):
+            app.config.update(SERIALIZE_STREAM_THRESHOLD=2000)
+            buffered = admin_client.get('/api/devices', headers={'Accept': accept})
+            assert buffered.content_length
+
+            app.config.update(SERIALIZE_STREAM_THRESHOLD=0, SERIALIZE_CHUNK_ROWS=1)
+            streamed = admin_client.get('/api/devices', headers={'Accept': accept})
+            assert streamed.content_length is None
+            assert json.loads(streamed.data) == json.loads(buffered.data)
+
+    def test_unavailable_format_falls_back(self, admin_client, monkeypatch):
+        monkeypatch.setattr(serialize, 'msgpack', None)
+        response = admin_client.get('/api/keys', headers={'Accept': 'application/msgpack'})
+        assert response.mimetype == 'application/json'
+
+    def test_msgpack(self, admin_client):
+        msgpack = pytest.importorskip('msgpack')
+        response = admin_client.get('/api/devices', headers={'Accept': 'application/msgpack'})
+        assert response.mimetype == 'application/msgpack'
+        data = msgpack.unpackb(response.data)
+        assert data['devices']['columns'][0] == 'id'
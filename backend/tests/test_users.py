@@ -3,6 +3,7 @@
 """
 import sys
 import os
+import io
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models import User
 
@@ -94,3 +95,98 @@ class TestUsers:
             'status': 'locked'
         })
         assert response.status_code == 200
+
+
+def _import(client, body, filename='users.csv', **params):
+    return client.post('/api/users/import', query_string=params,
+        data={'file': (io.BytesIO(body.encode('utf-8')), filename)},
+        content_type='multipart/form-data'
+    )
+
+
+class TestUserDirectory:
+    """用户目录分页与搜索测试"""
+
+    def test_cursor_pagination(self, admin_client):
+        """按用户名游标翻页，最后一页 next_cursor 为空"""
+        for i in range(5):
+            admin_client.post('/api/users', json={'username': f'page{i}', 'password': 'secret1'})
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 3, 'cursor': cursor} if cursor else {'limit': 3}
+            data = admin_client.get('/api/users', query_string=params).get_json()
+            seen += [u['username'] for u in data['users']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        assert seen == sorted(seen)
+        assert len(seen) == len(set(seen)) == 8
+
+    def test_prefix_search(self, admin_client):
+        """q 按用户名、姓名、部门前缀匹配，% 与 _ 按字面匹配"""
+        admin_client.post('/api/users', json={'username': 'alice', 'password': 'secret1', 'department': 'Research'})
+        admin_client.post('/api/users', json={'username': 'bob', 'password': 'secret1', 'name': 'Alfred'})
+        admin_client.post('/api/users', json={'username': 'al_x', 'password': 'secret1'})
+
+        names = lambda **q: [u['username'] for u in admin_client.get('/api/users', query_string=q).get_json()['users']]
+        assert names(q='al') == ['al_x', 'alice', 'bob']
+        assert names(q='Res') == ['alice']
+        assert names(q='al_') == ['al_x']
+        assert names(q='test', status='locked') == []
+        assert names(department='Research') == ['alice']
+
+    def test_invalid_parameters(self, admin_client):
+        assert admin_client.get('/api/users?cursor=@@@').status_code == 400
+        assert admin_client.get('/api/users?role=root').status_code == 400
+
+
+class TestUserImport:
+    """用户批量导入测试"""
+
+    def test_csv_import(self, admin_client):
+        """CSV 导入：创建新用户、跳过已存在的用户，密码可用于登录"""
+        body = ('username,password,name,role,department\n'
+                'imp1,secret11,Imported One,user,Ops\n'
+                'imp2,secret22,,admin,Ops\n'
+                'testuser,whatever1,,user,\n')
+        response = _import(admin_client, body)
+        assert response.status_code == 201
+        report = response.get_json()['report']
+        assert (report['created'], report['skipped']) == (2, ['testuser'])
+
+        user = User.query.filter_by(username='imp2').first()
+        assert (user.name, user.role, user.department, user.status) == ('imp2', 'admin', 'Ops', 'active')
+        assert user.check_password('secret22')
+        assert admin_client.post('/api/login', json={'username': 'imp1', 'password': 'secret11'}).status_code == 200
+
+    def test_ndjson_raw_body(self, admin_client):
+        """NDJSON 可以直接作为请求体提交"""
+        body = '{"username": "nd1", "password": "secret1"}\n\n{"username": "nd2", "password": "secret2"}\n'
+        response = admin_client.post('/api/users/import', data=body, content_type='application/x-ndjson')
+        assert response.get_json()['report']['created'] == 2
+
+    def test_invalid_rows_reject_whole_import(self, admin_client):
+        """任一行不合法时整批不导入，并报告行号"""
+        body = 'username,password\ngood1,secret1\nx,secret1\ngood1,secret1\n'
+        response = _import(admin_client, body)
+        assert response.status_code == 400
+        report = response.get_json()['report']
+        assert report['invalid'] == 2
+        assert [e['line'] for e in report['errors']] == [3, 4]
+        assert User.query.filter_by(username='good1').first() is None
+
+    def test_duplicates_fail_mode(self, admin_client):
+        """on_duplicate=fail 时存在重复用户名则整批拒绝"""
+        body = 'username,password\nfresh1,secret1\ntestadmin,secret1\n'
+        response = _import(admin_client, body, on_duplicate='fail')
+        assert response.status_code == 409
+        assert User.query.filter_by(username='fresh1').first() is None
+
+    def test_bad_format_and_limits(self, admin_client, app):
+        assert _import(admin_client, 'a,b\n', filename='users.txt').status_code == 400
+        assert _import(admin_client, 'name\nx\n').status_code == 400
+        app.config['USER_IMPORT_MAX_ROWS'] = 1
+        assert _import(admin_client, 'username,password\nu1,secret1\nu2,secret1\n').status_code == 400
+
+    def test_import_requires_admin(self, user_client):
+        assert _import(user_client, 'username,password\nu1,secret1\n').status_code == 403
@@ -0,0 +1,422 @@
+"""
+审计分析 - 近似的 Top-K 与去重计数，按审计日志增量维护，不对 audit_logs / key_records 做 GROUP BY 全表扫描
+
+- 输入：按 id 顺序增量读取 audit_logs（游标之后、早于 ANALYTICS_GRACE_SECONDS 的日志，已密封的就地解密）；
+  游标之前最近 ANALYTICS_RESCAN_ROWS 个 id 记下是否已计入，每次先补读其中晚提交的日志（长事务的 id 小于已读取的 id）；
+  解密日志（DECRYPT / DECRYPT_BUNDLE / DECRYPT_SIMULATE）里出现的密钥ID 与 KeyRecord.decrypt_count 的递增一一对应
+- 按天（UTC）分桶，保留 ANALYTICS_RETENTION_DAYS 天：
+  - 各用户解密次数：Space-Saving（容量 ANALYTICS_TOPK_CAPACITY），多天合并后取 Top-K
+  - 各用户访问 IP 数与全局 IP 数：HyperLogLog，多天合并时逐寄存器取最大
+- 文件解密次数（不分天）：Space-Saving；首次建立时按 decrypt_count 取前 N 条作为初值，之后只累加新日志
+- 误差：Space-Saving 的计数只会高估，真实值在 [count - error, count]，未被跟踪的项不超过 max_error；
+  HyperLogLog 标准误差约 1.04 / sqrt(寄存器数)
+- 持久化：周期任务每 ANALYTICS_PERSIST_SECONDS 把状态与游标写入 analytics_snapshots，
+  重启后从快照恢复并从游标处继续读取，快照之后的日志不会丢失或重复计数
+"""
+import base64
+import heapq
+import json
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from extensions import db
+from models import AnalyticsSnapshot, AuditLog, KeyRecord
+from utils.anomaly import HyperLogLog
+from utils.audit_seal import KEY_ID_PATTERN, open_fields
+from utils.metrics import REGISTRY
+
+SNAPSHOT_NAME = 'analytics'
+SNAPSHOT_VERSION = 1
+DECRYPT_ACTIONS = frozenset({'DECRYPT', 'DECRYPT_BUNDLE', 'DECRYPT_SIMULATE'})
+HLL_PRECISION = 8
+
+ANALYTICS_EVENTS = REGISTRY.counter(
+    'qrng_analytics_events_total', 'Audit log entries folded into the analytics sketches')
+
+_lock = threading.Lock()
+
+
+class SpaceSaving:
+    """
+    容量为 capacity 的 Space-Saving 摘要：满时新项替换计数最小的项并继承其计数作为误差
+    最小项用惰性小顶堆查找（计数只增不减，堆里过期的旧计数弹出时重新入堆）
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}  # 项 -> [计数, 误差]
+        self._heap = []
+
+    def add(self, item, weight=1):
+        entry = self.counts.get(item)
+        if entry is not None:
+            entry[0] += weight
+            return
+        floor = 0
+        if len(self.counts) >= self.capacity:
+            victim, floor = self._pop_min()
+            del self.counts[victim]
+        self.counts[item] = [floor + weight, floor]
+        heapq.heappush(self._heap, (floor + weight, item))
+
+    def _pop_min(self):
+        while True:
+            count, item = heapq.heappop(self._heap)
+            entry = self.counts.get(item)
+            if entry is None:
+                continue
+            if entry[0] == count:
+                return item, count
+            heapq.heappush(self._heap, (entry[0], item))
+
+    @property
+    def floor(self):
+        """未被跟踪的项的计数上限"""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(entry[0] for entry in self.counts.values())
+
+    def to_dict(self):
+        return {'capacity': self.capacity, 'counts': self.counts}
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls(data['capacity'])
+        summary.counts = {item: list(entry) for item, entry in data['counts'].items()}
+        summary._heap = [(entry[0], item) for item, entry in summary.counts.items()]
+        heapq.heapify(summary._heap)
+        return summary
+
+
+def merge_top(summaries, limit):
+    """
+    合并多个摘要取前 limit 项：某摘要未跟踪该项时按它的 floor 计入上界与误差，
+    返回 ([(项, 计数, 误差)], max_error)
+    """
+    floors = [s.floor for s in summaries]
+    items = set().union(*(s.counts for s in summaries)) if summaries else set()
+    merged = []
+    for item in items:
+        count = error = 0
+        for summary, floor in zip(summaries, floors):
+            entry = summary.counts.get(item)
+            if entry is None:
+                count += floor
+                error += floor
+            else:
+                count += entry[0]
+                error += entry[1]
+        merged.append((item, count, error))
+    merged.sort(key=lambda x: (-x[1], x[0]))
+    return merged[:limit], sum(floors)
+
+
+def _hll_dump(hll):
+    return base64.b64encode(bytes(hll.registers)).decode('ascii')
+
+
+def _hll_load(value):
+    hll = HyperLogLog(HLL_PRECISION)
+    hll.registers = bytearray(base64.b64decode(value))
+    return hll
+
+
+class DaySummary:
+    """一天的解密次数摘要与 IP 基数"""
+
+    def __init__(self, capacity, max_users):
+        self.decrypts = SpaceSaving(capacity)
+        self.user_ips = {}  # 用户 -> HyperLogLog
+        self.ips = HyperLogLog(HLL_PRECISION)
+        self.max_users = max_users
+
+    def add_ip(self, user, ip):
+        self.ips.add(ip)
+        hll = self.user_ips.get(user)
+        if hll is None:
+            if len(self.user_ips) >= self.max_users:
+                return
+            hll = self.user_ips[user] = HyperLogLog(HLL_PRECISION)
+        hll.add(ip)
+
+    def to_dict(self):
+        return {'decrypts': self.decrypts.to_dict(), 'ips': _hll_dump(self.ips),
+                'user_ips': {user: _hll_dump(hll) for user, hll in self.user_ips.items()}}
+
+    @classmethod
+    def from_dict(cls, data, max_users):
+        day = cls(data['decrypts']['capacity'], max_users)
+        day.decrypts = SpaceSaving.from_dict(data['decrypts'])
+        day.ips = _hll_load(data['ips'])
+        day.user_ips = {user: _hll_load(value) for user, value in data['user_ips'].items()}
+        return day
+
+
+class AnalyticsState:
+    """按天分桶的摘要、文件解密次数摘要与读取游标"""
+
+    def __init__(self, config):
+        self.capacity = config.get('ANALYTICS_TOPK_CAPACITY', 1000)
+        self.retention = config.get('ANALYTICS_RETENTION_DAYS', 7)
+        self.max_users = config.get('ANALYTICS_MAX_USERS', 10000)
+        self.days = {}          # 日序号（date.toordinal）-> DaySummary
+        self.files = SpaceSaving(self.capacity)
+        self.cursor = 0         # 已读取到的日志 id
+        self.floor = 0          # 不大于此值的日志不再补读
+        self.seen = set()       # (floor, cursor] 中已计入的日志 id
+        self.rescan_rows = config.get('ANALYTICS_RESCAN_ROWS', 2000)
+        self.files_from = 0     # 文件计数只累加 id 大于此值的日志（之前的已包含在 decrypt_count 初值里）
+        self.persisted_at = None
+
+    def _day(self, ordinal):
+        day = self.days.get(ordinal)
+        if day is None:
+            day = self.days[ordinal] = DaySummary(self.capacity, self.max_users)
+        return day
+
+    def prune(self, today):
+        oldest = today - self.retention + 1
+        for ordinal in [o for o in self.days if o < oldest]:
+            del self.days[ordinal]
+
+    def fold(self, log_id, user, action, at, ip, key_ids):
+        ordinal = at.toordinal()
+        if ordinal <= datetime.utcnow().toordinal() - self.retention:
+            day = None
+        else:
+            day = self._day(ordinal)
+        if day is not None and user and ip:
+            day.add_ip(user, ip)
+        if action in DECRYPT_ACTIONS:
+            if day is not None and user:
+                day.decrypts.add(user, max(1, len(key_ids)))
+            if log_id > self.files_from:
+                for key_id in key_ids:
+                    self.files.add(key_id)
+
+    def mark(self, log_id):
+        self.seen.add(log_id)
+        self.cursor = max(self.cursor, log_id)
+
+    def settle(self):
+        """只保留最近 rescan_rows 个已计入的 id，更早的空缺不再等待"""
+        excess = len(self.seen) - self.rescan_rows
+        if excess > 0:
+            dropped = heapq.nsmallest(excess, self.seen)
+            self.seen.difference_update(dropped)
+            self.floor = dropped[-1]
+
+    def recent(self, days):
+        start = datetime.utcnow().toordinal() - min(days, self.retention) + 1
+        return [day for ordinal, day in sorted(self.days.items()) if ordinal >= start]
+
+    def to_bytes(self):
+        data = {'version': SNAPSHOT_VERSION, 'cursor': self.cursor, 'files_from': self.files_from,
+                'floor': self.floor, 'seen': sorted(self.seen),
+                'files': self.files.to_dict(),
+                'days': {str(ordinal): day.to_dict() for ordinal, day in self.days.items()}}
+        return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+    def load_bytes(self, blob):
+        data = json.loads(zlib.decompress(blob))
+        if data.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('不支持的分析快照版本')
+        self.cursor = data['cursor']
+        self.files_from = data['files_from']
+        self.floor = data.get('floor', self.cursor)
+        self.seen = set(data.get('seen', ()))
+        self.files = SpaceSaving.from_dict(data['files'])
+        self.days = {int(o): DaySummary.from_dict(d, self.max_users) for o, d in data['days'].items()}
+
+
+def _bootstrap(state):
+    """没有快照时：文件计数以 decrypt_count 最高的记录为初值，日志从保留期开始回放"""
+    state.files_from = db.session.query(db.func.max(AuditLog.id)).scalar() or 0
+    for key_id, count in db.session.query(KeyRecord.id, KeyRecord.decrypt_count).filter(
+            KeyRecord.decrypt_count > 0).order_by(KeyRecord.decrypt_count.desc()).limit(state.capacity):
+        state.files.add(key_id, count)
+    since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=state.retention - 1)
+    first = db.session.query(db.func.min(AuditLog.id)).filter(AuditLog.timestamp >= since).scalar()
+    state.cursor = state.floor = (first - 1) if first is not None else state.files_from
+
+
+def get_state(app=None):
+    """当前应用的分析状态，首次使用时从快照恢复（没有快照时按现有数据建立）"""
+    app = app or current_app._get_current_object()
+    state = app.extensions.get('analytics')
+    if state is None:
+        with _lock:
+            state = app.extensions.get('analytics')
+            if state is None:
+                state = AnalyticsState(app.config)
+                snapshot = db.session.get(AnalyticsSnapshot, SNAPSHOT_NAME)
+                try:
+                    if snapshot is None:
+                        raise ValueError('没有快照')
+                    state.load_bytes(snapshot.data)
+                    state.persisted_at = time.monotonic()
+                except (ValueError, KeyError, zlib.error):
+                    state = AnalyticsState(app.config)
+                    _bootstrap(state)
+                app.extensions['analytics'] = state
+    return state
+
+
+def _log_rows(condition, cutoff, limit):
+    return db.session.query(
+        AuditLog.id, AuditLog.user, AuditLog.action_type, AuditLog.timestamp,
+        AuditLog.ip_address, AuditLog.message, AuditLog.detail, AuditLog.sealed
+    ).filter(condition, AuditLog.timestamp <= cutoff).order_by(AuditLog.id).limit(limit).all()
+
+
+def _missed_ids(state):
+    """(floor, cursor] 中已提交但尚未计入的日志 id（游标越过之后才提交）"""
+    ids = db.session.query(AuditLog.id).filter(AuditLog.id > state.floor, AuditLog.id <= state.cursor)
+    return [log_id for (log_id,) in ids if log_id not in state.seen]
+
+
+def _fold_rows(state, rows, cutoff):
+    for row in rows:
+        message, detail, ip = row.message, row.detail, row.ip_address
+        if row.sealed is not None:
+            opened = open_fields(row.sealed, row.user)
+            message, detail, ip = opened['message'], opened['detail'], opened['ip_address']
+        text = f'{message or ""}\n{detail or ""}'
+        key_ids = tuple(dict.fromkeys(KEY_ID_PATTERN.findall(text)))
+        state.fold(row.id, row.user, row.action_type, row.timestamp or cutoff, ip, key_ids)
+        state.mark(row.id)
+
+
+def catch_up(max_rows=None, now=None):
+    """从游标处读取新日志并更新摘要，返回本次读取的条数；另一个线程正在更新时直接返回"""
+    config = current_app.config
+    state = get_state()
+    batch_size = config.get('ANALYTICS_BATCH_SIZE', 1000)
+    max_rows = max_rows or config.get('ANALYTICS_MAX_ROWS_PER_RUN', 50000)
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=config.get('ANALYTICS_GRACE_SECONDS', 5))
+    if not _lock.acquire(blocking=False):
+        return 0
+    try:
+        total = 0
+        missed = _missed_ids(state)
+        for start in range(0, len(missed), batch_size):
+            rows = _log_rows(AuditLog.id.in_(missed[start:start + batch_size]), cutoff, batch_size)
+            _fold_rows(state, rows, cutoff)
+            total += len(rows)
+        while total < max_rows:
+            rows = _log_rows(AuditLog.id > state.cursor, cutoff, min(batch_size, max_rows - total))
+            _fold_rows(state, rows, cutoff)
+            total += len(rows)
+            if len(rows) < batch_size:
+                break
+        state.settle()
+        state.prune(datetime.utcnow().toordinal())
+    finally:
+        _lock.release()
+    ANALYTICS_EVENTS.inc(total)
+    return total
+
+
+def persist(state=None):
+    """写入快照；其他进程已写入更新的游标时不覆盖"""
+    state = state or get_state()
+    with _lock:
+        blob = state.to_bytes()
+        cursor = state.cursor
+    snapshot = db.session.get(AnalyticsSnapshot, SNAPSHOT_NAME)
+    if snapshot is None:
+        snapshot = AnalyticsSnapshot(name=SNAPSHOT_NAME)
+        db.session.add(snapshot)
+    elif (snapshot.cursor or 0) > cursor:
+        return False
+    snapshot.cursor = cursor
+    snapshot.data = blob
+    snapshot.updated_at = datetime.utcnow()
+    db.session.commit()
+    state.persisted_at = time.monotonic()
+    return True
+
+
+def run_analytics():
+    """周期任务：追上新日志，距上次持久化超过 ANALYTICS_PERSIST_SECONDS 时写快照"""
+    processed = catch_up()
+    state = get_state()
+    interval = current_app.config.get('ANALYTICS_PERSIST_SECONDS', 300)
+    if state.persisted_at is None or time.monotonic() - state.persisted_at >= interval:
+        persist(state)
+    return processed
+
+
+def top_users(days, limit):
+    """最近 days 天解密次数最多的用户"""
+    state = get_state()
+    with _lock:
+        top, max_error = merge_top([day.decrypts for day in state.recent(days)], limit)
+    return [{'user': user, 'decrypts': count, 'error': error} for user, count, error in top], max_error
+
+
+def distinct_ips(days, limit, user=None):
+    """最近 days 天各用户访问的不同 IP 数（近似），以及全部 IP 数"""
+    state = get_state()
+    with _lock:
+        recent = state.recent(days)
+        total = HyperLogLog(HLL_PRECISION)
+        merged = {}
+        for day in recent:
+            total.merge(day.ips)
+            for name, hll in day.user_ips.items():
+                if user is not None and name != user:
+                    continue
+                if name not in merged:
+                    merged[name] = HyperLogLog(HLL_PRECISION)
+                merged[name].merge(hll)
+    users = sorted(({'user': name, 'distinct_ips': hll.count()} for name, hll in merged.items()),
+                   key=lambda x: (-x['distinct_ips'], x['user']))
+    return users[:limit], total.count()
+
+
+def top_files(limit):
+    """累计解密次数最多的文件（已删除的记录不返回）"""
+    state = get_state()
+    with _lock:
+        ranked, max_error = merge_top([state.files], state.capacity)
+    files = []
+    # 按排名分块查询记录，跳过已删除的
+    for start in range(0, len(ranked), max(limit, 1)):
+        chunk = ranked[start:start + max(limit, 1)]
+        records = {r.id: r for r in db.session.query(
+            KeyRecord.id, KeyRecord.file_name, KeyRecord.owner, KeyRecord.decrypt_count
+        ).filter(KeyRecord.id.in_([key_id for key_id, _, _ in chunk]))}
+        for key_id, count, error in chunk:
+            record = records.get(key_id)
+            if record is not None:
+                files.append({'key_id': key_id, 'file_name': record.file_name, 'owner': record.owner,
+                              'decrypts': count, 'error': error, 'decrypt_count': record.decrypt_count})
+        if len(files) >= limit:
+            break
+    files = files[:limit]
+    return files, max_error
+
+
+def analytics_status():
+    state = get_state()
+    with _lock:
+        return {
+            'cursor': state.cursor,
+            'days': len(state.days),
+            'retention_days': state.retention,
+            'topk_capacity': state.capacity,
+            'tracked_files': len(state.files.counts),
+            'hll_relative_error': round(1.04 / (1 << HLL_PRECISION) ** 0.5, 4),
+            'persisted': state.persisted_at is not None
+        }
+
+
+def reset_analytics():
+    """日志与密钥记录被清空后丢弃快照与内存状态"""
+    AnalyticsSnapshot.query.filter(AnalyticsSnapshot.name == SNAPSHOT_NAME).delete()
+    current_app.extensions.pop('analytics', None)
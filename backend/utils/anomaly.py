@@ -0,0 +1,425 @@
+"""
+审计事件异常检测 - 审计日志写入路径上的流式检测器，滑动窗口计数放在固定内存的概率结构里
+
+- 采集：flush 前（先于字段密封）从新增日志中提取用户、操作类型、级别、IP 与日志里出现的密钥ID，
+  事务提交后才放入有界队列，回滚的日志不进入检测；请求线程只做入队
+- 消费：周期任务（或仪表盘读取时）批量取出队列中的事件更新检测器
+- 窗口：ANOMALY_WINDOW_SECONDS 分为 ANOMALY_WINDOW_BUCKETS 个桶组成环，过期的桶整桶清空；
+  次数用每桶一个 Count-Min Sketch 统计（只会高估），不同密钥数用每桶每主体一个 HyperLogLog，合并时逐寄存器取最大
+- 规则按用户与 IP 两个维度分别计数：失败登录、解密突发、访问的不同密钥数，超过阈值时产生告警，
+  同一规则同一主体在一个窗口内只告警一次
+- 仪表盘的告警数 = 今日错误事件数 + 今日异常告警数，直接读内存；
+  错误事件数定期从数据库按用户重算一次（覆盖进程重启与多进程部署），之后的事件按日志 id 增量累加
+
+检测状态按进程保存，多进程部署时各进程只检测自己处理的请求。
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+
+from extensions import db
+from models import AuditLog, User
+from utils.audit_seal import KEY_ID_PATTERN
+from utils.metrics import AUDIT_QUEUE_DEPTH, REGISTRY
+
+ANOMALY_ALERTS = REGISTRY.counter(
+    'qrng_anomaly_alerts_total', 'Anomaly alerts raised by the audit event detector', ('rule',))
+AUDIT_EVENTS = REGISTRY.counter(
+    'qrng_audit_events_total', 'Audit events consumed by the anomaly detector', ('result',))
+
+AuditEvent = namedtuple('AuditEvent', 'log_id at user action level ip key_ids')
+Rule = namedtuple('Rule', 'name actions kind threshold')
+Alert = namedtuple('Alert', 'rule subject_kind subject user value threshold at')
+
+FAILED_LOGIN_ACTIONS = frozenset({'LOGIN_FAIL', 'LOGIN_BLOCKED'})
+DECRYPT_ACTIONS = frozenset({'DECRYPT', 'DECRYPT_BUNDLE', 'DECRYPT_FAIL'})
+SUBJECT_KINDS = ('user', 'ip')
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class CountMinSketch:
+    """depth 行 × width 列计数器；估计值 >= 真实值，超出部分以高概率不超过 总数 × e / width"""
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self._rows = [[0] * width for _ in range(depth)]
+
+    def _columns(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8 * self.depth).digest()
+        return [int.from_bytes(digest[i * 8:(i + 1) * 8], 'big') % self.width for i in range(self.depth)]
+
+    def add(self, key, count=1):
+        for row, column in zip(self._rows, self._columns(key)):
+            row[column] += count
+
+    def estimate(self, key):
+        return min(row[column] for row, column in zip(self._rows, self._columns(key)))
+
+    def clear(self):
+        for row in self._rows:
+            row[:] = [0] * self.width
+
+
+class HyperLogLog:
+    """2^p 个寄存器（每个 1 字节）的基数估计，标准误差约 1.04 / sqrt(2^p)"""
+
+    def __init__(self, p=8):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value):
+        h = _hash64(value)
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # 小基数用线性计数修正
+        return int(round(estimate))
+
+
+class _Ring:
+    """滑动窗口的桶环：每个槽位记录所属时间片，时间片过期的槽位在下次写入时清空复用"""
+
+    def __init__(self, window, buckets, factory):
+        self.span = window / buckets
+        self.buckets = buckets
+        self._slots = [[None, factory()] for _ in range(buckets)]
+
+    def current(self, now, reset):
+        epoch = int(now // self.span)
+        slot = self._slots[epoch % self.buckets]
+        if slot[0] != epoch:
+            reset(slot[1])
+            slot[0] = epoch
+        return slot[1]
+
+    def live(self, now):
+        epoch = int(now // self.span)
+        return [sketch for slot_epoch, sketch in self._slots
+                if slot_epoch is not None and epoch - self.buckets < slot_epoch <= epoch]
+
+
+class SlidingCounter:
+    """按键计数的滑动窗口：每桶一个 Count-Min Sketch，查询时对窗口内的桶求和"""
+
+    def __init__(self, window, buckets, width, depth):
+        self._ring = _Ring(window, buckets, lambda: CountMinSketch(width, depth))
+
+    def add(self, key, now, count=1):
+        self._ring.current(now, CountMinSketch.clear).add(key, count)
+
+    def estimate(self, key, now):
+        return sum(sketch.estimate(key) for sketch in self._ring.live(now))
+
+
+class SlidingDistinct:
+    """按主体统计不同值个数的滑动窗口：每桶 主体 -> HyperLogLog，每桶最多跟踪 max_subjects 个主体（淘汰最久未写入的）"""
+
+    def __init__(self, window, buckets, p=8, max_subjects=4096):
+        self.p = p
+        self.max_subjects = max_subjects
+        self._ring = _Ring(window, buckets, OrderedDict)
+
+    def add(self, subject, value, now):
+        bucket = self._ring.current(now, OrderedDict.clear)
+        hll = bucket.get(subject)
+        if hll is None:
+            if len(bucket) >= self.max_subjects:
+                bucket.popitem(last=False)
+            hll = bucket[subject] = HyperLogLog(self.p)
+        else:
+            bucket.move_to_end(subject)
+        hll.add(value)
+
+    def estimate(self, subject, now):
+        merged = None
+        for bucket in self._ring.live(now):
+            hll = bucket.get(subject)
+            if hll is None:
+                continue
+            if merged is None:
+                merged = HyperLogLog(self.p)
+            merged.merge(hll)
+        return merged.count() if merged else 0
+
+
+def build_rules(config):
+    return (
+        Rule('failed_login', FAILED_LOGIN_ACTIONS, 'count', config.get('ANOMALY_FAILED_LOGIN_THRESHOLD', 5)),
+        Rule('decrypt_burst', DECRYPT_ACTIONS, 'count', config.get('ANOMALY_DECRYPT_BURST_THRESHOLD', 30)),
+        Rule('distinct_keys', DECRYPT_ACTIONS, 'distinct', config.get('ANOMALY_DISTINCT_KEYS_THRESHOLD', 50)),
+    )
+
+
+class AnomalyDetector:
+    """消费审计事件，维护各规则的滑动窗口、今日错误计数与告警记录"""
+
+    def __init__(self, config):
+        self.window = config.get('ANOMALY_WINDOW_SECONDS', 300)
+        buckets = config.get('ANOMALY_WINDOW_BUCKETS', 10)
+        width = config.get('ANOMALY_SKETCH_WIDTH', 2048)
+        depth = config.get('ANOMALY_SKETCH_DEPTH', 4)
+        self.rules = build_rules(config)
+        self._windows = {
+            rule.name: (SlidingCounter(self.window, buckets, width, depth) if rule.kind == 'count'
+                        else SlidingDistinct(self.window, buckets))
+            for rule in self.rules
+        }
+        self._lock = threading.Lock()
+        self._fired = {}      # (规则, 主体类型, 主体) -> 上次告警时间
+        self._alerts = deque(maxlen=config.get('ANOMALY_ALERT_HISTORY', 200))
+        self._day = None
+        self._errors = {}     # 今日错误事件数：用户 -> 次数
+        self._alerts_today = {}  # 今日告警数：用户（IP 告警为 None）-> 次数
+        self._synced_id = 0   # 错误计数已包含 id 不大于此值的日志
+
+    def _roll_day(self, day):
+        if day != self._day:
+            self._day = day
+            self._errors = {}
+            self._alerts_today = {}
+
+    def load_errors(self, counts, synced_id, day=None):
+        """用数据库中今日各用户的错误日志数替换内存计数"""
+        with self._lock:
+            self._roll_day(day or datetime.utcnow().date())
+            self._errors = dict(counts)
+            self._synced_id = max(self._synced_id, synced_id or 0)
+
+    def process(self, events, now=None):
+        """更新窗口与计数，返回本批新产生的告警"""
+        raised = []
+        with self._lock:
+            self._roll_day(datetime.utcnow().date())
+            for e in events:
+                at = now if now is not None else e.at
+                if e.level == 'error' and (e.log_id is None or e.log_id > self._synced_id):
+                    self._errors[e.user] = self._errors.get(e.user, 0) + 1
+                for rule in self.rules:
+                    if e.action in rule.actions:
+                        raised.extend(self._apply(rule, e, at))
+            if raised:
+                self._prune(now if now is not None else time.time())
+        for alert in raised:
+            ANOMALY_ALERTS.inc(rule=alert.rule)
+        return raised
+
+    def _apply(self, rule, e, now):
+        window = self._windows[rule.name]
+        for kind, subject in zip(SUBJECT_KINDS, (e.user, e.ip)):
+            if not subject:
+                continue
+            key = f'{kind}\0{subject}'
+            if rule.kind == 'count':
+                # 批量解密按包含的密钥数计
+                window.add(key, now, max(1, len(e.key_ids)))
+                value = window.estimate(key, now)
+            else:
+                if not e.key_ids:
+                    continue
+                for key_id in e.key_ids:
+                    window.add(key, key_id, now)
+                value = window.estimate(key, now)
+            if value < rule.threshold:
+                continue
+            last = self._fired.get((rule.name, key))
+            if last is not None and now - last < self.window:
+                continue
+            self._fired[(rule.name, key)] = now
+            alert = Alert(rule.name, kind, subject, e.user if kind == 'user' else None,
+                          value, rule.threshold, datetime.utcfromtimestamp(now))
+            self._alerts.append(alert)
+            self._alerts_today[alert.user] = self._alerts_today.get(alert.user, 0) + 1
+            yield alert
+
+    def _prune(self, now):
+        self._fired = {k: at for k, at in self._fired.items() if now - at < self.window}
+
+    def summary(self, usernames=None):
+        """
+        今日告警数与最近告警；usernames 为 None 时统计全部（含按 IP 的告警），
+        否则只统计这些用户的错误事件与按用户的告警
+        """
+        with self._lock:
+            self._roll_day(datetime.utcnow().date())
+            if usernames is None:
+                errors = sum(self._errors.values())
+                anomalies = sum(self._alerts_today.values())
+                recent = list(self._alerts)
+            else:
+                errors = sum(self._errors.get(name, 0) for name in usernames)
+                anomalies = sum(self._alerts_today.get(name, 0) for name in usernames)
+                recent = [a for a in self._alerts if a.user in usernames]
+        return {'errors': errors, 'anomalies': anomalies, 'alerts': errors + anomalies, 'recent': recent}
+
+
+class AuditStream:
+    """有界事件队列（满时丢弃最旧的事件）与消费它的检测器"""
+
+    def __init__(self, config):
+        self.detector = AnomalyDetector(config)
+        self._queue = deque()
+        self._max = config.get('ANOMALY_QUEUE_SIZE', 10000)
+        self._lock = threading.Lock()
+        self.synced = False
+
+    def __len__(self):
+        return len(self._queue)
+
+    def publish(self, events):
+        with self._lock:
+            overflow = len(self._queue) + len(events) - self._max
+            for _ in range(max(0, overflow)):
+                self._queue.popleft()
+            self._queue.extend(events)
+        if overflow > 0:
+            AUDIT_EVENTS.inc(overflow, result='dropped')
+
+    def drain(self):
+        """取出全部待处理事件交给检测器，返回新告警"""
+        with self._lock:
+            events = list(self._queue)
+            self._queue.clear()
+        if not events:
+            return []
+        AUDIT_EVENTS.inc(len(events), result='processed')
+        return self.detector.process(events)
+
+
+def get_stream(app=None):
+    app = app or current_app._get_current_object()
+    return app.extensions.get('audit_stream')
+
+
+def _capture(log):
+    text = f'{log.message or ""}\n{log.detail or ""}'
+    return AuditEvent(None, time.time(), log.user, log.action_type, log.level or 'info',
+                      log.ip_address, tuple(dict.fromkeys(KEY_ID_PATTERN.findall(text))))
+
+
+def _before_flush(session, flush_context, instances):
+    # 注册在密封钩子之前，读取的是明文字段
+    if not has_app_context() or get_stream() is None:
+        return
+    pending = session.info.setdefault('_audit_events', [])
+    captured = session.info.setdefault('_audit_captured', set())
+    for obj in session.new:
+        if isinstance(obj, AuditLog) and id(obj) not in captured:
+            captured.add(id(obj))
+            pending.append([obj, _capture(obj)])
+
+
+def _after_flush(session, flush_context):
+    for entry in session.info.get('_audit_events', ()):
+        if entry[1].log_id is None and entry[0].id is not None:
+            entry[1] = entry[1]._replace(log_id=entry[0].id)
+
+
+def _after_commit(session):
+    pending = session.info.pop('_audit_events', None)
+    session.info.pop('_audit_captured', None)
+    if pending and has_app_context():
+        stream = get_stream()
+        if stream is not None:
+            stream.publish([e for _, e in pending])
+
+
+def _after_rollback(session):
+    session.info.pop('_audit_events', None)
+    session.info.pop('_audit_captured', None)
+
+
+def _queue_depth():
+    stream = get_stream() if has_app_context() else None
+    return len(stream) if stream is not None else 0
+
+
+def resync_errors(stream=None):
+    """从数据库重算今日各用户的错误日志数（按用户分组的一次查询）"""
+    stream = stream or get_stream()
+    stream.drain()
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    synced_id = db.session.query(db.func.max(AuditLog.id)).scalar() or 0
+    counts = db.session.query(AuditLog.user, db.func.count(AuditLog.id)).filter(
+        AuditLog.level == 'error',
+        AuditLog.timestamp >= today,
+        AuditLog.id <= synced_id
+    ).group_by(AuditLog.user).all()
+    stream.detector.load_errors(counts, synced_id, today.date())
+    stream.synced = True
+    return len(counts)
+
+
+def invalidate():
+    """日志表被整体清空后调用：下次读取时重新从数据库载入错误计数"""
+    stream = get_stream()
+    if stream is not None:
+        stream.drain()
+        stream.synced = False
+
+
+def process_events():
+    """周期任务：消费队列，新告警写应用日志"""
+    stream = get_stream()
+    if stream is None:
+        return 0
+    raised = stream.drain()
+    for alert in raised:
+        current_app.logger.warning(
+            f'异常告警 {alert.rule}: {alert.subject_kind}={alert.subject} 窗口内 {alert.value} >= {alert.threshold}')
+    return len(raised)
+
+
+def alert_summary(policy):
+    """按访问范围汇总今日告警：先消费队列中的事件，首次使用时从数据库载入今日错误计数"""
+    stream = get_stream()
+    if stream is None:
+        return {'errors': 0, 'anomalies': 0, 'alerts': 0, 'recent': []}
+    if not stream.synced:
+        resync_errors(stream)
+    stream.drain()
+    if policy.scope == 'all':
+        usernames = None
+    elif policy.scope == 'department':
+        usernames = {policy.username, *(name for (name,) in db.session.query(User.username).filter(
+            User.department == policy.department))}
+    else:
+        usernames = {policy.username}
+    return stream.detector.summary(usernames)
+
+
+def init_anomaly(app):
+    """创建检测器；会话钩子只注册一次，采集钩子插在最前（先于日志密封）"""
+    if app.config.get('ANOMALY_ENABLED', True):
+        app.extensions['audit_stream'] = AuditStream(app.config)
+    else:
+        app.extensions.pop('audit_stream', None)
+
+    if not event.contains(db.session, 'before_flush', _before_flush):
+        event.listen(db.session, 'before_flush', _before_flush, insert=True)
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
+    AUDIT_QUEUE_DEPTH.set_function(_queue_depth)
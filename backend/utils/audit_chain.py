@@ -0,0 +1,419 @@
+"""
+审计日志防篡改 - 哈希链 + 分段 Merkle 检查点，增量校验
+
+- 链：每条日志按 id 顺序链接，chain = H(0x02 | 上一条 chain | leaf)，leaf = H(0x00 | 规范化的行内容)
+  写日志时不加锁取链头，由后台任务按 id 顺序补链（只处理早于 AUDIT_CHAIN_GRACE_SECONDS 的行，
+  避免并发事务的 id 晚提交造成分叉；超过宽限期才提交的行从该处重新链接）；已密封的日志对密文计算，不需要解密
+- 检查点：每 AUDIT_CHECKPOINT_SIZE 条已链接的日志生成一个检查点，记录该段的 Merkle 根（RFC 6962 结构）、
+  段前后的链值，以及链接上一个检查点的摘要；配置了日志密钥时再附 HMAC，只有数据库写权限无法伪造
+- 校验一个区间只需全部检查点行（很少）加上区间所在的段，不重算全表；单条日志可给出 Merkle 包含证明
+- 后台任务每次补链、生成检查点后，从游标处继续校验若干个段，一轮结束后从头开始（同完整性巡检）
+"""
+import hashlib
+import hmac
+import json
+from datetime import datetime, timedelta
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from flask import current_app
+from sqlalchemy import bindparam, update
+
+from extensions import db
+from models import AuditLog, AuditCheckpoint, JobCheckpoint
+from utils.audit_seal import key_material
+from utils.metrics import REGISTRY
+
+CHAIN_CHECKPOINT = 'audit_chain'
+VERIFY_CHECKPOINT = 'audit_verify'
+GENESIS = bytes(32)
+
+LEAF, NODE, LINK, CHECKPOINT = b'\x00', b'\x01', b'\x02', b'\x03'
+
+# 参与哈希的列（chain_hash 本身除外）
+CANONICAL_COLUMNS = (
+    AuditLog.id, AuditLog.user, AuditLog.action_type, AuditLog.message, AuditLog.detail, AuditLog.level,
+    AuditLog.timestamp, AuditLog.ip_address, AuditLog.user_agent, AuditLog.sealed
+)
+
+CHAINED = REGISTRY.counter(
+    'qrng_audit_chain_entries_total', 'Audit log entries linked into the hash chain')
+CHAIN_FAILURES = REGISTRY.counter(
+    'qrng_audit_chain_failures_total', 'Audit chain verification failures', ('reason',))
+
+
+def _sha256(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part)
+    return digest.digest()
+
+
+def leaf_hash(row):
+    """按 CANONICAL_COLUMNS 顺序的行计算叶子哈希"""
+    values = list(row)
+    values[6] = values[6].isoformat() if values[6] else None
+    values[9] = bytes(values[9]).hex() if values[9] is not None else None
+    return _sha256(LEAF, json.dumps(values, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def link(prev, leaf):
+    return _sha256(LINK, prev, leaf)
+
+
+# ---- Merkle 树（RFC 6962 / 9162：n 不是 2 的幂时按不超过 n 的最大 2 的幂切分） ----
+
+def _split(n):
+    k = 1
+    while k * 2 < n:
+        k *= 2
+    return k
+
+
+def merkle_root(leaves):
+    if len(leaves) == 1:
+        return leaves[0]
+    k = _split(len(leaves))
+    return _sha256(NODE, merkle_root(leaves[:k]), merkle_root(leaves[k:]))
+
+
+def inclusion_path(leaves, index):
+    """leaves[index] 到根的兄弟节点列表（自底向上）"""
+    if len(leaves) <= 1:
+        return []
+    k = _split(len(leaves))
+    if index < k:
+        return inclusion_path(leaves[:k], index) + [merkle_root(leaves[k:])]
+    return inclusion_path(leaves[k:], index - k) + [merkle_root(leaves[:k])]
+
+
+def verify_inclusion(leaf, index, size, path, root):
+    """RFC 9162 2.1.3.2"""
+    if index >= size:
+        return False
+    fn, sn, r = index, size - 1, leaf
+    for p in path:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            r = _sha256(NODE, p, r)
+            while not fn & 1 and fn != 0:
+                fn >>= 1
+                sn >>= 1
+        else:
+            r = _sha256(NODE, r, p)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and r == root
+
+
+# ---- 检查点 ----
+
+def _mac_key():
+    app = current_app._get_current_object()
+    if 'audit_chain_key' not in app.extensions:
+        material = key_material(app.config)
+        app.extensions['audit_chain_key'] = HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None, info=b'qrng-audit-checkpoint'
+        ).derive(material) if material else None
+    return app.extensions['audit_chain_key']
+
+
+def checkpoint_digest(prev_digest, seq, first_id, last_id, count, root, prev_chain, chain_head):
+    header = f'{seq}:{first_id}:{last_id}:{count}'.encode('ascii')
+    return _sha256(CHECKPOINT, prev_digest, header, root, prev_chain, chain_head)
+
+
+def _expected_mac(digest):
+    key = _mac_key()
+    return hmac.new(key, digest, hashlib.sha256).digest() if key else None
+
+
+def _job(name):
+    job = db.session.get(JobCheckpoint, name)
+    if job is None:
+        job = JobCheckpoint(name=name, cursor='', cycles=0)
+        db.session.add(job)
+    return job
+
+
+def _segment_rows(first_id, last_id):
+    return db.session.query(*CANONICAL_COLUMNS, AuditLog.chain_hash).filter(
+        AuditLog.id >= first_id, AuditLog.id <= last_id
+    ).order_by(AuditLog.id).all()
+
+
+def chain_pending(now=None):
+    """按 id 顺序给尚未链接的日志补链，返回本次链接的条数"""
+    config = current_app.config
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=config.get('AUDIT_CHAIN_GRACE_SECONDS', 5))
+    batch_size = config.get('AUDIT_CHAIN_BATCH_SIZE', 1000)
+    job = _job(CHAIN_CHECKPOINT)
+    last_id = int(job.cursor or 0)
+    # 长事务可能在游标越过之后才提交更小的 id：从最早的缺口重新链接其后的行。
+    # 只查最后一个检查点之后（已由检查点背书的段不能改写，缺口落在其中时按篡改上报）
+    sealed_to = db.session.query(db.func.max(AuditCheckpoint.last_id)).scalar() or 0
+    gap = db.session.query(db.func.min(AuditLog.id)).filter(
+        AuditLog.id > sealed_to, AuditLog.id <= last_id, AuditLog.chain_hash.is_(None)
+    ).scalar()
+    if gap is not None:
+        last_id = gap - 1
+    prev = db.session.query(AuditLog.chain_hash).filter(
+        AuditLog.id <= last_id, AuditLog.chain_hash.isnot(None)
+    ).order_by(AuditLog.id.desc()).limit(1).scalar() or GENESIS
+
+    total = 0
+    table = AuditLog.__table__
+    while True:
+        rows = db.session.query(*CANONICAL_COLUMNS).filter(
+            AuditLog.id > last_id, AuditLog.timestamp <= cutoff
+        ).order_by(AuditLog.id).limit(batch_size).all()
+        if not rows:
+            break
+        links = []
+        for row in rows:
+            prev = link(prev, leaf_hash(row))
+            links.append({'_id': row.id, '_chain': prev})
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('_id')).values(chain_hash=bindparam('_chain')),
+            links
+        )
+        last_id = rows[-1].id
+        job.cursor = str(last_id)
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+        total += len(rows)
+        if len(rows) < batch_size:
+            break
+    CHAINED.inc(total)
+    db.session.commit()
+    return total
+
+
+def checkpoint_pending():
+    """已链接的日志每满 AUDIT_CHECKPOINT_SIZE 条生成一个检查点，返回新检查点数"""
+    size = current_app.config.get('AUDIT_CHECKPOINT_SIZE', 1024)
+    chained_to = int(_job(CHAIN_CHECKPOINT).cursor or 0)
+    last = AuditCheckpoint.query.order_by(AuditCheckpoint.seq.desc()).first()
+    created = 0
+    while True:
+        after = last.last_id if last else 0
+        ids = [i for (i,) in db.session.query(AuditLog.id).filter(
+            AuditLog.id > after, AuditLog.id <= chained_to
+        ).order_by(AuditLog.id).limit(size)]
+        if len(ids) < size:
+            break
+        rows = _segment_rows(ids[0], ids[-1])
+        prev_chain = last.chain_head if last else GENESIS
+        # 生成前确认这一段的链没有被改过，不为已篡改的数据背书
+        if _check_chain(rows, prev_chain) is not None:
+            break
+        leaves = [leaf_hash(row[:-1]) for row in rows]
+        seq = (last.seq if last else 0) + 1
+        root = merkle_root(leaves)
+        digest = checkpoint_digest(last.digest if last else GENESIS, seq, ids[0], ids[-1], len(rows),
+                                   root, prev_chain, rows[-1].chain_hash)
+        last = AuditCheckpoint(seq=seq, first_id=ids[0], last_id=ids[-1], count=len(rows), merkle_root=root,
+                               prev_chain=prev_chain, chain_head=rows[-1].chain_hash, digest=digest,
+                               mac=_expected_mac(digest))
+        db.session.add(last)
+        db.session.commit()
+        created += 1
+    return created
+
+
+def _check_chain(rows, prev):
+    """逐条重算链，返回第一条不一致的日志 id，全部一致时返回 None"""
+    for row in rows:
+        prev = link(prev, leaf_hash(row[:-1]))
+        if row.chain_hash is None or bytes(row.chain_hash) != prev:
+            return row.id
+    return None
+
+
+def verify_checkpoint(checkpoint, prev_digest):
+    """校验一个段，返回失败列表"""
+    failures = []
+    expected = checkpoint_digest(prev_digest, checkpoint.seq, checkpoint.first_id, checkpoint.last_id,
+                                 checkpoint.count, checkpoint.merkle_root, checkpoint.prev_chain,
+                                 checkpoint.chain_head)
+    if expected != checkpoint.digest:
+        failures.append({'seq': checkpoint.seq, 'reason': 'checkpoint_digest'})
+    mac = _expected_mac(checkpoint.digest)
+    if mac is not None and (checkpoint.mac is None or not hmac.compare_digest(mac, checkpoint.mac)):
+        failures.append({'seq': checkpoint.seq, 'reason': 'checkpoint_mac'})
+
+    rows = _segment_rows(checkpoint.first_id, checkpoint.last_id)
+    if len(rows) != checkpoint.count:
+        failures.append({'seq': checkpoint.seq, 'reason': 'entry_count', 'expected': checkpoint.count, 'found': len(rows)})
+    broken = _check_chain(rows, checkpoint.prev_chain)
+    if broken is not None:
+        failures.append({'seq': checkpoint.seq, 'reason': 'chain', 'id': broken})
+    elif rows and bytes(rows[-1].chain_hash) != checkpoint.chain_head:
+        failures.append({'seq': checkpoint.seq, 'reason': 'chain_head'})
+    if rows and merkle_root([leaf_hash(row[:-1]) for row in rows]) != checkpoint.merkle_root:
+        failures.append({'seq': checkpoint.seq, 'reason': 'merkle_root'})
+    return failures
+
+
+def _checkpoint_digests():
+    """全部检查点的摘要链是否连续（只读检查点行），返回 ({seq: 上一个摘要}, 失败列表)"""
+    prev_digests, failures = {}, []
+    prev, expected_seq = GENESIS, 1
+    for seq, digest in db.session.query(AuditCheckpoint.seq, AuditCheckpoint.digest).order_by(AuditCheckpoint.seq):
+        if seq != expected_seq:
+            failures.append({'seq': expected_seq, 'reason': 'checkpoint_missing'})
+        prev_digests[seq] = prev
+        prev, expected_seq = digest, seq + 1
+    return prev_digests, failures
+
+
+def _verify_tail(after, prev_chain, end_id=None):
+    """校验最后一个检查点之后已链接的日志（截止 end_id），返回 (条数, 失败列表)"""
+    chained_to = int(_job(CHAIN_CHECKPOINT).cursor or 0)
+    upper = min(chained_to, end_id) if end_id is not None else chained_to
+    if upper <= after:
+        return 0, []
+    rows = _segment_rows(after + 1, upper)
+    broken = _check_chain(rows, prev_chain)
+    return len(rows), ([{'seq': None, 'reason': 'chain', 'id': broken}] if broken is not None else [])
+
+
+def verify_range(start_id=None, end_id=None):
+    """
+    校验 id 在 [start_id, end_id] 内的日志：全部检查点的摘要链 + 与区间相交的段 + 区间内尚未生成检查点的部分
+    返回报告 {'ok', 'checkpoints', 'entries', 'failures'}
+    """
+    start_id, end_id = start_id or 0, end_id
+    prev_digests, failures = _checkpoint_digests()
+    query = AuditCheckpoint.query.filter(AuditCheckpoint.last_id >= start_id)
+    if end_id is not None:
+        query = query.filter(AuditCheckpoint.first_id <= end_id)
+    report = {'checkpoints': 0, 'entries': 0}
+    for checkpoint in query.order_by(AuditCheckpoint.seq):
+        failures.extend(verify_checkpoint(checkpoint, prev_digests.get(checkpoint.seq, GENESIS)))
+        report['checkpoints'] += 1
+        report['entries'] += checkpoint.count
+
+    last = AuditCheckpoint.query.order_by(AuditCheckpoint.seq.desc()).first()
+    after = last.last_id if last else 0
+    if end_id is None or end_id > after:
+        count, tail_failures = _verify_tail(after, last.chain_head if last else GENESIS, end_id)
+        report['entries'] += count
+        failures.extend(tail_failures)
+    report['failures'] = failures
+    report['ok'] = not failures
+    return report
+
+
+def inclusion_proof(log_id):
+    """单条日志的包含证明；尚未链接或尚未进入检查点时返回 status 说明"""
+    row = db.session.query(*CANONICAL_COLUMNS, AuditLog.chain_hash).filter(AuditLog.id == log_id).first()
+    if row is None:
+        return None
+    if row.chain_hash is None:
+        return {'status': 'pending_chain'}
+    leaf = leaf_hash(row[:-1])
+    checkpoint = AuditCheckpoint.query.filter(
+        AuditCheckpoint.first_id <= log_id, AuditCheckpoint.last_id >= log_id
+    ).first()
+    if checkpoint is None:
+        return {'status': 'pending_checkpoint', 'leaf': leaf.hex(), 'chain_hash': bytes(row.chain_hash).hex()}
+
+    rows = db.session.query(*CANONICAL_COLUMNS).filter(
+        AuditLog.id >= checkpoint.first_id, AuditLog.id <= checkpoint.last_id
+    ).order_by(AuditLog.id).all()
+    leaves = [leaf_hash(r) for r in rows]
+    index = [r.id for r in rows].index(log_id)
+    path = inclusion_path(leaves, index)
+    return {
+        'status': 'checkpointed',
+        'leaf': leaf.hex(),
+        'index': index,
+        'tree_size': checkpoint.count,
+        'path': [p.hex() for p in path],
+        'root': checkpoint.merkle_root.hex(),
+        'verified': verify_inclusion(leaf, index, checkpoint.count, path, checkpoint.merkle_root),
+        'checkpoint': {
+            'seq': checkpoint.seq,
+            'first_id': checkpoint.first_id,
+            'last_id': checkpoint.last_id,
+            'digest': checkpoint.digest.hex(),
+            'created_at': checkpoint.created_at.isoformat() if checkpoint.created_at else None
+        }
+    }
+
+
+def _record_failures(failures, user, ip_address):
+    """每个问题只告警一次（同一进程内）"""
+    alerted = current_app.extensions.setdefault('audit_chain_alerts', set())
+    for failure in failures:
+        CHAIN_FAILURES.inc(reason=failure['reason'])
+        key = (failure.get('seq'), failure['reason'], failure.get('id'))
+        if key in alerted:
+            continue
+        alerted.add(key)
+        db.session.add(AuditLog(
+            user=user,
+            action_type='AUDIT_TAMPER',
+            message=f"审计日志校验失败: {failure['reason']}",
+            detail=json.dumps(failure, ensure_ascii=False),
+            level='error',
+            ip_address=ip_address
+        ))
+    if failures:
+        db.session.commit()
+
+
+def run_audit_chain(user='system', ip_address=None, max_checkpoints=None):
+    """补链、生成检查点，再从游标处继续校验若干个段；返回报告"""
+    report = {'chained': chain_pending(), 'checkpoints_created': checkpoint_pending(),
+              'verified_checkpoints': 0, 'cycle_completed': False}
+    remaining = max_checkpoints or current_app.config.get('AUDIT_VERIFY_MAX_CHECKPOINTS', 50)
+
+    job = _job(VERIFY_CHECKPOINT)
+    prev_digests, failures = _checkpoint_digests()
+    checkpoints = AuditCheckpoint.query.filter(
+        AuditCheckpoint.seq > int(job.cursor or 0)
+    ).order_by(AuditCheckpoint.seq).limit(remaining).all()
+    for checkpoint in checkpoints:
+        failures.extend(verify_checkpoint(checkpoint, prev_digests.get(checkpoint.seq, GENESIS)))
+        job.cursor = str(checkpoint.seq)
+    report['verified_checkpoints'] = len(checkpoints)
+
+    if len(checkpoints) < remaining:
+        # 检查点都校验过了：再校验尚未生成检查点的尾部，一轮结束
+        last = AuditCheckpoint.query.order_by(AuditCheckpoint.seq.desc()).first()
+        _, tail_failures = _verify_tail(last.last_id if last else 0, last.chain_head if last else GENESIS)
+        failures.extend(tail_failures)
+        job.cursor = ''
+        job.cycles = (job.cycles or 0) + 1
+        report['cycle_completed'] = True
+    job.updated_at = datetime.utcnow()
+    db.session.commit()
+
+    _record_failures(failures, user, ip_address)
+    report['failures'] = failures
+    report['cycles'] = job.cycles
+    return report
+
+
+def chain_status():
+    chain = db.session.get(JobCheckpoint, CHAIN_CHECKPOINT)
+    verify = db.session.get(JobCheckpoint, VERIFY_CHECKPOINT)
+    last = AuditCheckpoint.query.order_by(AuditCheckpoint.seq.desc()).first()
+    return {
+        'chained_to': int(chain.cursor or 0) if chain else 0,
+        'checkpoints': last.seq if last else 0,
+        'checkpointed_to': last.last_id if last else 0,
+        'verify_cursor': verify.cursor if verify else '',
+        'verify_cycles': verify.cycles if verify else 0,
+        'verified_at': verify.updated_at.isoformat() if verify and verify.updated_at else None
+    }
+
+
+def reset_chain():
+    """清空链状态（数据重置时调用，不提交）"""
+    AuditCheckpoint.query.delete()
+    JobCheckpoint.query.filter(JobCheckpoint.name.in_((CHAIN_CHECKPOINT, VERIFY_CHECKPOINT))).delete()
+    current_app.extensions.pop('audit_chain_alerts', None)
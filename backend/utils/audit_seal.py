@@ -0,0 +1,197 @@
+"""
+审计日志字段加密 - message / detail / ip_address / user_agent 用日志密钥密封存储，附带盲索引
+
+- 写入：flush 前收集本次新增的全部日志，整批只做一次 AES-256-CTR 调用：
+  各条明文按 16 字节对齐拼接后加密，每条的 IV 是批起始计数器加上它在批内的块偏移，可单独解密；
+  每条附 HMAC-SHA256 标签（覆盖 IV、密文和日志所属用户，防篡改、防挪到其他用户名下）
+- 检索：日志里出现的密钥ID与 IP 写入 audit_log_index（HMAC(索引密钥, 类型 + 值) 的前 16 字节），
+  按密钥ID / IP 精确查找只查索引，不解密全表；列表只解密当前页
+- user / action_type / level / timestamp 保持明文：访问范围过滤与仪表盘统计依赖它们
+- 密钥来自 AUDIT_LOG_KEY（base64），未配置时从 MASTER_KEY 派生（HKDF，与文件密钥封装互不复用）
+
+密封格式：版本(1) | IV(16) | 标签(16) | 密文，明文为 JSON 数组 [message, detail, ip_address, user_agent]
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from flask import current_app, has_app_context
+from sqlalchemy import event, insert
+
+from extensions import db
+from models import AuditLog, AuditLogIndex
+
+SEAL_VERSION = 1
+SEALED_FIELDS = ('message', 'detail', 'ip_address', 'user_agent')
+SEALED_PLACEHOLDER = '[sealed]'
+KEY_ID_PATTERN = re.compile(r'KEY-\d{8}-[0-9A-Za-z]+')
+
+_HEADER = 1 + 16 + 16
+_COUNTER_MOD = 1 << 128
+
+
+class LogSealer:
+    """日志密钥：加密、认证标签与盲索引各用一把由 HKDF 派生的子密钥"""
+
+    def __init__(self, key_material):
+        okm = HKDF(algorithm=hashes.SHA256(), length=96, salt=None, info=b'qrng-audit-log').derive(key_material)
+        self._enc, self._mac, self._index = okm[:32], okm[32:64], okm[64:]
+
+    def blind_index(self, kind, value):
+        return hmac.new(self._index, f'{kind}\0{value}'.encode('utf-8'), hashlib.sha256).digest()[:16]
+
+    def _tag(self, iv, ciphertext, aad):
+        msg = bytes([SEAL_VERSION]) + iv + len(aad).to_bytes(2, 'big') + aad + ciphertext
+        return hmac.new(self._mac, msg, hashlib.sha256).digest()[:16]
+
+    def seal_many(self, items):
+        """[(aad, 明文)] -> [密封值]；整批一次 CTR 调用"""
+        start = int.from_bytes(os.urandom(16), 'big')
+        stream, offsets = bytearray(), []
+        for _, plaintext in items:
+            # 每条至少占一个块，保证批内 IV 互不相同
+            offsets.append(len(stream))
+            stream += plaintext + bytes(max(16, -(-len(plaintext) // 16) * 16) - len(plaintext))
+        encryptor = Cipher(algorithms.AES(self._enc), modes.CTR(start.to_bytes(16, 'big'))).encryptor()
+        keyed = encryptor.update(bytes(stream)) + encryptor.finalize()
+
+        sealed = []
+        for (aad, plaintext), offset in zip(items, offsets):
+            iv = ((start + offset // 16) % _COUNTER_MOD).to_bytes(16, 'big')
+            ciphertext = keyed[offset:offset + len(plaintext)]
+            sealed.append(bytes([SEAL_VERSION]) + iv + self._tag(iv, ciphertext, aad) + ciphertext)
+        return sealed
+
+    def open(self, blob, aad):
+        """校验标签并解密，失败时抛出 ValueError"""
+        blob = bytes(blob)
+        if len(blob) < _HEADER or blob[0] != SEAL_VERSION:
+            raise ValueError('不支持的密封格式')
+        iv, tag, ciphertext = blob[1:17], blob[17:_HEADER], blob[_HEADER:]
+        if not hmac.compare_digest(tag, self._tag(iv, ciphertext, aad)):
+            raise ValueError('密封日志校验失败')
+        decryptor = Cipher(algorithms.AES(self._enc), modes.CTR(iv)).decryptor()
+        return decryptor.update(ciphertext) + decryptor.finalize()
+
+
+def key_material(config):
+    if config.get('AUDIT_LOG_KEY'):
+        return base64.b64decode(config['AUDIT_LOG_KEY'])
+    from config import Config
+    return Config.get_master_key_bytes()
+
+
+def get_sealer():
+    """当前应用的日志密钥；未开启密封时为 None"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('audit_sealer')
+
+
+def _aad(user):
+    return (user or '').encode('utf-8')
+
+
+def _index_values(log):
+    text = f'{log.message or ""}\n{log.detail or ""}'
+    values = {('key', key_id) for key_id in KEY_ID_PATTERN.findall(text)}
+    if log.ip_address:
+        values.add(('ip', log.ip_address))
+    return values
+
+
+def seal_entries(logs, sealer):
+    """密封一批尚未写入的日志，把盲索引暂存在对象上，插入后由 after_flush 写入索引表"""
+    items = []
+    for log in logs:
+        log._seal_index = {sealer.blind_index(kind, value) for kind, value in _index_values(log)}
+        fields = [getattr(log, name) for name in SEALED_FIELDS]
+        items.append((_aad(log.user), json.dumps(fields, ensure_ascii=False).encode('utf-8')))
+    for log, blob in zip(logs, sealer.seal_many(items)):
+        log.sealed = blob
+        for name in SEALED_FIELDS:
+            setattr(log, name, None)
+
+
+def open_fields(blob, user, sealer=None):
+    """解封为 {字段: 值}；没有密钥或校验失败时返回占位内容"""
+    sealer = sealer or get_sealer()
+    if sealer is not None:
+        try:
+            return dict(zip(SEALED_FIELDS, json.loads(sealer.open(blob, _aad(user)))))
+        except ValueError:
+            pass
+    return {'message': SEALED_PLACEHOLDER, 'detail': None, 'ip_address': None, 'user_agent': None}
+
+
+def unseal_rows(rows, fields):
+    """
+    列表行（按 fields 顺序的列，另需 user 与 sealed 列）转为元组，已密封的行就地解密
+    只在当前页上调用，不扫描全表
+    """
+    positions = [(fields.index(name), name) for name in SEALED_FIELDS if name in fields]
+    result = []
+    for row in rows:
+        values = tuple(row)[:len(fields)]
+        if row.sealed is not None:
+            opened = open_fields(row.sealed, row.user)
+            values = list(values)
+            for position, name in positions:
+                values[position] = opened[name]
+            values = tuple(values)
+        result.append(values)
+    return result
+
+
+def lookup_condition(kind, value, plaintext):
+    """
+    按密钥ID（kind='key'）或 IP（kind='ip'）精确查找日志的条件：
+    密封日志查盲索引，未密封的旧日志用 plaintext 条件
+    """
+    condition = plaintext & AuditLog.sealed.is_(None)
+    sealer = get_sealer()
+    if sealer is None:
+        return condition
+    indexed = db.session.query(AuditLogIndex.log_id).filter(AuditLogIndex.digest == sealer.blind_index(kind, value))
+    return condition | AuditLog.id.in_(indexed)
+
+
+def _before_flush(session, flush_context, instances):
+    sealer = get_sealer()
+    if sealer is None:
+        return
+    logs = [obj for obj in session.new if isinstance(obj, AuditLog) and obj.sealed is None]
+    if logs:
+        seal_entries(logs, sealer)
+
+
+def _after_flush(session, flush_context):
+    rows = []
+    for obj in session.new:
+        digests = getattr(obj, '_seal_index', None) if isinstance(obj, AuditLog) else None
+        if digests:
+            rows.extend({'log_id': obj.id, 'digest': digest} for digest in digests)
+            obj._seal_index = None
+    if rows:
+        session.connection().execute(insert(AuditLogIndex.__table__), rows)
+
+
+def init_audit_seal(app):
+    """开启 AUDIT_SEAL_ENABLED 时加载日志密钥；会话钩子只注册一次，未开启密封的应用中不做任何事"""
+    if app.config.get('AUDIT_SEAL_ENABLED'):
+        key = key_material(app.config)
+        if not key:
+            raise RuntimeError('AUDIT_SEAL_ENABLED 需要配置 AUDIT_LOG_KEY 或 MASTER_KEY')
+        app.extensions['audit_sealer'] = LogSealer(key)
+    else:
+        app.extensions.pop('audit_sealer', None)
+
+    if not event.contains(db.session, 'before_flush', _before_flush):
+        event.listen(db.session, 'before_flush', _before_flush)
+        event.listen(db.session, 'after_flush', _after_flush)
@@ -0,0 +1,299 @@
+"""
+密钥记录批量操作 - 删除 / 转移所有者 / 重新加密
+
+- 目标记录由 ID 列表或过滤条件确定，按 BULK_CHUNK_SIZE 分块：每块一条批量 SQL、一次提交
+- 删除与转移在同一事务中按所有者调整存储用量计数器
+- 文件读写（删除、重新加密）在线程池中并行执行
+- 先提交数据库再删除旧文件：中途失败最多留下孤立 .enc，由存储回收清理，不会出现记录指向已删除文件
+- 每个任务的进度保存在内存中，可异步执行后轮询
+"""
+import hashlib
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import update
+
+from extensions import db
+from models import KeyRecord, AuditLog
+from utils.crypto import wrap_key
+from utils.quota import release_records, transfer_records
+from utils.vault import reencrypt_file
+
+ACTIONS = ('delete', 'transfer', 'reencrypt')
+FILTER_FIELDS = ('owner', 'algorithm', 'created_before', 'created_after')
+MAX_JOBS = 100
+MAX_ERRORS = 20
+
+AUDIT_ACTIONS = {'delete': 'BULK_DELETE', 'transfer': 'BULK_TRANSFER', 'reencrypt': 'BULK_REENCRYPT'}
+
+
+class BulkJob:
+    def __init__(self, action, user, params):
+        self.id = uuid.uuid4().hex[:12]
+        self.action = action
+        self.user = user
+        self.params = params
+        self.status = 'pending'  # pending, running, done, failed
+        self.total = 0
+        self.processed = 0
+        self.failed = 0
+        self.errors = []
+        self.started_at = None
+        self.finished_at = None
+
+    def add_error(self, key_id, error):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'key_id': key_id, 'error': str(error)})
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'action': self.action,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'failed': self.failed,
+            'progress': round(self.processed / self.total, 4) if self.total else 1.0,
+            'errors': self.errors,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+_jobs_lock = threading.Lock()
+
+
+def _jobs(app=None):
+    app = app or current_app
+    return app.extensions.setdefault('bulk_jobs', OrderedDict())
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs().get(job_id)
+
+
+def _register(job):
+    with _jobs_lock:
+        jobs = _jobs()
+        jobs[job.id] = job
+        while len(jobs) > MAX_JOBS:
+            jobs.popitem(last=False)
+
+
+def _parse_time(value, field):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} 必须是 ISO 8601 时间')
+
+
+def build_query(key_ids=None, filters=None):
+    """由 ID 列表和/或过滤条件构造查询；两者都为空时拒绝，避免误操作全表"""
+    filters = {k: v for k, v in (filters or {}).items() if v not in (None, '')}
+    unknown = set(filters) - set(FILTER_FIELDS)
+    if unknown:
+        raise ValueError(f"不支持的过滤条件: {', '.join(sorted(unknown))}")
+    if not key_ids and not filters:
+        raise ValueError('必须提供 key_ids 或 filter')
+
+    query = db.session.query(KeyRecord.id)
+    if key_ids:
+        query = query.filter(KeyRecord.id.in_(key_ids))
+    if 'owner' in filters:
+        query = query.filter(KeyRecord.owner == filters['owner'])
+    if 'algorithm' in filters:
+        query = query.filter(KeyRecord.algorithm == filters['algorithm'])
+    if 'created_before' in filters:
+        query = query.filter(KeyRecord.created_at < _parse_time(filters['created_before'], 'created_before'))
+    if 'created_after' in filters:
+        query = query.filter(KeyRecord.created_at >= _parse_time(filters['created_after'], 'created_after'))
+    return query.order_by(KeyRecord.id)
+
+
+def _chunks(items, size):
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _safe(func):
+    """线程池任务包装：返回异常而不是抛出，便于逐条统计失败"""
+    def run(*args):
+        try:
+            func(*args)
+            return None
+        except Exception as e:
+            return e
+    return run
+
+
+def remove_files(paths, workers=8):
+    """并行删除文件，忽略已不存在的文件，返回失败数"""
+    if not paths:
+        return 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='qrng-bulk') as pool:
+        errors = [e for e in pool.map(_safe(_remove_file), paths) if e is not None]
+    for error in errors:
+        current_app.logger.error(f'删除文件失败: {error}')
+    return len(errors)
+
+
+def _delete_chunk(job, ids, pool):
+    paths = [p for (p,) in db.session.query(KeyRecord.storage_path).filter(
+        KeyRecord.id.in_(ids), KeyRecord.storage_path.isnot(None))]
+    release_records(ids)
+    KeyRecord.query.filter(KeyRecord.id.in_(ids)).delete(synchronize_session=False)
+    db.session.commit()
+    for path, error in zip(paths, pool.map(_safe(_remove_file), paths)):
+        if error is not None:
+            current_app.logger.error(f'批量删除文件失败 {path}: {error}')
+    job.processed += len(ids)
+
+
+def _transfer_chunk(job, ids, pool):
+    transfer_records(ids, job.params['new_owner'])
+    db.session.execute(
+        update(KeyRecord).where(KeyRecord.id.in_(ids)).values(owner=job.params['new_owner']),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    job.processed += len(ids)
+
+
+def _reencrypt_one(record, suite, frame_size):
+    folder = os.path.dirname(record['storage_path'])
+    new_path = os.path.join(folder, f"{record['id']}.{uuid.uuid4().hex[:8]}.enc")
+    key, nonce_prefix, _, content_sha256, cipher_checksum = reencrypt_file(
+        record['storage_path'], record['wrapped_key'], record['nonce'], new_path, suite, frame_size)
+    if record['content_sha256'] and record['content_sha256'] != content_sha256:
+        _remove_file(new_path)
+        raise ValueError('重新加密前后明文摘要不一致')
+    return {
+        'id': record['id'],
+        'algorithm': suite.name,
+        'storage_path': new_path,
+        'nonce': nonce_prefix,
+        'wrapped_key': wrap_key(key),
+        'key_fingerprint': hashlib.sha256(key).hexdigest()[:16],
+        'content_sha256': content_sha256,
+        'cipher_checksum': cipher_checksum,
+        'integrity_status': None,
+        'last_verified_at': None
+    }
+
+
+def _reencrypt_chunk(job, ids, pool):
+    rows = db.session.query(
+        KeyRecord.id, KeyRecord.storage_path, KeyRecord.wrapped_key, KeyRecord.nonce, KeyRecord.content_sha256
+    ).filter(KeyRecord.id.in_(ids)).all()
+    records = [r._asdict() for r in rows if r.storage_path and r.wrapped_key]
+    # 模拟加密记录没有密文，跳过但计入进度
+    job.processed += len(ids) - len(records)
+
+    suite, frame_size = job.params['suite'], job.params['frame_size']
+
+    def run(record):
+        try:
+            return _reencrypt_one(record, suite, frame_size), None
+        except Exception as e:
+            return None, e
+
+    updates, old_paths = [], []
+    for record, (values, error) in zip(records, pool.map(run, records)):
+        if error is not None:
+            job.add_error(record['id'], f'{type(error).__name__}: {error}'.rstrip(': '))
+            job.processed += 1
+            continue
+        updates.append(values)
+        old_paths.append(record['storage_path'])
+
+    if updates:
+        try:
+            db.session.execute(update(KeyRecord), updates)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            list(pool.map(_safe(_remove_file), [u['storage_path'] for u in updates]))
+            raise
+        list(pool.map(_safe(_remove_file), old_paths))
+    job.processed += len(updates)
+
+
+HANDLERS = {'delete': _delete_chunk, 'transfer': _transfer_chunk, 'reencrypt': _reencrypt_chunk}
+
+
+def run_job(job, ids, ip_address=None):
+    """按块执行批量操作，完成后写一条审计日志"""
+    config = current_app.config
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    job.total = len(ids)
+    handler = HANDLERS[job.action]
+    started = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=config.get('BULK_IO_WORKERS', 8),
+                                thread_name_prefix='qrng-bulk') as pool:
+            for chunk in _chunks(ids, config.get('BULK_CHUNK_SIZE', 500)):
+                handler(job, chunk, pool)
+        job.status = 'done'
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'批量操作 {job.id} 失败: {e}')
+        job.status = 'failed'
+        job.errors.append({'key_id': None, 'error': str(e)})
+    job.finished_at = datetime.utcnow()
+
+    target = f", 新所有者: {job.params['new_owner']}" if job.action == 'transfer' else ''
+    if job.action == 'reencrypt':
+        target = f", 新算法: {job.params['suite'].name}"
+    log = AuditLog(
+        user=job.user,
+        action_type=AUDIT_ACTIONS[job.action],
+        message=f'批量操作 {job.action}: {job.processed - job.failed}/{job.total} 条记录',
+        detail=f'任务: {job.id}, 失败: {job.failed}, 状态: {job.status}{target}, '
+               f'耗时: {time.perf_counter() - started:.2f}s',
+        level='warning' if job.failed or job.status == 'failed' else 'info',
+        ip_address=ip_address
+    )
+    db.session.add(log)
+    db.session.commit()
+    return job
+
+
+def start_job(job, ids, ip_address=None, background=True):
+    """登记任务并执行；background 时在后台线程中运行，立即返回"""
+    _register(job)
+    if not background:
+        return run_job(job, ids, ip_address)
+
+    app = current_app._get_current_object()
+
+    def target():
+        with app.app_context():
+            try:
+                run_job(job, ids, ip_address)
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=target, name=f'qrng-bulk-{job.id}', daemon=True).start()
+    return job
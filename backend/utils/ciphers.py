@@ -0,0 +1,369 @@
+"""
+文件加密算法套件注册表 + 分帧流式格式
+
+分帧格式（.enc 文件）：
+    header = MAGIC(4) | version(1) | suite_id(1) | frame_size(4, 大端) | nonce_prefix(7)
+    frames = 每帧 ciphertext(<= frame_size) + tag(16)，最后一帧可不满
+    nonce  = nonce_prefix(7) | 帧序号(4, 大端) | 末帧标志(1)
+    AAD    = header，绑定算法与帧大小；末帧标志防止截断
+
+流式加解密复用预分配的帧缓冲（readinto + memoryview），稳态下每帧不产生新的大对象；
+AES-256-GCM 走 Cipher 接口的 update_into 直接写入输出缓冲，其它 AEAD 每帧一次分配
+
+旧格式记录（单次 AES-256-GCM，nonce 为 12 字节 IV）仍可解密，见 is_framed
+"""
+import os
+import struct
+import time
+
+from cryptography.exceptions import InvalidTag, UnsupportedAlgorithm
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, AESGCMSIV, ChaCha20Poly1305
+
+MAGIC = b'QVF1'
+VERSION = 1
+NONCE_PREFIX_SIZE = 7
+TAG_SIZE = 16
+HEADER = struct.Struct('>4sBBI7s')
+HEADER_SIZE = HEADER.size
+DEFAULT_FRAME_SIZE = 64 * 1024
+MAX_FRAMES = 2 ** 32
+# update_into 要求输出缓冲比输入多 block_size - 1 字节
+INTO_SLACK = 15
+
+
+class CipherSuite:
+    def __init__(self, name, suite_id, aead_class, block_cipher=None):
+        self.name = name
+        self.suite_id = suite_id
+        self.aead_class = aead_class
+        # 可通过 Cipher 接口（update_into）逐帧加解密的分组算法，None 表示只能整帧调用 AEAD
+        self.block_cipher = block_cipher
+        self.key_size = 32
+        self._available = None
+
+    @property
+    def available(self):
+        """底层 OpenSSL 是否支持该算法"""
+        if self._available is None:
+            try:
+                self.aead_class(os.urandom(self.key_size)).encrypt(b'\0' * 12, b'', None)
+                self._available = True
+            except UnsupportedAlgorithm:
+                self._available = False
+        return self._available
+
+    def generate_key(self):
+        return os.urandom(self.key_size)
+
+    def aead(self, key):
+        return self.aead_class(key)
+
+
+SUITES = {}
+
+
+def register_suite(suite):
+    SUITES[suite.name] = suite
+    return suite
+
+
+AES_256_GCM = register_suite(CipherSuite('AES-256-GCM', 1, AESGCM, algorithms.AES))
+CHACHA20_POLY1305 = register_suite(CipherSuite('ChaCha20-Poly1305', 2, ChaCha20Poly1305))
+AES_256_GCM_SIV = register_suite(CipherSuite('AES-256-GCM-SIV', 3, AESGCMSIV))
+
+
+def get_suite(name):
+    """按名称取可用算法，未知或不可用时抛 ValueError"""
+    suite = SUITES.get(name)
+    if suite is None:
+        raise ValueError(f'不支持的算法: {name}')
+    if not suite.available:
+        raise ValueError(f'当前环境不支持算法: {name}')
+    return suite
+
+
+def suite_by_id(suite_id):
+    for suite in SUITES.values():
+        if suite.suite_id == suite_id:
+            return suite
+    raise ValueError(f'未知的算法编号: {suite_id}')
+
+
+def available_suites():
+    return [s for s in SUITES.values() if s.available]
+
+
+def has_aes_ni():
+    """检测 CPU 是否支持 AES-NI（仅 Linux /proc/cpuinfo，其它平台返回 None）"""
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith(('flags', 'Features')):
+                    return 'aes' in line.split(':', 1)[1].split()
+    except OSError:
+        pass
+    return None
+
+
+def is_framed(nonce):
+    """分帧格式的记录存 7 字节 nonce 前缀，旧格式为 12 字节 IV"""
+    return nonce is not None and len(nonce) == NONCE_PREFIX_SIZE
+
+
+def _nonce(prefix, counter, final):
+    if counter >= MAX_FRAMES:
+        raise ValueError('帧数超出上限')
+    return prefix + counter.to_bytes(4, 'big') + (b'\x01' if final else b'\x00')
+
+
+class FrameEncryptor:
+    """逐帧加密：调用方按顺序提交明文帧，最后一帧标记 final"""
+
+    def __init__(self, suite, key, frame_size=DEFAULT_FRAME_SIZE, nonce_prefix=None):
+        self.suite = suite
+        self.frame_size = frame_size
+        self.nonce_prefix = nonce_prefix or os.urandom(NONCE_PREFIX_SIZE)
+        self.header = HEADER.pack(MAGIC, VERSION, suite.suite_id, frame_size, self.nonce_prefix)
+        self._aead = suite.aead(key)
+        self._block = suite.block_cipher(key) if suite.block_cipher else None
+        self._counter = 0
+
+    def _next_nonce(self, final):
+        nonce = _nonce(self.nonce_prefix, self._counter, final)
+        self._counter += 1
+        return nonce
+
+    def seal(self, chunk, final=False):
+        return self._aead.encrypt(self._next_nonce(final), chunk, self.header)
+
+    def seal_into(self, chunk, out, final=False):
+        """把 chunk 加密写入 out（长度至少 len(chunk) + TAG_SIZE + INTO_SLACK），返回写入字节数"""
+        nonce = self._next_nonce(final)
+        if self._block is None:
+            sealed = self._aead.encrypt(nonce, chunk, self.header)
+            out[:len(sealed)] = sealed
+            return len(sealed)
+        encryptor = Cipher(self._block, modes.GCM(nonce)).encryptor()
+        encryptor.authenticate_additional_data(self.header)
+        size = encryptor.update_into(chunk, out)
+        encryptor.finalize()
+        out[size:size + TAG_SIZE] = encryptor.tag
+        return size + TAG_SIZE
+
+
+class FrameDecryptor:
+    """逐帧解密：header 决定算法、帧大小与 nonce 前缀"""
+
+    def __init__(self, key, header):
+        if len(header) != HEADER_SIZE:
+            raise ValueError('密文头长度错误')
+        magic, version, suite_id, frame_size, nonce_prefix = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('不是有效的分帧密文')
+        self.suite = suite_by_id(suite_id)
+        self.frame_size = frame_size
+        self.nonce_prefix = nonce_prefix
+        self.header = bytes(header)
+        self._aead = self.suite.aead(key)
+        self._block = self.suite.block_cipher(key) if self.suite.block_cipher else None
+        self._counter = 0
+
+    @property
+    def sealed_frame_size(self):
+        return self.frame_size + TAG_SIZE
+
+    def _next_nonce(self, final):
+        nonce = _nonce(self.nonce_prefix, self._counter, final)
+        self._counter += 1
+        return nonce
+
+    def open(self, frame, final=False):
+        return self._aead.decrypt(self._next_nonce(final), frame, self.header)
+
+    def open_into(self, frame, out, final=False):
+        """
+        解密一帧写入 out（长度至少 len(frame) + INTO_SLACK），返回明文字节数
+        校验失败抛 InvalidTag，此时 out 中的内容不可使用
+        """
+        nonce = self._next_nonce(final)
+        if self._block is None:
+            plaintext = self._aead.decrypt(nonce, frame, self.header)
+            out[:len(plaintext)] = plaintext
+            return len(plaintext)
+        if len(frame) < TAG_SIZE:
+            raise InvalidTag()
+        tag = bytes(frame[-TAG_SIZE:])
+        decryptor = Cipher(self._block, modes.GCM(nonce, tag)).decryptor()
+        decryptor.authenticate_additional_data(self.header)
+        with frame[:-TAG_SIZE] as ciphertext:
+            size = decryptor.update_into(ciphertext, out)
+        decryptor.finalize()
+        return size
+
+
+def _read_full(src, size):
+    """读满 size 字节（流可能分多次返回），到达末尾时返回不足的部分"""
+    parts = []
+    remaining = size
+    while remaining > 0:
+        data = src.read(remaining)
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b''.join(parts)
+
+
+def _readinto_full(src, view):
+    """读满 view（流可能分多次返回），返回实际读入的字节数；不支持 readinto 的流退回 read"""
+    readinto = getattr(src, 'readinto', None)
+    filled, size = 0, len(view)
+    while filled < size:
+        if readinto is not None:
+            n = readinto(view[filled:])
+        else:
+            data = src.read(size - filled)
+            n = len(data)
+            view[filled:filled + n] = data
+        if not n:
+            break
+        filled += n
+    return filled
+
+
+def _frame_buffers(size):
+    """两块输入帧缓冲（当前帧 + 预读的下一帧，用于判断末帧）"""
+    return memoryview(bytearray(size)), memoryview(bytearray(size))
+
+
+def encrypt_stream(src, dst, suite, key, frame_size=DEFAULT_FRAME_SIZE, plain_digest=None, cipher_digest=None):
+    """
+    从 src 读取明文、向 dst 写入分帧密文
+    plain_digest / cipher_digest 为可选的 hashlib 对象，在同一遍中分别累计明文与完整密文文件
+    返回 (nonce_prefix, 明文字节数, 密文字节数)
+    """
+    encryptor = FrameEncryptor(suite, key, frame_size)
+    dst.write(encryptor.header)
+    if cipher_digest is not None:
+        cipher_digest.update(encryptor.header)
+    plain_total, cipher_total = 0, HEADER_SIZE
+
+    current, ahead = _frame_buffers(frame_size)
+    out = memoryview(bytearray(frame_size + TAG_SIZE + INTO_SLACK))
+    size = _readinto_full(src, current)
+    while True:
+        next_size = _readinto_full(src, ahead) if size == frame_size else 0
+        final = not next_size
+        if plain_digest is not None:
+            plain_digest.update(current[:size])
+        sealed = encryptor.seal_into(current[:size], out, final)
+        dst.write(out[:sealed])
+        if cipher_digest is not None:
+            cipher_digest.update(out[:sealed])
+        plain_total += size
+        cipher_total += sealed
+        if final:
+            break
+        current, ahead, size = ahead, current, next_size
+
+    return encryptor.nonce_prefix, plain_total, cipher_total
+
+
+def decrypt_stream(src, dst, key):
+    """从 src 读取分帧密文、向 dst 写入明文，返回明文字节数；校验失败抛 InvalidTag"""
+    decryptor = FrameDecryptor(key, _read_full(src, HEADER_SIZE))
+    frame_size = decryptor.sealed_frame_size
+    total = 0
+
+    current, ahead = _frame_buffers(frame_size)
+    out = memoryview(bytearray(frame_size + INTO_SLACK))
+    size = _readinto_full(src, current)
+    if size < TAG_SIZE:
+        raise InvalidTag()
+    while True:
+        next_size = _readinto_full(src, ahead) if size == frame_size else 0
+        final = not next_size
+        opened = decryptor.open_into(current[:size], out, final)
+        dst.write(out[:opened])
+        total += opened
+        if final:
+            break
+        if next_size < TAG_SIZE:
+            raise InvalidTag()
+        current, ahead, size = ahead, current, next_size
+    return total
+
+
+def decrypt_buffer(data, dst, key):
+    """
+    解密内存中（或 mmap 映射）的完整分帧密文，向 dst 写入明文，返回明文字节数
+    各帧以 memoryview 切片直接送入解密，不复制密文
+    """
+    with memoryview(data) as view:
+        decryptor = FrameDecryptor(key, view[:HEADER_SIZE])
+        frame_size = decryptor.sealed_frame_size
+        out = memoryview(bytearray(min(frame_size, max(len(view) - HEADER_SIZE, 0)) + INTO_SLACK))
+        offset, end, total = HEADER_SIZE, len(view), 0
+        if end - offset < TAG_SIZE:
+            raise InvalidTag()
+        while True:
+            # 切片用完立即释放；校验失败时在 except 之外重新抛出，
+            # 避免异常回溯持有切片导致调用方无法关闭 mmap
+            with view[offset:offset + frame_size] as frame:
+                offset += len(frame)
+                final = offset >= end
+                opened = None
+                if len(frame) >= TAG_SIZE:
+                    try:
+                        opened = decryptor.open_into(frame, out, final)
+                    except InvalidTag:
+                        pass
+            if opened is None:
+                raise InvalidTag()
+            dst.write(out[:opened])
+            total += opened
+            if final:
+                break
+    return total
+
+
+def benchmark_suites(frame_sizes=(DEFAULT_FRAME_SIZE,), total_bytes=4 * 1024 * 1024, suites=None):
+    """测量各算法在不同帧大小下的加密吞吐量（MB/s）"""
+    results = []
+    for suite in suites or available_suites():
+        aead = suite.aead(suite.generate_key())
+        for frame_size in frame_sizes:
+            data = os.urandom(frame_size)
+            frames = max(1, total_bytes // frame_size)
+            nonce = b'\0' * 12
+            started = time.perf_counter()
+            for _ in range(frames):
+                aead.encrypt(nonce, data, None)
+            elapsed = time.perf_counter() - started
+            results.append({
+                'suite': suite.name,
+                'frame_size': frame_size,
+                'mb_per_s': round(frames * frame_size / (1024 * 1024) / elapsed, 2) if elapsed else None
+            })
+    return results
+
+
+_fastest = {}
+
+
+def fastest_suite(frame_size=DEFAULT_FRAME_SIZE):
+    """每个帧大小在进程内只测一次：本机最快的可用算法（有 AES-NI 时通常是 AES-256-GCM）"""
+    if frame_size not in _fastest:
+        results = benchmark_suites((frame_size,), total_bytes=max(frame_size, 2 * 1024 * 1024))
+        best = max(results, key=lambda r: r['mb_per_s'] or 0)
+        _fastest[frame_size] = SUITES[best['suite']]
+    return _fastest[frame_size]
+
+
+def resolve_default_suite(config):
+    """CIPHER_DEFAULT 为 auto 时按基准测试选择，否则使用配置的算法"""
+    name = config.get('CIPHER_DEFAULT', 'auto')
+    if name == 'auto':
+        return fastest_suite(config.get('CIPHER_FRAME_SIZE', DEFAULT_FRAME_SIZE))
+    return get_suite(name)
@@ -0,0 +1,146 @@
+"""
+响应压缩 - 按 Accept-Encoding 协商 zstd / br / gzip
+
+- 只压缩 JSON、MessagePack 和文本类响应，且响应体不小于 COMPRESS_MIN_SIZE
+- 文件下载（send_file 直通）、zip 打包流和其他附件从不压缩：密文与压缩包压不小，只浪费 CPU
+- 流式响应（大列表分块输出）逐块压缩并 flush，不缓冲整个响应体
+- brotli / zstandard 为可选依赖，未安装时只提供 gzip；同等权重时按 zstd > br > gzip 选择
+"""
+import zlib
+
+from flask import current_app, request
+
+from utils.metrics import REGISTRY
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE = frozenset((
+    'application/json', 'application/vnd.qrng.columnar+json', 'application/msgpack',
+    'application/javascript', 'text/plain', 'text/html', 'text/csv',
+))
+
+COMPRESSED_RESPONSES = REGISTRY.counter(
+    'qrng_http_compressed_responses_total', 'HTTP responses compressed, by content coding', ('encoding',))
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._obj.flush()
+
+
+class _Brotli:
+    def __init__(self, level):
+        # brotli 的 quality 取值 0-11，默认 11 对动态响应太慢
+        self._obj = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data):
+        return self._obj.process(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+    def finish(self):
+        return self._obj.finish()
+
+
+class _Zstd:
+    def __init__(self, level):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._obj.flush()
+
+
+def available_encodings():
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+
+def _compressor(encoding, config):
+    if encoding == 'zstd':
+        return _Zstd(config.get('COMPRESS_ZSTD_LEVEL', 3))
+    if encoding == 'br':
+        return _Brotli(config.get('COMPRESS_BROTLI_QUALITY', 4))
+    return _Gzip(config.get('COMPRESS_LEVEL', 6))
+
+
+def _iter_compressed(chunks, compressor):
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+            data += compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def _compressible(response):
+    if response.direct_passthrough or request.method == 'HEAD':
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE:
+        return False
+    return 'attachment' not in response.headers.get('Content-Disposition', '')
+
+
+def _after_request(response):
+    if not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    config = current_app.config
+    streamed = response.is_streamed
+    if not streamed and response.calculate_content_length() < config.get('COMPRESS_MIN_SIZE', 1024):
+        return response
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+
+    compressor = _compressor(encoding, config)
+    if streamed:
+        response.response = _iter_compressed(response.response, compressor)
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(compressor.compress(response.get_data()) + compressor.finish())
+    response.headers['Content-Encoding'] = encoding
+    COMPRESSED_RESPONSES.inc(encoding=encoding)
+    return response
+
+
+def init_compression(app):
+    """注册压缩钩子（应在其他 after_request 钩子之前注册，使其最后执行）"""
+    if app.config.get('COMPRESS_ENABLED', True):
+        app.after_request(_after_request)
@@ -1,4 +1,4 @@
-"""密钥加密工具 - 使用 MASTER_KEY 保护 key_hex"""
+"""密钥加密工具 - 使用 MASTER_KEY 保护文件密钥"""
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from flask import current_app
 import os
@@ -52,3 +52,51 @@ def decrypt_key_hex(stored_value: str) -> str:
         return plaintext.decode('utf-8')
     except Exception as e:
         raise ValueError(f"解密 key_hex 失败: {e}")
+
+# 二进制密钥封装格式（key_records.wrapped_key）：首字节为版本
+#   0x00 | key                       未配置 MASTER_KEY
+#   0x01 | iv(12) | AES-GCM(key)     MASTER_KEY 封装原始密钥
+#   0x02 | iv(12) | AES-GCM(key_hex) 由旧的 iv:ciphertext 文本无损转换，迁移时不需要 MASTER_KEY
+WRAP_PLAIN = 0
+WRAP_MASTER = 1
+WRAP_LEGACY_HEX = 2
+WRAP_AAD = b'qrng-wrapped-key'
+
+def wrap_key(key: bytes) -> bytes:
+    """封装文件密钥用于存储；未配置 MASTER_KEY 时原样保存（向后兼容）"""
+    from config import Config
+    master_key = Config.get_master_key_bytes()
+    
+    if not master_key:
+        return bytes([WRAP_PLAIN]) + key
+    
+    iv = os.urandom(12)
+    return bytes([WRAP_MASTER]) + iv + AESGCM(master_key).encrypt(iv, key, WRAP_AAD)
+
+def unwrap_key(wrapped: bytes) -> bytes:
+    """解开 wrapped_key，返回原始文件密钥"""
+    from config import Config
+    wrapped = bytes(wrapped)
+    version, body = wrapped[0], wrapped[1:]
+    
+    if version == WRAP_PLAIN:
+        return body
+    if version == WRAP_LEGACY_HEX:
+        return bytes.fromhex(decrypt_key_hex(f"{body[:12].hex()}:{body[12:].hex()}"))
+    if version != WRAP_MASTER:
+        raise ValueError(f"未知的密钥封装版本: {version}")
+    
+    master_key = Config.get_master_key_bytes()
+    if not master_key:
+        raise ValueError("密钥已封装但未配置 MASTER_KEY")
+    try:
+        return AESGCM(master_key).decrypt(body[:12], body[12:], WRAP_AAD)
+    except Exception as e:
+        raise ValueError(f"解开文件密钥失败: {e}")
+
+def wrapped_from_legacy(stored_value: str) -> bytes:
+    """把旧的 key_hex 文本（明文 hex 或 iv:ciphertext）转换为二进制封装格式，不需要 MASTER_KEY"""
+    if ':' in stored_value:
+        iv_hex, ciphertext_hex = stored_value.split(':', 1)
+        return bytes([WRAP_LEGACY_HEX]) + bytes.fromhex(iv_hex) + bytes.fromhex(ciphertext_hex)
+    return bytes([WRAP_PLAIN]) + bytes.fromhex(stored_value)
@@ -0,0 +1,80 @@
+"""数据库引擎调优 - 根据 DB_PROFILE 生成引擎参数，并在建立连接时设置 PRAGMA"""
+from sqlalchemy import event
+
+# 可选配置档：
+#   auto            - 根据 SQLALCHEMY_DATABASE_URI 自动选择
+#   default         - 不做任何调优（SQLAlchemy 默认行为）
+#   sqlite-wal      - SQLite WAL 模式 + synchronous=NORMAL + mmap + busy_timeout
+#   postgres-pooled - PostgreSQL 连接池 + pre-ping + statement_timeout
+PROFILES = ('auto', 'default', 'sqlite-wal', 'postgres-pooled')
+
+
+def resolve_profile(config, uri=None):
+    """解析实际使用的配置档名称（uri 默认取 SQLALCHEMY_DATABASE_URI）"""
+    profile = (config.get('DB_PROFILE') or 'auto').strip().lower()
+    if profile not in PROFILES:
+        raise ValueError(f"未知的 DB_PROFILE: {profile}（可选: {', '.join(PROFILES)}）")
+
+    if profile != 'auto':
+        return profile
+
+    uri = uri or config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if uri.startswith('sqlite'):
+        return 'sqlite-wal'
+    if uri.startswith('postgres'):
+        return 'postgres-pooled'
+    return 'default'
+
+
+def build_engine_options(config, uri=None):
+    """
+    生成 SQLALCHEMY_ENGINE_OPTIONS（uri 用于为其它绑定单独生成）
+    SQLite 的 PRAGMA 需要在连接建立时执行，见 apply_engine_profile
+    """
+    profile = resolve_profile(config, uri)
+
+    if profile == 'sqlite-wal':
+        # sqlite3 驱动自身的锁等待时间（秒），与 busy_timeout 保持一致
+        return {
+            'connect_args': {'timeout': config.get('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000}
+        }
+
+    if profile == 'postgres-pooled':
+        statement_timeout = int(config.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+        return {
+            'pool_size': int(config.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(config.get('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': int(config.get('DB_POOL_TIMEOUT', 30)),
+            'pool_recycle': int(config.get('DB_POOL_RECYCLE', 1800)),
+            'pool_pre_ping': True,
+            # 通过启动参数设置，避免 SET 语句被连接池的 rollback 撤销
+            'connect_args': {'options': f'-c statement_timeout={statement_timeout}'}
+        }
+
+    return {}
+
+
+def _sqlite_pragmas(config):
+    return (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('mmap_size', int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+        ('busy_timeout', int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))),
+    )
+
+
+def apply_engine_profile(engine, config):
+    """为已创建的引擎注册连接事件（仅 sqlite-wal 需要）"""
+    if resolve_profile(config, str(engine.url)) != 'sqlite-wal' or engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = _sqlite_pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
@@ -0,0 +1,92 @@
+"""只读副本路由 - 只读端点的查询发往副本引擎，写入与刚写过数据的会话仍走主库"""
+import itertools
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+# 用户写入后记录时间戳的会话键（read-your-writes）
+_LAST_WRITE_KEY = '_db_last_write'
+
+_round_robin = itertools.count()
+
+
+def replica_binds(uris):
+    """把副本 URI 列表转换为 SQLALCHEMY_BINDS 条目"""
+    return {f'{REPLICA_BIND_PREFIX}{i}': uri for i, uri in enumerate(uris)}
+
+
+def _replica_engines():
+    engines = current_app.extensions['sqlalchemy'].engines
+    return [
+        engine for key, engine in sorted(engines.items(), key=lambda item: str(item[0]))
+        if key and key.startswith(REPLICA_BIND_PREFIX)
+    ]
+
+
+def _recently_wrote():
+    """当前用户是否在粘滞窗口内写过数据"""
+    window = current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+    last_write = session.get(_LAST_WRITE_KEY)
+    return last_write is not None and time.time() - last_write < window
+
+
+def read_replica(view):
+    """
+    标记只读端点：视图内的查询路由到副本
+    没有配置副本，或当前用户刚写过数据时，仍使用主库
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _replica_engines() or _recently_wrote():
+            return view(*args, **kwargs)
+
+        # 每个请求只选一次副本，同一请求内的计数、分页与 ETag 版本读自同一个副本（各副本延迟不同）
+        chosen = g.get('_db_replica') is None
+        if chosen:
+            engines = _replica_engines()
+            g._db_replica = engines[next(_round_robin) % len(engines)]
+        g._db_route = 'replica'
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.pop('_db_route', None)
+            if chosen:
+                g.pop('_db_replica', None)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """按请求路由的会话：DML 和 flush 始终使用主库"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None
+                and not self._flushing
+                and not getattr(clause, 'is_dml', False)
+                and has_request_context()
+                and g.get('_db_route') == 'replica'):
+            return g._db_replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _mark_write():
+    # 记录写入时间，之后的只读请求在粘滞窗口内回到主库
+    if has_request_context():
+        session[_LAST_WRITE_KEY] = time.time()
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(db_session, flush_context):
+    if db_session.new or db_session.dirty or db_session.deleted:
+        _mark_write()
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _after_bulk_dml(orm_execute_state):
+    # 批量 insert/update/delete 不经过 flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write()
@@ -0,0 +1,238 @@
+"""
+设备信任索引 - 按请求来源 IP 判断是否来自受信任设备
+
+- 设备 IP 可以是单个地址或 CIDR 网段，按最长前缀匹配：网段内单独吊销的地址优先于整段信任
+- 索引按前缀长度分表（前缀长度 -> {网络号: 设备}），查询只需按已出现的前缀长度从长到短各查一次 dict，
+  与设备数量无关；同一地址的查询结果再缓存，重复请求只是一次 dict 命中
+- 设备增删改时增量更新索引，不重新加载整表；多进程部署由周期任务定期全量重建保持一致
+- 加密 / 解密接口的强制校验由 DEVICE_TRUST_ENFORCE 开启（默认关闭）
+"""
+import ipaddress
+import socket
+import threading
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from flask_login import current_user
+
+from extensions import db
+from models import Device, AuditLog
+from utils.metrics import REGISTRY
+
+STATUSES = ('trusted', 'pending', 'revoked')
+# 同一网段登记了多台设备时取最严格的状态
+PRECEDENCE = {'revoked': 0, 'pending': 1, 'trusted': 2}
+BITS = {4: 32, 6: 128}
+CACHE_SIZE = 4096
+
+DEVICE_CHECKS = REGISTRY.counter(
+    'qrng_device_checks_total', 'Device trust checks on protected endpoints', ('result',))
+
+
+def parse_network(value):
+    """把设备 IP / CIDR 解析为 (IP 版本, 前缀长度, 网络号)，无法解析时返回 None"""
+    try:
+        network = ipaddress.ip_network((value or '').strip(), strict=False)
+    except ValueError:
+        return None
+    if network.version == 6 and network.prefixlen >= 96 and network.network_address.ipv4_mapped:
+        network = ipaddress.ip_network(
+            (network.network_address.ipv4_mapped, network.prefixlen - 96), strict=False)
+    bits = BITS[network.version]
+    return network.version, network.prefixlen, int(network.network_address) >> (bits - network.prefixlen)
+
+
+def _parse_address(value):
+    # inet_pton 比 ipaddress.ip_address 快一个数量级，请求路径上只做这一步
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, value), 'big')
+    except OSError:
+        pass
+    try:
+        number = int.from_bytes(socket.inet_pton(socket.AF_INET6, value.split('%', 1)[0]), 'big')
+    except (OSError, ValueError):
+        return None
+    if number >> 32 == 0xFFFF:
+        return 4, number & 0xFFFFFFFF
+    return 6, number
+
+
+def _with_entry(tables, key, device_id, status=None):
+    """复制 key 所在的路径并写入（status 为 None 时删除）设备，返回新的索引表，原表不变"""
+    version, prefixlen, network = key
+    by_length = dict(tables[version])
+    table = dict(by_length.get(prefixlen, {}))
+    entry = {d: s for d, s in table.get(network, ()) if d != device_id}
+    if status is not None:
+        entry[device_id] = status
+    if entry:
+        table[network] = tuple(entry.items())
+    else:
+        table.pop(network, None)
+    if table:
+        by_length[prefixlen] = table
+    else:
+        by_length.pop(prefixlen, None)
+    return {**tables, version: by_length}
+
+
+class DeviceIndex:
+    """
+    IPv4 / IPv6 最长前缀匹配索引
+    读路径只读取一个不可变快照 (索引表, 前缀长度, 查询缓存)；写操作加锁，复制受影响的路径后整体替换快照，
+    读者看到的要么是旧快照要么是新快照，不会看到写到一半的表
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._devices = {}                 # 设备ID -> (版本, 前缀长度, 网络号)，只在持锁时访问
+        self._publish({4: {}, 6: {}})
+
+    def __len__(self):
+        return len(self._devices)
+
+    def _publish(self, tables):
+        # 版本 -> {前缀长度: {网络号: ((设备ID, 状态), ...)}}；前缀长度从长到短；缓存随快照一起换新
+        lengths = {version: tuple(sorted(by_length, reverse=True)) for version, by_length in tables.items()}
+        self._snapshot = (tables, lengths, {})
+
+    def _update(self, device_id, key=None, status=None):
+        tables = self._snapshot[0]
+        old = self._devices.pop(device_id, None)
+        if old is not None:
+            tables = _with_entry(tables, old, device_id)
+        if key is not None:
+            tables = _with_entry(tables, key, device_id, status)
+            self._devices[device_id] = key
+        self._publish(tables)
+
+    def add(self, device_id, ip, status):
+        """登记或更新设备；IP 无法解析的设备（如 Unknown）不进入索引"""
+        key = parse_network(ip)
+        if status not in PRECEDENCE:
+            key = None
+        with self._lock:
+            self._update(device_id, key, status)
+
+    def remove(self, device_id):
+        with self._lock:
+            self._update(device_id)
+
+    def load(self, devices):
+        """用 (设备ID, IP, 状态) 序列整体替换索引内容"""
+        building, keys = {4: {}, 6: {}}, {}
+        for device_id, ip, status in devices:
+            key = parse_network(ip)
+            if key is None or status not in PRECEDENCE:
+                continue
+            version, prefixlen, network = key
+            building[version].setdefault(prefixlen, {}).setdefault(network, {})[device_id] = status
+            keys[device_id] = key
+        tables = {
+            version: {prefixlen: {network: tuple(entry.items()) for network, entry in table.items()}
+                      for prefixlen, table in by_length.items()}
+            for version, by_length in building.items()
+        }
+        with self._lock:
+            self._devices = keys
+            self._publish(tables)
+
+    def covers(self, device_id, address):
+        """设备登记的 IP / 网段是否包含该地址（未登记或 IP 无法解析的设备返回 False）"""
+        parsed = _parse_address(address or '')
+        with self._lock:
+            key = self._devices.get(device_id)
+        if key is None or parsed is None:
+            return False
+        version, prefixlen, network = key
+        return parsed[0] == version and parsed[1] >> (BITS[version] - prefixlen) == network
+
+    def lookup(self, address):
+        """返回匹配的 (设备ID, 状态)，未登记的地址返回 None"""
+        tables, lengths, cache = self._snapshot
+        try:
+            return cache[address]
+        except KeyError:
+            pass
+        match = None
+        parsed = _parse_address(address)
+        if parsed is not None:
+            version, value = parsed
+            by_length, bits = tables[version], BITS[version]
+            for prefixlen in lengths[version]:
+                entry = by_length[prefixlen].get(value >> (bits - prefixlen))
+                if entry:
+                    match = min(entry, key=lambda item: PRECEDENCE[item[1]])
+                    break
+        if len(cache) >= CACHE_SIZE:
+            cache.clear()
+        cache[address] = match
+        return match
+
+
+def _load_rows():
+    return db.session.query(Device.id, Device.ip, Device.status).all()
+
+
+def get_index(app=None):
+    """当前应用的设备索引，首次使用时从数据库构建"""
+    app = app or current_app._get_current_object()
+    index = app.extensions.get('device_index')
+    if index is None:
+        index = DeviceIndex()
+        index.load(_load_rows())
+        app.extensions['device_index'] = index
+    return index
+
+
+def rebuild_index():
+    """全量重建（周期任务调用，同步其他进程的设备变更），返回设备数"""
+    index = get_index()
+    index.load(_load_rows())
+    return len(index)
+
+
+def device_changed(device):
+    """设备新增或状态变更并提交后调用"""
+    get_index().add(device.id, device.ip, device.status)
+
+
+def device_removed(device_id):
+    get_index().remove(device_id)
+
+
+def check_address(address):
+    """返回 (是否受信任, 匹配的设备ID, 状态)"""
+    match = get_index().lookup(address or '')
+    if match is None:
+        return False, None, None
+    device_id, status = match
+    return status == 'trusted', device_id, status
+
+
+def require_trusted_device(f):
+    """开启 DEVICE_TRUST_ENFORCE 时，只允许来自受信任设备 IP 的请求"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not current_app.config.get('DEVICE_TRUST_ENFORCE'):
+            return f(*args, **kwargs)
+
+        trusted, device_id, status = check_address(request.remote_addr)
+        if trusted:
+            DEVICE_CHECKS.inc(result='trusted')
+            return f(*args, **kwargs)
+
+        DEVICE_CHECKS.inc(result=status or 'unknown')
+        log = AuditLog(
+            user=current_user.username if current_user.is_authenticated else None,
+            action_type='DEVICE_DENIED',
+            message=f'来自非受信任设备的请求被拒绝: {request.path}',
+            detail=f'设备: {device_id or "未登记"}, 状态: {status or "unknown"}',
+            level='warning',
+            ip_address=request.remote_addr,
+            user_agent=str(request.user_agent)
+        )
+        db.session.add(log)
+        db.session.commit()
+        return jsonify({'success': False, 'code': 'DEVICE_NOT_TRUSTED', 'message': '当前设备未受信任'}), 403
+    return decorated
@@ -0,0 +1,171 @@
+"""
+用户目录 - 游标分页、前缀搜索与批量导入
+
+- 列表按 username 键集分页：游标是上一页最后一个用户名，翻页代价与页码无关
+- 搜索按 username / name / department 前缀匹配（LIKE 'xxx%'，可走索引）
+- 批量导入支持 CSV 与 NDJSON：一次集合查询判断已存在的用户名，密码哈希在线程池中并行计算
+  （hashlib 的 scrypt / pbkdf2 计算时释放 GIL），按批 executemany 插入，整批在一个事务中提交
+"""
+import base64
+import csv
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import insert, or_
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models import User
+from utils.policy import ROLES
+
+STATUSES = ('active', 'locked')
+MAX_ERRORS = 20
+
+
+def encode_cursor(username):
+    return base64.urlsafe_b64encode(username.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        return base64.b64decode(token + '=' * (-len(token) % 4), altchars=b'-_', validate=True).decode('utf-8')
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('无效的分页游标')
+
+
+def _prefix(column, value):
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return column.like(f'{escaped}%', escape='\\')
+
+
+def search_users(query=None, q=None, cursor=None, limit=50, role=None, status=None, department=None):
+    """
+    在 query（默认全部用户，通常已按访问策略过滤；可以只查询部分列，但需包含 username）中搜索
+    返回 (结果行列表, 下一页游标)；没有下一页时游标为 None
+    """
+    query = User.query if query is None else query
+    if q:
+        query = query.filter(or_(_prefix(User.username, q), _prefix(User.name, q), _prefix(User.department, q)))
+    if role:
+        query = query.filter(User.role == role)
+    if status:
+        query = query.filter(User.status == status)
+    if department:
+        query = query.filter(User.department == department)
+    if cursor:
+        query = query.filter(User.username > decode_cursor(cursor))
+
+    # 多取一条判断是否还有下一页
+    users = query.order_by(User.username).limit(limit + 1).all()
+    if len(users) > limit:
+        users = users[:limit]
+        return users, encode_cursor(users[-1].username)
+    return users, None
+
+
+def parse_import(data, fmt):
+    """把 CSV / NDJSON 文本解析为 [(行号, dict)]"""
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(data))
+        if not reader.fieldnames or 'username' not in reader.fieldnames:
+            raise ValueError('CSV 首行必须是包含 username 的表头')
+        return [(reader.line_num, row) for row in reader]
+    if fmt == 'ndjson':
+        rows = []
+        for line_no, line in enumerate(data.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                raise ValueError(f'第 {line_no} 行不是合法的 JSON')
+            if not isinstance(row, dict):
+                raise ValueError(f'第 {line_no} 行必须是 JSON 对象')
+            rows.append((line_no, row))
+        return rows
+    raise ValueError('仅支持 csv 或 ndjson 格式')
+
+
+def _clean(row, roles, force_department):
+    """按 create_user 相同的规则校验一行，返回 (规范化后的行, 错误)；force_department 非空时忽略行内部门"""
+    def text(field):
+        value = row.get(field)
+        return value.strip() if isinstance(value, str) else ''
+
+    username, name = text('username'), text('name')
+    department = force_department if force_department is not None else text('department')
+    password = row.get('password') if isinstance(row.get('password'), str) else ''
+    role = text('role') or 'user'
+    if len(username) < 3:
+        return None, 'Username must be at least 3 characters'
+    if len(username) > 80:
+        return None, 'Username too long'
+    if len(password) < 6:
+        return None, 'Password must be at least 6 characters'
+    if role not in roles:
+        return None, f"Role must be one of {', '.join(roles)}"
+    return {
+        'username': username,
+        'password': password,
+        'name': (name or username)[:80],
+        'role': role,
+        'department': department[:80]
+    }, None
+
+
+def existing_usernames(usernames, chunk_size=900):
+    """一次集合查询（超过绑定参数上限时分块）取出已存在的用户名"""
+    usernames, found = list(usernames), set()
+    for start in range(0, len(usernames), chunk_size):
+        chunk = usernames[start:start + chunk_size]
+        found.update(name for (name,) in db.session.query(User.username).filter(User.username.in_(chunk)))
+    return found
+
+
+def import_users(rows, on_duplicate='skip', roles=ROLES, force_department=None):
+    """
+    校验并批量创建用户，不提交（由调用方与审计日志一起提交）
+    roles 为允许导入的角色；force_department 非空时所有用户都归入该部门（部门管理员导入）
+    返回报告 {'created', 'skipped', 'invalid', 'errors'}；有校验错误或 on_duplicate=fail 且存在重复时不插入任何行
+    """
+    config = current_app.config
+    if len(rows) > config.get('USER_IMPORT_MAX_ROWS', 10000):
+        raise ValueError(f"单次最多导入 {config.get('USER_IMPORT_MAX_ROWS', 10000)} 个用户")
+
+    report = {'created': 0, 'skipped': [], 'invalid': 0, 'errors': []}
+    cleaned, seen = [], set()
+    for line_no, row in rows:
+        values, error = _clean(row, roles, force_department)
+        if error is None and values['username'] in seen:
+            error = 'Duplicate username in import'
+        if error is not None:
+            report['invalid'] += 1
+            if len(report['errors']) < MAX_ERRORS:
+                report['errors'].append({'line': line_no, 'username': row.get('username'), 'error': error})
+            continue
+        seen.add(values['username'])
+        cleaned.append(values)
+    if report['invalid']:
+        return report
+
+    existing = existing_usernames(seen)
+    report['skipped'] = sorted(existing)
+    if existing and on_duplicate == 'fail':
+        return report
+    cleaned = [values for values in cleaned if values['username'] not in existing]
+
+    with ThreadPoolExecutor(max_workers=config.get('USER_IMPORT_WORKERS', os.cpu_count() or 2),
+                            thread_name_prefix='qrng-import') as pool:
+        hashes = list(pool.map(generate_password_hash, [values.pop('password') for values in cleaned]))
+
+    batch_size = config.get('USER_IMPORT_BATCH_SIZE', 500)
+    for start in range(0, len(cleaned), batch_size):
+        batch = [dict(values, password_hash=password_hash, status='active')
+                 for values, password_hash in zip(cleaned[start:start + batch_size],
+                                                  hashes[start:start + batch_size])]
+        db.session.execute(insert(User), batch)
+    report['created'] = len(cleaned)
+    return report
@@ -0,0 +1,181 @@
+"""
+设备心跳 - 内存合并，定期批量写回 last_active
+
+- 心跳只更新内存中的设备视图（设备ID -> 状态、最近心跳时间），同一设备多次心跳只保留最新时间
+- 来源地址必须在设备登记的 IP / 网段内（设备信任索引），已吊销的设备不接受心跳
+- 周期任务把两次写回之间有心跳的设备用一条 executemany UPDATE 写回，写库次数与心跳频率无关
+- 超过 DEVICE_STALE_SECONDS 没有心跳的设备视为失联
+- 仪表盘的设备计数直接读内存视图，不查询 devices 表
+"""
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import bindparam, update
+
+from extensions import db
+from models import Device
+from utils.device_trust import get_index
+from utils.metrics import REGISTRY
+
+HEARTBEATS = REGISTRY.counter(
+    'qrng_device_heartbeats_total', 'Device heartbeats received', ('result',))
+HEARTBEAT_FLUSHED = REGISTRY.counter(
+    'qrng_device_heartbeat_rows_flushed_total', 'Device last_active rows written by the heartbeat flusher')
+
+
+class DeviceView:
+    """设备状态与最近心跳的内存视图，待写回的心跳单独记录"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._devices = {}   # 设备ID -> [状态, 最近心跳时间]
+        self._pending = {}   # 设备ID -> 尚未写回的最近心跳时间
+
+    def __len__(self):
+        return len(self._devices)
+
+    def load(self, rows):
+        """用 (设备ID, 状态, last_active) 整体替换视图；尚未写回的心跳更新，保留内存中的时间"""
+        with self._lock:
+            devices = {}
+            for device_id, status, last_active in rows:
+                pending = self._pending.get(device_id)
+                seen = max(last_active, pending) if last_active and pending else (pending or last_active)
+                devices[device_id] = [status, seen]
+            self._devices = devices
+            self._pending = {k: v for k, v in self._pending.items() if k in devices}
+
+    def track(self, device_id, status, last_active):
+        with self._lock:
+            self._devices[device_id] = [status, last_active]
+
+    def forget(self, device_id):
+        with self._lock:
+            self._devices.pop(device_id, None)
+            self._pending.pop(device_id, None)
+
+    def beat(self, device_id, at):
+        """记录一次心跳，未登记的设备返回 False"""
+        with self._lock:
+            entry = self._devices.get(device_id)
+            if entry is None:
+                return False
+            if entry[1] is None or at > entry[1]:
+                entry[1] = at
+                self._pending[device_id] = at
+            return True
+
+    def drain(self):
+        """取出待写回的心跳 {设备ID: 时间}"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def restore(self, pending):
+        """写回失败时放回，下次重试（已有更新的心跳时保留更新的）"""
+        with self._lock:
+            for device_id, at in pending.items():
+                current = self._pending.get(device_id)
+                if device_id in self._devices and (current is None or at > current):
+                    self._pending[device_id] = at
+
+    def status(self, device_id):
+        entry = self._devices.get(device_id)
+        return entry[0] if entry else None
+
+    def last_seen(self, device_id):
+        entry = self._devices.get(device_id)
+        return entry[1] if entry else None
+
+    def stats(self, stale_after, now=None):
+        """各状态设备数，以及超过 stale_after 秒没有心跳的失联设备数"""
+        cutoff = (now or datetime.utcnow()) - timedelta(seconds=stale_after)
+        counts = {'total': 0, 'trusted': 0, 'pending': 0, 'revoked': 0, 'stale': 0}
+        with self._lock:
+            entries = list(self._devices.values())
+        for status, seen in entries:
+            counts['total'] += 1
+            if status in counts:
+                counts[status] += 1
+            if seen is None or seen < cutoff:
+                counts['stale'] += 1
+        return counts
+
+
+def _load_rows():
+    return db.session.query(Device.id, Device.status, Device.last_active).all()
+
+
+def get_view(app=None):
+    """当前应用的设备视图，首次使用时从数据库加载"""
+    app = app or current_app._get_current_object()
+    view = app.extensions.get('device_view')
+    if view is None:
+        view = DeviceView()
+        view.load(_load_rows())
+        app.extensions['device_view'] = view
+    return view
+
+
+def reload_view():
+    """从数据库重新加载（周期任务调用，同步其他进程的设备变更），返回设备数"""
+    view = get_view()
+    view.load(_load_rows())
+    return len(view)
+
+
+def track_device(device):
+    """设备新增或状态变更并提交后调用"""
+    get_view().track(device.id, device.status, device.last_active)
+
+
+def forget_device(device_id):
+    get_view().forget(device_id)
+
+
+def record_heartbeats(beats, address, now=None):
+    """
+    记录一批心跳 [(设备ID, 时间或 None)]；时间为空或晚于服务器时间时按服务器时间计
+    只接受来源地址在设备登记的 IP / 网段内、且未被吊销的设备的心跳，返回 (接受数, 拒绝数)；
+    未登记与校验失败的设备同样计为拒绝，不向调用方暴露哪些设备ID 存在
+    """
+    now = now or datetime.utcnow()
+    view, index = get_view(), get_index()
+    accepted = rejected = 0
+    for device_id, at in beats:
+        if (view.status(device_id) not in (None, 'revoked') and index.covers(device_id, address)
+                and view.beat(device_id, min(at, now) if at else now)):
+            accepted += 1
+        else:
+            rejected += 1
+    HEARTBEATS.inc(accepted, result='accepted')
+    if rejected:
+        HEARTBEATS.inc(rejected, result='rejected')
+    return accepted, rejected
+
+
+def flush_heartbeats():
+    """把合并后的心跳批量写回 devices.last_active，返回写回行数"""
+    view = get_view()
+    pending = view.drain()
+    if not pending:
+        return 0
+    try:
+        # Core executemany：其他进程已删除的设备只是匹配 0 行，不像 ORM 按主键批量更新那样报错
+        table = Device.__table__
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('_id')).values(last_active=bindparam('_at')),
+            [{'_id': device_id, '_at': at} for device_id, at in pending.items()]
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        view.restore(pending)
+        raise
+    HEARTBEAT_FLUSHED.inc(len(pending))
+    return len(pending)
+
+
+def device_stats():
+    return get_view().stats(current_app.config.get('DEVICE_STALE_SECONDS', 300))
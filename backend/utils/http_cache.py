@@ -0,0 +1,138 @@
+"""
+条件 GET - 按表变更版本生成 ETag / Last-Modified，未变化的轮询返回 304
+
+- table_versions 为每张业务表记录一个版本号：写过该表的事务在提交前把版本号加一，
+  与数据变更在同一事务中提交，多进程部署下不会出现数据已变而版本未变
+- 引擎上的 after_execute 收集本事务写过的表（ORM flush、批量 insert/update、Query.delete 都经过这里），
+  commit 时一条 UPDATE 递增；只读事务没有额外开销
+- 列表端点用 @conditional('key_records', 'users') 声明依赖的表：先按主键读版本，
+  If-None-Match / If-Modified-Since 命中时直接返回 304，不执行列表查询和序列化
+- ETag 由请求路径与参数、协商的响应格式、调用者的访问范围和版本号计算，为弱 ETag（压缩与否内容等价）
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+from flask import Response, current_app, request
+from sqlalchemy import event, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import TableVersion
+from utils.policy import get_policy
+from utils.serialize import negotiate
+
+TRACKED = ('users', 'key_records', 'audit_logs', 'devices', 'storage_usage')
+
+_versions = TableVersion.__table__
+
+
+def _after_execute(conn, clauseelement, multiparams, params, execution_options, result):
+    if not getattr(clauseelement, 'is_dml', False) or not execution_options.get('track_table_versions', True):
+        return
+    if clauseelement.table.name in TRACKED:
+        conn.info.setdefault('_changed_tables', set()).add(clauseelement.table.name)
+
+
+def _commit(conn):
+    changed = conn.info.pop('_changed_tables', None)
+    if changed:
+        conn.execute(
+            _versions.update()
+            .where(_versions.c.name.in_(sorted(changed)))
+            .values(version=_versions.c.version + 1, updated_at=datetime.utcnow())
+        )
+
+
+def _rollback(conn):
+    conn.info.pop('_changed_tables', None)
+
+
+def ensure_versions():
+    """补齐 table_versions 中缺少的行（db.create_all 建库后调用；缺行的表不参与条件 GET）"""
+    existing = set(db.session.scalars(select(TableVersion.name)))
+    missing = [name for name in TRACKED if name not in existing]
+    if not missing:
+        return
+    now = datetime.utcnow()
+    try:
+        db.session.execute(insert(TableVersion), [{'name': name, 'version': 0, 'updated_at': now} for name in missing])
+        db.session.commit()
+    except IntegrityError:
+        # 其他进程同时补齐
+        db.session.rollback()
+
+
+def read_versions(tables):
+    """[(表名, 版本, 更新时间)]；有表没有版本行时返回 None"""
+    rows = db.session.execute(
+        select(TableVersion.name, TableVersion.version, TableVersion.updated_at)
+        .where(TableVersion.name.in_(tables))
+        .order_by(TableVersion.name)
+    ).all()
+    return rows if len(rows) == len(tables) else None
+
+
+def _etag(rows):
+    material = repr((request.full_path, negotiate(), get_policy().identity, [(name, version) for name, version, _ in rows]))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()[:32]
+
+
+def _last_modified(rows):
+    latest = max((updated_at for _, _, updated_at in rows if updated_at), default=None)
+    if latest is None:
+        return None
+    latest = latest.replace(tzinfo=timezone.utc)
+    # HTTP 日期只精确到秒：最近一秒内有变更时同一秒内可能还会再变，只提供 ETag
+    if datetime.now(timezone.utc) - latest < timedelta(seconds=1):
+        return None
+    return latest.replace(microsecond=0)
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    return bool(last_modified and request.if_modified_since and last_modified <= request.if_modified_since)
+
+
+def conditional(*tables):
+    """
+    列表端点的条件 GET，tables 为响应内容依赖的表
+    放在 login_required / read_replica 之后：版本与数据从同一个库读取
+    """
+    tables = tuple(sorted(tables))
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('HTTP_CACHE_ENABLED', True):
+                return view(*args, **kwargs)
+            rows = read_versions(tables)
+            if rows is None:
+                return view(*args, **kwargs)
+
+            etag, last_modified = _etag(rows), _last_modified(rows)
+            if _not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # 浏览器可以缓存，但每次使用前都要重新验证
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Accept')
+            return response
+        return wrapper
+    return decorator
+
+
+def init_http_cache(app, engines):
+    """在所有引擎上跟踪写过的表，提交时递增版本"""
+    for engine in engines:
+        event.listen(engine, 'after_execute', _after_execute)
+        event.listen(engine, 'commit', _commit)
+        event.listen(engine, 'rollback', _rollback)
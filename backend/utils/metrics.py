@@ -0,0 +1,293 @@
+"""
+Prometheus 文本格式指标 - 轻量实现（计数器 / 仪表 / 直方图），无额外依赖
+
+每次 observe 只做一次加锁的字典更新，单请求开销为微秒级
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(n, '') for n in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in items
+        ]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.inc_key(self._key(labels), amount)
+
+    def inc_key(self, key, amount=1):
+        """热路径：直接传入按 labelnames 排列的标签元组"""
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """采集时调用 function() 取值（无标签仪表）"""
+        self._function = function
+
+    def value(self, **labels):
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        if self._function is not None:
+            return [f'{self.name} {_format_value(self._function())}']
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        self.observe_key(self._key(labels), value)
+
+    def observe_key(self, key, value):
+        """热路径：直接传入按 labelnames 排列的标签元组"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各桶计数（最后一个为 +Inf）, sum, count]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'qrng_http_requests_total', 'HTTP requests by route and status',
+    ('blueprint', 'route', 'method', 'status'))
+HTTP_LATENCY = REGISTRY.histogram(
+    'qrng_http_request_duration_seconds', 'HTTP request latency',
+    ('blueprint', 'route'))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    'qrng_http_requests_in_flight', 'Requests currently being served')
+DB_QUERIES = REGISTRY.histogram(
+    'qrng_db_queries_per_request', 'SQL statements executed per request',
+    ('blueprint', 'route'), buckets=QUERY_COUNT_BUCKETS)
+DB_TIME = REGISTRY.histogram(
+    'qrng_db_time_per_request_seconds', 'Time spent in SQL statements per request',
+    ('blueprint', 'route'))
+DB_QUERIES_TOTAL = REGISTRY.counter(
+    'qrng_db_queries_total', 'SQL statements executed')
+CRYPTO_BYTES = REGISTRY.counter(
+    'qrng_crypto_bytes_total', 'Bytes processed by the file cipher',
+    ('operation', 'algorithm'))
+CRYPTO_SECONDS = REGISTRY.counter(
+    'qrng_crypto_seconds_total', 'Time spent in the file cipher (throughput = bytes / seconds)',
+    ('operation', 'algorithm'))
+CRYPTO_THROUGHPUT = REGISTRY.histogram(
+    'qrng_crypto_throughput_mbps', 'Cipher throughput per operation in MB/s',
+    ('operation', 'algorithm'), buckets=(1, 10, 50, 100, 250, 500, 1000, 2000, 5000))
+AUDIT_QUEUE_DEPTH = REGISTRY.gauge(
+    'qrng_audit_queue_depth', 'Audit events waiting to be processed')
+AUDIT_QUEUE_DEPTH.set(0)  # 审计异步队列通过 set_function 接入
+TEMP_FILES = REGISTRY.gauge(
+    'qrng_temp_files', 'Decrypted temp files present in UPLOAD_FOLDER')
+TEMP_FILE_BYTES = REGISTRY.gauge(
+    'qrng_temp_file_bytes', 'Bytes held by decrypted temp files in UPLOAD_FOLDER')
+
+
+def observe_crypto(operation, algorithm, nbytes, seconds):
+    """记录一次加密/解密的字节数与耗时"""
+    CRYPTO_BYTES.inc(nbytes, operation=operation, algorithm=algorithm)
+    CRYPTO_SECONDS.inc(seconds, operation=operation, algorithm=algorithm)
+    if seconds > 0:
+        CRYPTO_THROUGHPUT.observe(nbytes / (1024 * 1024) / seconds, operation=operation, algorithm=algorithm)
+
+
+def _temp_file_stats():
+    count = size = 0
+    try:
+        with os.scandir(current_app.config['UPLOAD_FOLDER']) as entries:
+            for entry in entries:
+                if entry.name.startswith('decrypt_') and entry.is_file():
+                    count += 1
+                    size += entry.stat().st_size
+    except OSError:
+        pass
+    return count, size
+
+
+def render_metrics():
+    """生成 /metrics 输出（临时文件统计在采集时计算）"""
+    count, size = _temp_file_stats()
+    TEMP_FILES.set(count)
+    TEMP_FILE_BYTES.set(size)
+    return REGISTRY.render()
+
+
+def _route_labels():
+    rule = request.url_rule
+    return request.blueprint or 'app', rule.rule if rule is not None else 'unmatched'
+
+
+def _before_request():
+    HTTP_IN_FLIGHT.inc()
+    g._metrics_start = time.perf_counter()
+    g._metrics_db_queries = 0
+    g._metrics_db_time = 0.0
+
+
+def _after_request(response):
+    start = g.get('_metrics_start')
+    if start is not None:
+        key = _route_labels()
+        HTTP_LATENCY.observe_key(key, time.perf_counter() - start)
+        HTTP_REQUESTS.inc_key(key + (request.method, str(response.status_code)))
+        DB_QUERIES.observe_key(key, g._metrics_db_queries)
+        DB_TIME.observe_key(key, g._metrics_db_time)
+    return response
+
+
+def _teardown_request(exc):
+    if g.pop('_metrics_start', None) is not None:
+        HTTP_IN_FLIGHT.dec()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    DB_QUERIES_TOTAL.inc()
+    if has_request_context() and '_metrics_db_queries' in g:
+        g._metrics_db_queries += 1
+        g._metrics_db_time += elapsed
+
+
+def init_metrics(app, engines):
+    """为应用注册请求钩子，并在所有引擎上统计 SQL 次数与耗时"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
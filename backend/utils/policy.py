@@ -0,0 +1,158 @@
+"""
+访问策略 - 把调用者的角色、部门与所有权规则编译为 SQL 过滤条件
+
+角色：
+- admin：全局管理员，所有行可见
+- dept_admin：部门管理员，可见本部门用户，以及本部门普通用户的密钥记录、审计日志，可管理本部门的普通用户
+- user：只能看到自己的行
+
+过滤条件在查询时拼入 WHERE，调用者看不到的行不会被加载或序列化；部门成员用子查询表达，不在 Python 中展开。
+每个请求只构造一次 Policy（缓存在 flask.g），各类过滤条件在首次使用时编译并缓存。
+"""
+from functools import cached_property, wraps
+
+from flask import g, jsonify
+from flask_login import current_user
+from sqlalchemy import and_, or_, select
+
+from models import User, KeyRecord, AuditLog, StorageUsage
+
+ROLES = ('admin', 'dept_admin', 'user')
+
+
+class Policy:
+    def __init__(self, user):
+        self.user_id = user.id
+        self.username = user.username
+        self.role = user.role
+        self.department = user.department or None
+        self.identity = self.identity_of(user)
+
+    @staticmethod
+    def identity_of(user):
+        return user.id, user.role, user.department
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    @property
+    def is_dept_admin(self):
+        # 没有部门的部门管理员只能看到自己
+        return self.role == 'dept_admin' and self.department is not None
+
+    @property
+    def is_manager(self):
+        return self.is_admin or self.is_dept_admin
+
+    @property
+    def scope(self):
+        """all / department / self"""
+        if self.is_admin:
+            return 'all'
+        return 'department' if self.is_dept_admin else 'self'
+
+    @cached_property
+    def members(self):
+        """本部门普通用户的用户名子查询（同部门的管理员与其他部门管理员不在其中）"""
+        return select(User.username).where(
+            User.department == self.department, User.role == 'user'
+        ).scalar_subquery()
+
+    @cached_property
+    def key_filter(self):
+        """KeyRecord 的可见条件；None 表示不过滤"""
+        if self.is_admin:
+            return None
+        if self.is_dept_admin:
+            return or_(KeyRecord.owner == self.username, KeyRecord.owner.in_(self.members))
+        return KeyRecord.owner == self.username
+
+    @cached_property
+    def user_filter(self):
+        if self.is_admin:
+            return None
+        if self.is_dept_admin:
+            return or_(User.id == self.user_id, User.department == self.department)
+        return User.id == self.user_id
+
+    @cached_property
+    def log_filter(self):
+        if self.is_admin:
+            return None
+        if self.is_dept_admin:
+            return or_(AuditLog.user == self.username, AuditLog.user.in_(self.members))
+        return AuditLog.user == self.username
+
+    @cached_property
+    def usage_filter(self):
+        if self.is_admin:
+            return None
+        if self.is_dept_admin:
+            return or_(
+                and_(StorageUsage.scope == 'department', StorageUsage.name == self.department),
+                and_(StorageUsage.scope == 'user', StorageUsage.name.in_(self.members))
+            )
+        return and_(StorageUsage.scope == 'user', StorageUsage.name == self.username)
+
+    def can_manage(self, user):
+        """能否修改 / 删除该用户的管理字段：部门管理员只能管理本部门的普通用户"""
+        if self.is_admin:
+            return True
+        return self.is_dept_admin and user.department == self.department and user.role == 'user'
+
+    @property
+    def assignable_roles(self):
+        return ROLES if self.is_admin else ('user',)
+
+
+def get_policy():
+    """当前请求调用者的策略（每个请求构造一次）"""
+    policy = g.get('_policy')
+    if policy is None or policy.identity != Policy.identity_of(current_user):
+        policy = g._policy = Policy(current_user)
+    return policy
+
+
+def _scoped(query, condition):
+    return query if condition is None else query.filter(condition)
+
+
+def scope_keys(query):
+    return _scoped(query, get_policy().key_filter)
+
+
+def scope_users(query):
+    return _scoped(query, get_policy().user_filter)
+
+
+def scope_logs(query):
+    return _scoped(query, get_policy().log_filter)
+
+
+def scope_usage(query):
+    return _scoped(query, get_policy().usage_filter)
+
+
+def _forbidden():
+    return jsonify({'success': False, 'code': 'FORBIDDEN', 'message': 'Admin access required'}), 403
+
+
+def admin_required(f):
+    """仅全局管理员（放在 login_required 之后）"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not get_policy().is_admin:
+            return _forbidden()
+        return f(*args, **kwargs)
+    return decorated
+
+
+def manager_required(f):
+    """全局管理员或部门管理员（放在 login_required 之后）"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not get_policy().is_manager:
+            return _forbidden()
+        return f(*args, **kwargs)
+    return decorated
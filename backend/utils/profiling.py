@@ -0,0 +1,179 @@
+"""
+请求级性能剖析与慢查询日志
+
+- 按请求头（默认 X-Profile: 1）或采样比例开启，记录调用栈 profile 与每条 SQL 的耗时
+- 只保留最慢的 N 条记录（环形缓冲），供管理员查看
+- 同一请求中重复执行的相同语句会被标记为疑似 N+1
+- 慢查询（超过 SLOW_QUERY_MS）无论是否开启剖析都会写入应用日志
+"""
+import cProfile
+import heapq
+import io
+import itertools
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+PROFILE_TOP_FUNCTIONS = 25
+
+
+class TraceBuffer:
+    """保留耗时最长的 N 条请求记录"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        item = (trace['duration_ms'], next(self._seq), trace)
+        with self._lock:
+            if len(self._heap) < self.capacity:
+                heapq.heappush(self._heap, item)
+            elif item[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def list(self):
+        with self._lock:
+            items = sorted(self._heap, reverse=True)
+        return [trace for _, _, trace in items]
+
+    def get(self, trace_id):
+        return next((t for t in self.list() if t['id'] == trace_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+
+
+def detect_repeated_queries(queries, threshold):
+    """同一语句在一次请求中执行 threshold 次及以上，视为疑似 N+1"""
+    counts = Counter(q['statement'] for q in queries)
+    flagged = []
+    for statement, count in counts.most_common():
+        if count < threshold:
+            break
+        total = sum(q['duration_ms'] for q in queries if q['statement'] == statement)
+        flagged.append({'statement': statement, 'count': count, 'total_ms': round(total, 3)})
+    return flagged
+
+
+def get_buffer(app=None):
+    app = app or current_app
+    return app.extensions['profiling']
+
+
+def _should_profile():
+    config = current_app.config
+    if not config.get('PROFILING_ENABLED', False):
+        return False
+    if request.headers.get(config.get('PROFILE_HEADER', 'X-Profile'), '').lower() in ('1', 'true', 'yes'):
+        return True
+    rate = config.get('PROFILE_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def _before_request():
+    if not _should_profile():
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 同一线程已有其它 profiler 在运行
+        profiler = None
+    g._profile = {'profiler': profiler, 'queries': [], 'start': time.perf_counter()}
+
+
+def _after_request(response):
+    state = g.pop('_profile', None)
+    if state is None:
+        return response
+
+    duration_ms = (time.perf_counter() - state['start']) * 1000
+    profiler = state['profiler']
+    stats_text = None
+    if profiler is not None:
+        profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        stats_text = stream.getvalue()
+
+    queries = state['queries']
+    repeated = detect_repeated_queries(queries, current_app.config.get('N_PLUS_ONE_THRESHOLD', 5))
+    if repeated:
+        current_app.logger.warning(
+            f'疑似 N+1 查询 {request.method} {request.path}: '
+            + '; '.join(f"{r['count']}x {r['statement'][:120]}" for r in repeated)
+        )
+
+    trace = {
+        'id': uuid.uuid4().hex[:12],
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'started_at': datetime.utcnow().isoformat(),
+        'duration_ms': round(duration_ms, 3),
+        'query_count': len(queries),
+        'query_time_ms': round(sum(q['duration_ms'] for q in queries), 3),
+        'queries': queries,
+        'n_plus_one': repeated,
+        'profile': stats_text
+    }
+    get_buffer().add(trace)
+    response.headers['X-Profile-Id'] = trace['id']
+    return response
+
+
+def _teardown_request(exc):
+    # 异常未经过 after_request 时也要停止 profiler
+    state = g.pop('_profile', None)
+    if state is not None and state['profiler'] is not None:
+        state['profiler'].disable()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_profiling_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_profiling_query_start')
+    if not starts:
+        return
+    duration_ms = (time.perf_counter() - starts.pop()) * 1000
+
+    if not has_request_context():
+        return
+
+    slow_ms = current_app.config.get('SLOW_QUERY_MS', 200)
+    if slow_ms and duration_ms >= slow_ms:
+        current_app.logger.warning(f'慢查询 {duration_ms:.1f} ms ({request.method} {request.path}): {statement}')
+
+    state = g.get('_profile')
+    if state is not None:
+        state['queries'].append({
+            'statement': statement,
+            'duration_ms': round(duration_ms, 3),
+            'executemany': executemany
+        })
+
+
+def init_profiling(app, engines):
+    """注册剖析钩子与慢查询日志"""
+    app.extensions['profiling'] = TraceBuffer(app.config.get('PROFILE_RING_SIZE', 50))
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
@@ -0,0 +1,213 @@
+"""
+存储配额 - 按用户与部门维护用量计数器
+
+- 计数器（字节数、文件数）与密钥记录在同一事务中增减，检查配额只读一行，不扫描记录或文件系统
+- 扣减用一条带条件的 UPDATE 完成“检查 + 占用”，并发上传不会同时越过上限
+- 只统计有密文文件的记录（模拟加密不占存储）；字节数为明文大小
+- 部门用量始终等于其成员用量之和：用户换部门时整体迁移
+"""
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import StorageUsage, User, KeyRecord
+
+SCOPES = ('user', 'department')
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, scope, name, usage):
+        self.scope = scope
+        self.name = name
+        self.usage = usage
+        super().__init__(f'{"用户" if scope == "user" else "部门"} {name} 的存储配额已用尽')
+
+
+def scopes_for(username, department):
+    keys = [('user', username)]
+    if department:
+        keys.append(('department', department))
+    return keys
+
+
+def _ensure_row(scope, name):
+    row = db.session.get(StorageUsage, (scope, name))
+    if row is not None:
+        return row
+    try:
+        with db.session.begin_nested():
+            row = StorageUsage(scope=scope, name=name, bytes_used=0, files_used=0)
+            db.session.add(row)
+    except IntegrityError:
+        # 并发请求已创建
+        row = db.session.get(StorageUsage, (scope, name))
+    return row
+
+
+def usage_dict(row):
+    return {
+        'scope': row.scope,
+        'name': row.name,
+        'bytes_used': row.bytes_used or 0,
+        'files_used': row.files_used or 0,
+        'quota_bytes': row.quota_bytes,
+        'quota_files': row.quota_files
+    }
+
+
+def _fits(row, nbytes, nfiles):
+    return ((row.quota_bytes is None or (row.bytes_used or 0) + nbytes <= row.quota_bytes) and
+            (row.quota_files is None or (row.files_used or 0) + nfiles <= row.quota_files))
+
+
+def check_quota(username, department, nbytes, nfiles=1):
+    """预检查（只读，每个范围一次主键查询），超出时抛 QuotaExceeded"""
+    for scope, name in scopes_for(username, department):
+        row = db.session.get(StorageUsage, (scope, name), populate_existing=True)
+        if row is not None and not _fits(row, nbytes, nfiles):
+            raise QuotaExceeded(scope, name, usage_dict(row))
+
+
+def _adjust(scope, name, nbytes, nfiles, enforce):
+    _ensure_row(scope, name)
+    stmt = update(StorageUsage).where(
+        StorageUsage.scope == scope, StorageUsage.name == name
+    ).values(
+        bytes_used=StorageUsage.bytes_used + nbytes,
+        files_used=StorageUsage.files_used + nfiles
+    )
+    if enforce:
+        stmt = stmt.where(
+            or_(StorageUsage.quota_bytes.is_(None), StorageUsage.bytes_used + nbytes <= StorageUsage.quota_bytes),
+            or_(StorageUsage.quota_files.is_(None), StorageUsage.files_used + nfiles <= StorageUsage.quota_files)
+        )
+    result = db.session.execute(stmt, execution_options={'synchronize_session': False})
+    if enforce and result.rowcount == 0:
+        row = db.session.get(StorageUsage, (scope, name), populate_existing=True)
+        raise QuotaExceeded(scope, name, usage_dict(row))
+
+
+def charge(username, department, nbytes, nfiles=1, enforce=True):
+    """
+    在当前事务中占用配额（不提交）；enforce 时超出上限抛 QuotaExceeded，
+    调用方应回滚整个事务
+    """
+    for scope, name in scopes_for(username, department):
+        _adjust(scope, name, nbytes, nfiles, enforce)
+
+
+def release(username, department, nbytes, nfiles=1):
+    """在当前事务中归还配额（不提交）"""
+    for scope, name in scopes_for(username, department):
+        _adjust(scope, name, -nbytes, -nfiles, enforce=False)
+
+
+def _departments(usernames):
+    rows = db.session.query(User.username, User.department).filter(User.username.in_(usernames)).all()
+    return {username: department for username, department in rows}
+
+
+def owner_totals(key_ids):
+    """按所有者汇总一批记录占用的（字节数, 文件数）"""
+    rows = db.session.query(
+        KeyRecord.owner, db.func.coalesce(db.func.sum(KeyRecord.file_size), 0), db.func.count(KeyRecord.id)
+    ).filter(
+        KeyRecord.id.in_(key_ids), KeyRecord.storage_path.isnot(None)
+    ).group_by(KeyRecord.owner).all()
+    return [(owner, int(nbytes), nfiles) for owner, nbytes, nfiles in rows]
+
+
+def release_records(key_ids):
+    """删除一批记录前调用：按所有者归还配额（不提交）"""
+    totals = owner_totals(key_ids)
+    departments = _departments([owner for owner, _, _ in totals])
+    for owner, nbytes, nfiles in totals:
+        release(owner, departments.get(owner), nbytes, nfiles)
+
+
+def transfer_records(key_ids, new_owner):
+    """转移一批记录前调用：用量从原所有者移到新所有者（管理员操作，不受新所有者配额限制）"""
+    totals = owner_totals(key_ids)
+    departments = _departments([owner for owner, _, _ in totals] + [new_owner])
+    moved_bytes = moved_files = 0
+    for owner, nbytes, nfiles in totals:
+        if owner == new_owner:
+            continue
+        release(owner, departments.get(owner), nbytes, nfiles)
+        moved_bytes += nbytes
+        moved_files += nfiles
+    if moved_files:
+        charge(new_owner, departments.get(new_owner), moved_bytes, moved_files, enforce=False)
+
+
+def move_department(username, old_department, new_department):
+    """用户换部门时，把其用量从旧部门迁到新部门（不提交）"""
+    if old_department == new_department:
+        return
+    row = db.session.get(StorageUsage, ('user', username), populate_existing=True)
+    if row is None or not (row.bytes_used or row.files_used):
+        return
+    if old_department:
+        _adjust('department', old_department, -row.bytes_used, -row.files_used, enforce=False)
+    if new_department:
+        _adjust('department', new_department, row.bytes_used, row.files_used, enforce=False)
+
+
+def forget_user(username, department):
+    """删除用户时调用：从部门中扣除其剩余用量并删除用户计数器，重建同名用户不会继承（不提交）"""
+    row = db.session.get(StorageUsage, ('user', username), populate_existing=True)
+    if row is None:
+        return
+    if department and (row.bytes_used or row.files_used):
+        _adjust('department', department, -(row.bytes_used or 0), -(row.files_used or 0), enforce=False)
+    db.session.delete(row)
+
+
+def stored_records(username):
+    """用户名下占用存储的记录数"""
+    return KeyRecord.query.filter(KeyRecord.owner == username, KeyRecord.storage_path.isnot(None)).count()
+
+
+def set_quota(scope, name, quota_bytes=None, quota_files=None):
+    """设置上限（None 表示不限），不提交"""
+    row = _ensure_row(scope, name)
+    row.quota_bytes = quota_bytes
+    row.quota_files = quota_files
+    return row
+
+
+def reset_usage():
+    """清零所有计数器（保留配额设置），不提交"""
+    db.session.execute(update(StorageUsage).values(bytes_used=0, files_used=0),
+                       execution_options={'synchronize_session': False})
+
+
+def rebuild_usage():
+    """
+    按现有记录重新计算全部计数器（修复工具，会扫描 key_records），不提交
+    返回重新计算的范围数
+    """
+    reset_usage()
+    rows = db.session.query(
+        KeyRecord.owner, db.func.coalesce(db.func.sum(KeyRecord.file_size), 0), db.func.count(KeyRecord.id)
+    ).filter(KeyRecord.storage_path.isnot(None)).group_by(KeyRecord.owner).all()
+    departments = _departments([owner for owner, _, _ in rows])
+    touched = set()
+    for owner, nbytes, nfiles in rows:
+        for scope, name in scopes_for(owner, departments.get(owner)):
+            _adjust(scope, name, int(nbytes), nfiles, enforce=False)
+            touched.add((scope, name))
+    return len(touched)
+
+
+def total_usage(username=None, department=None):
+    """仪表盘用量：指定用户或部门时读一行，否则汇总所有用户行"""
+    if username is not None or department is not None:
+        key = ('user', username) if username is not None else ('department', department)
+        row = db.session.get(StorageUsage, key, populate_existing=True)
+        return (row.bytes_used or 0, row.files_used or 0) if row else (0, 0)
+    nbytes, nfiles = db.session.query(
+        db.func.coalesce(db.func.sum(StorageUsage.bytes_used), 0),
+        db.func.coalesce(db.func.sum(StorageUsage.files_used), 0)
+    ).filter(StorageUsage.scope == 'user').one()
+    return int(nbytes), int(nfiles)
@@ -0,0 +1,61 @@
+"""后台周期任务 - 守护线程按固定间隔在应用上下文中执行任务"""
+import threading
+
+_lock = threading.Lock()
+
+
+class PeriodicTask:
+    def __init__(self, app, name, interval, func):
+        self.app = app
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'qrng-{name}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    self.func()
+                except Exception as e:
+                    self.app.logger.error(f'后台任务 {self.name} 执行失败: {e}')
+                finally:
+                    from extensions import db
+                    db.session.remove()
+
+
+def register_task(app, name, interval, func):
+    """登记周期任务，首个请求到来时统一启动"""
+    app.extensions.setdefault('background_tasks', []).append((name, interval, func))
+
+
+def init_scheduler(app):
+    """
+    在第一个请求时启动已登记的任务：
+    调试模式下重载器的父进程不处理请求，因此不会重复启动
+    """
+    app.extensions.setdefault('background_tasks', [])
+    app.extensions['running_tasks'] = []
+    started = []
+
+    @app.before_request
+    def start_background_tasks():
+        if started:
+            return
+        with _lock:
+            if started:
+                return
+            started.append(True)
+            if app.config.get('TESTING') or not app.config.get('BACKGROUND_TASKS_ENABLED', True):
+                return
+            for name, interval, func in app.extensions['background_tasks']:
+                task = PeriodicTask(app, name, interval, func)
+                task.start()
+                app.extensions['running_tasks'].append(task)
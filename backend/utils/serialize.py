@@ -0,0 +1,88 @@
+"""
+列表序列化 - 按列取元组、快速 JSON 编码、大数组分块流式输出
+
+- 列表端点只查询需要的列（行元组，不构造 ORM 对象），也不逐行构造 dict、调用 isoformat
+- 安装了 orjson 时用它编码（原生支持 datetime），否则退回标准库 json
+- 超过 SERIALIZE_STREAM_THRESHOLD 行时每 SERIALIZE_CHUNK_ROWS 行编码一块流式输出，不在内存中拼出整个响应体
+- 按 Accept 协商格式：
+  application/json                    默认，对象数组（与原接口相同）
+  application/vnd.qrng.columnar+json  列式 {"columns": [...], "rows": [[...], ...]}，不重复键名
+  application/msgpack                 列式结构的 MessagePack 编码（需安装 msgpack）
+"""
+import json
+from datetime import date
+
+from flask import Response, current_app, request
+from sqlalchemy.engine import Row
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+COLUMNAR = 'application/vnd.qrng.columnar+json'
+MSGPACK = 'application/msgpack'
+
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Row):
+        return tuple(value)
+    raise TypeError(f'无法序列化 {type(value).__name__}')
+
+
+def dumps(obj):
+    """编码为 UTF-8 JSON bytes（datetime 输出 ISO 8601，与 isoformat 一致）"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def negotiate():
+    """按 Accept 选择响应格式；未指定或请求的格式不可用时用 JSON"""
+    offered = [JSON, COLUMNAR]
+    if msgpack is not None:
+        offered += [MSGPACK, 'application/x-msgpack']
+    best = request.accept_mimetypes.best_match(offered, default=JSON)
+    return MSGPACK if best == 'application/x-msgpack' else best
+
+
+def _iter_json(head, name, columns, rows, columnar, chunk_rows):
+    """逐块输出 {**head, name: [...]}：head 先编码，再逐块编码行并去掉外层方括号拼接"""
+    opening = b'{"columns":' + dumps(columns) + b',"rows":[' if columnar else b'['
+    yield dumps(head)[:-1] + b',' + dumps(name) + b':' + opening
+    for start in range(0, len(rows), chunk_rows):
+        chunk = rows[start:start + chunk_rows]
+        items = chunk if columnar else [dict(zip(columns, row)) for row in chunk]
+        yield (b',' if start else b'') + dumps(items)[1:-1]
+    yield b']}}' if columnar else b']}'
+
+
+def list_response(name, columns, rows, **extra):
+    """
+    列表响应 {"success": true, name: [...], **extra}
+    columns 为输出字段名，rows 为与之一一对应的行元组列表（需在视图内取完，流式输出时不再访问数据库）
+    """
+    fmt = negotiate()
+    head = {'success': True, **extra}
+    if fmt == MSGPACK:
+        body = msgpack.packb({**head, name: {'columns': list(columns), 'rows': rows}},
+                             default=_default, use_bin_type=True)
+        response = Response(body, mimetype=MSGPACK)
+    else:
+        config = current_app.config
+        columnar = fmt == COLUMNAR
+        chunks = _iter_json(head, name, list(columns), rows, columnar, config.get('SERIALIZE_CHUNK_ROWS', 500))
+        if len(rows) > config.get('SERIALIZE_STREAM_THRESHOLD', 2000):
+            response = Response(chunks, mimetype=fmt)
+        else:
+            response = Response(b''.join(chunks), mimetype=fmt)
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,42 @@
+"""字节数与 "1.23 MB" 形式的显示字符串互转"""
+import re
+
+UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+
+_SIZE_RE = re.compile(r'^\s*([\d.]+)\s*([KMGT]?B)?\s*$', re.IGNORECASE)
+
+
+def format_size(nbytes):
+    """上传接口沿用的格式：不足 1 MB 显示 KB，否则显示 MB（两位小数）"""
+    if nbytes is None:
+        return None
+    if nbytes < 1024 * 1024:
+        return f"{nbytes / 1024:.2f} KB"
+    return f"{nbytes / (1024 * 1024):.2f} MB"
+
+
+def format_storage(nbytes):
+    """仪表盘使用的格式：按量级选择 B / KB / MB / GB（一位小数）"""
+    if nbytes < 1024:
+        return f"{nbytes} B"
+    if nbytes < 1024 * 1024:
+        return f"{nbytes / 1024:.1f} KB"
+    if nbytes < 1024 * 1024 * 1024:
+        return f"{nbytes / (1024 * 1024):.1f} MB"
+    return f"{nbytes / (1024 * 1024 * 1024):.1f} GB"
+
+
+def parse_size(value):
+    """把整数或 "1.2 MB" 之类的字符串解析为字节数，无法解析时返回 None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value) if value >= 0 else None
+    match = _SIZE_RE.match(str(value))
+    if not match:
+        return None
+    number, unit = match.groups()
+    try:
+        return int(float(number) * UNITS[(unit or 'B').upper()])
+    except ValueError:
+        return None
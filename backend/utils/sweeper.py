@@ -0,0 +1,163 @@
+"""
+存储回收 - 清理过期的解密临时文件与无 KeyRecord 引用的 .enc 文件
+
+- 临时文件（decrypt_*）：超过 TEMP_FILE_MAX_AGE_SECONDS 未被下载即删除
+- 孤立密文（*.enc）：按批次与 KeyRecord 比对（标记），无引用且超过宽限期的删除（清扫）
+- 删除按 SWEEP_MAX_BYTES_PER_SEC 限速，避免与正常读写争抢磁盘
+"""
+import os
+import time
+
+from flask import current_app
+from sqlalchemy import or_
+
+from extensions import db
+from models import KeyRecord, AuditLog
+from utils.metrics import REGISTRY
+
+SWEEP_RECLAIMED_BYTES = REGISTRY.counter(
+    'qrng_sweeper_reclaimed_bytes_total', 'Bytes reclaimed by the storage sweeper', ('kind',))
+SWEEP_RECLAIMED_FILES = REGISTRY.counter(
+    'qrng_sweeper_reclaimed_files_total', 'Files removed by the storage sweeper', ('kind',))
+
+
+class Throttle:
+    """按字节数限速：累计处理量超过 rate × 已用时间时休眠"""
+
+    def __init__(self, bytes_per_sec):
+        self.bytes_per_sec = bytes_per_sec
+        self.started = time.monotonic()
+        self.consumed = 0
+
+    def consume(self, nbytes):
+        if not self.bytes_per_sec:
+            return
+        self.consumed += nbytes
+        ahead = self.consumed / self.bytes_per_sec - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def _remove(path, size, throttle, kind, report):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        current_app.logger.error(f'回收文件失败 {path}: {e}')
+        report['errors'] += 1
+        return
+    report['files'] += 1
+    report['bytes'] += size
+    SWEEP_RECLAIMED_FILES.inc(kind=kind)
+    SWEEP_RECLAIMED_BYTES.inc(size, kind=kind)
+    throttle.consume(size)
+
+
+def _empty_report():
+    return {'files': 0, 'bytes': 0, 'errors': 0}
+
+
+def sweep_temp_files(upload_folder, max_age_seconds, throttle=None, now=None):
+    """删除超过 max_age_seconds 的解密临时文件"""
+    throttle = throttle or Throttle(0)
+    cutoff = (now or time.time()) - max_age_seconds
+    report = _empty_report()
+
+    with os.scandir(upload_folder) as entries:
+        expired = []
+        for entry in entries:
+            if entry.name.startswith('decrypt_') and entry.is_file():
+                stat = entry.stat()
+                if stat.st_mtime < cutoff:
+                    expired.append((entry.path, stat.st_size))
+
+    for path, size in expired:
+        _remove(path, size, throttle, 'temp', report)
+    return report
+
+
+def _referenced(batch):
+    """一次查询判断本批 .enc 文件是否仍被引用（按存储路径或密钥 ID）"""
+    paths = [path for path, _, _ in batch]
+    key_ids = [key_id for _, key_id, _ in batch]
+    rows = db.session.query(KeyRecord.id, KeyRecord.storage_path).filter(
+        or_(KeyRecord.storage_path.in_(paths), KeyRecord.id.in_(key_ids))
+    ).all()
+    referenced = set()
+    for key_id, storage_path in rows:
+        referenced.add(key_id)
+        if storage_path:
+            referenced.add(os.path.basename(storage_path))
+    return referenced
+
+
+def sweep_orphan_blobs(upload_folder, min_age_seconds, batch_size=500, throttle=None, now=None):
+    """
+    标记-清扫孤立的 .enc 文件
+    min_age_seconds 为宽限期：加密请求先写文件后提交记录，新文件不能立即判为孤立
+    """
+    throttle = throttle or Throttle(0)
+    cutoff = (now or time.time()) - min_age_seconds
+    report = {**_empty_report(), 'scanned': 0}
+
+    def flush(batch):
+        referenced = _referenced(batch)
+        for path, key_id, size in batch:
+            if key_id not in referenced and os.path.basename(path) not in referenced:
+                _remove(path, size, throttle, 'orphan', report)
+
+    batch = []
+    with os.scandir(upload_folder) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.enc') or not entry.is_file():
+                continue
+            stat = entry.stat()
+            if stat.st_mtime >= cutoff:
+                continue
+            report['scanned'] += 1
+            batch.append((entry.path, entry.name[:-len('.enc')], stat.st_size))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+    if batch:
+        flush(batch)
+    return report
+
+
+def run_sweep(user='system', ip_address=None):
+    """执行一次完整回收并写审计日志，返回回收报告"""
+    config = current_app.config
+    upload_folder = config['UPLOAD_FOLDER']
+    if not os.path.isdir(upload_folder):
+        return {'temp': _empty_report(), 'orphans': {**_empty_report(), 'scanned': 0}, 'reclaimed_bytes': 0}
+
+    throttle = Throttle(config.get('SWEEP_MAX_BYTES_PER_SEC', 0))
+    started = time.perf_counter()
+    temp = sweep_temp_files(upload_folder, config.get('TEMP_FILE_MAX_AGE_SECONDS', 900), throttle)
+    orphans = sweep_orphan_blobs(
+        upload_folder,
+        config.get('ORPHAN_BLOB_MIN_AGE_SECONDS', 3600),
+        config.get('SWEEP_BATCH_SIZE', 500),
+        throttle
+    )
+    report = {
+        'temp': temp,
+        'orphans': orphans,
+        'reclaimed_bytes': temp['bytes'] + orphans['bytes'],
+        'elapsed_s': round(time.perf_counter() - started, 3)
+    }
+
+    if temp['files'] or orphans['files'] or temp['errors'] or orphans['errors']:
+        log = AuditLog(
+            user=user,
+            action_type='SYSTEM_SWEEP',
+            message=f"存储回收 {temp['files'] + orphans['files']} 个文件，释放 {report['reclaimed_bytes']} 字节",
+            detail=f"临时文件: {temp['files']}, 孤立密文: {orphans['files']}, 失败: {temp['errors'] + orphans['errors']}",
+            level='warning' if temp['errors'] or orphans['errors'] else 'info',
+            ip_address=ip_address
+        )
+        db.session.add(log)
+        db.session.commit()
+
+    return report
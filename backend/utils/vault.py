@@ -0,0 +1,220 @@
+"""
+密文文件读写 - 加密上传、单文件解密与批量打包下载共用
+
+解密时把 .enc 文件 mmap 到内存，各帧切片直接送入解密：密文由操作系统页缓存承载，
+同一文件的并发下载共享这些页，而不是各自在 Python 堆中持有一份副本
+"""
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from utils.ciphers import encrypt_stream, decrypt_stream, decrypt_buffer, is_framed
+from utils.crypto import unwrap_key
+from utils.metrics import observe_crypto
+
+# 批量解密时每个在途文件留在内存中的明文上限，超出部分写入临时文件
+SPOOL_SIZE = 1024 * 1024
+
+
+def content_digest():
+    """明文摘要：SHA-256"""
+    return hashlib.sha256()
+
+
+def blob_digest():
+    """密文文件校验和：BLAKE2b-256（比 SHA-256 快，仅用于完整性比对）"""
+    return hashlib.blake2b(digest_size=32)
+
+
+def encrypt_to_file(src, storage_path, suite, frame_size):
+    """
+    用新生成的密钥把 src 流式加密为分帧 .enc 文件，同一遍计算明文 SHA-256 与密文校验和
+    返回 (key, nonce_prefix, 明文字节数, 明文 SHA-256, 密文校验和)
+    """
+    key = suite.generate_key()
+    plain_digest, cipher_digest = content_digest(), blob_digest()
+    started = time.perf_counter()
+    try:
+        with open(storage_path, 'wb') as dst:
+            nonce_prefix, plain_size, _ = encrypt_stream(
+                src, dst, suite, key, frame_size, plain_digest, cipher_digest)
+    except Exception:
+        if os.path.exists(storage_path):
+            os.remove(storage_path)
+        raise
+    observe_crypto('encrypt', suite.name, plain_size, time.perf_counter() - started)
+    return key, nonce_prefix, plain_size, plain_digest.hexdigest(), cipher_digest.hexdigest()
+
+
+def reencrypt_file(storage_path, wrapped_key, nonce, new_path, suite, frame_size):
+    """
+    解密 storage_path 并用新密钥、新算法重新加密到 new_path，返回值同 encrypt_to_file
+    明文只经过同目录下的匿名临时文件（小文件留在内存），不会留下具名的明文文件
+    """
+    folder = os.path.dirname(new_path) or None
+    with tempfile.SpooledTemporaryFile(max_size=frame_size * 16, dir=folder) as plain:
+        _decrypt_into(storage_path, wrapped_key, nonce, plain)
+        plain.seek(0)
+        return encrypt_to_file(plain, new_path, suite, frame_size)
+
+
+def blob_checksum(storage_path):
+    """重新计算 .enc 文件的校验和（不需要密钥）"""
+    digest = blob_digest()
+    with open(storage_path, 'rb') as src:
+        mapped = _map_file(src)
+        if mapped is not None:
+            with mapped, memoryview(mapped) as view:
+                digest.update(view)
+    return digest.hexdigest()
+
+
+def _map_file(src):
+    """只读映射整个文件；空文件无法映射，返回 None"""
+    if os.fstat(src.fileno()).st_size == 0:
+        return None
+    mapped = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    return mapped
+
+
+def _decrypt_into(storage_path, wrapped_key, nonce, dst):
+    key = unwrap_key(wrapped_key)
+    with open(storage_path, 'rb') as src:
+        mapped = _map_file(src)
+        if mapped is None:
+            if is_framed(nonce):
+                return decrypt_stream(src, dst, key)
+            plaintext = AESGCM(key).decrypt(nonce, b'', None)
+            dst.write(plaintext)
+            return len(plaintext)
+        with mapped:
+            if is_framed(nonce):
+                return decrypt_buffer(mapped, dst, key)
+            # 旧格式：整文件单次 AES-256-GCM（在 except 之外重新抛出，理由同 decrypt_buffer）
+            plaintext = None
+            with memoryview(mapped) as ciphertext:
+                try:
+                    plaintext = AESGCM(key).decrypt(nonce, ciphertext, None)
+                except InvalidTag:
+                    pass
+            if plaintext is None:
+                raise InvalidTag()
+            dst.write(plaintext)
+            return len(plaintext)
+
+
+def decrypt_to_file(storage_path, wrapped_key, nonce, dest_path, algorithm='AES-256-GCM'):
+    """
+    流式解密到 dest_path，返回明文字节数；失败时删除不完整的输出
+    wrapped_key 为数据库中的封装密钥（见 utils.crypto.wrap_key）
+    """
+    started = time.perf_counter()
+    try:
+        with open(dest_path, 'wb') as dst:
+            size = _decrypt_into(storage_path, wrapped_key, nonce, dst)
+    except Exception:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    observe_crypto('decrypt', algorithm, size, time.perf_counter() - started)
+    return size
+
+
+def decrypt_blob(storage_path, wrapped_key, nonce, algorithm='AES-256-GCM'):
+    """读取并解密 .enc 文件，返回明文（缓冲区的 memoryview，不再复制一份）"""
+    started = time.perf_counter()
+    buffer = io.BytesIO()
+    size = _decrypt_into(storage_path, wrapped_key, nonce, buffer)
+    observe_crypto('decrypt', algorithm, size, time.perf_counter() - started)
+    return buffer.getbuffer()
+
+
+def decrypt_spooled(storage_path, wrapped_key, nonce, algorithm='AES-256-GCM', max_size=SPOOL_SIZE):
+    """
+    解密到匿名临时文件并返回（已回到开头，调用方负责关闭）；不超过 max_size 的明文留在内存，
+    更大的写到密文所在目录，不会留下具名的明文文件
+    """
+    started = time.perf_counter()
+    plain = tempfile.SpooledTemporaryFile(max_size=max_size, dir=os.path.dirname(storage_path) or None)
+    try:
+        size = _decrypt_into(storage_path, wrapped_key, nonce, plain)
+    except Exception:
+        plain.close()
+        raise
+    observe_crypto('decrypt', algorithm, size, time.perf_counter() - started)
+    plain.seek(0)
+    return plain
+
+
+class _Discard:
+    """丢弃写入内容的输出端，仅用于校验"""
+
+    def write(self, data):
+        return len(data)
+
+
+def verify_blob(storage_path, wrapped_key, nonce):
+    """完整解密一遍但不保留明文，校验所有认证标签；成功返回明文字节数，失败抛 InvalidTag"""
+    return _decrypt_into(storage_path, wrapped_key, nonce, _Discard())
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    """全局共享的解密线程池，限制全进程的并发解密数"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='qrng-decrypt')
+        return _pool
+
+
+def _close_result(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def decrypt_many(jobs, workers=4, window=None):
+    """
+    并发解密多个文件，按完成顺序产出 (job, plain, error)，plain 为 decrypt_spooled 返回的临时文件，
+    由调用方读取并关闭；jobs 中每项需包含 storage_path / wrapped_key / nonce / algorithm
+    同时在途的任务数不超过 window，内存中的明文不超过 window * SPOOL_SIZE
+    """
+    pool = _get_pool(workers)
+    window = window or workers * 2
+    pending = {}
+    jobs = iter(jobs)
+
+    def submit_next():
+        job = next(jobs, None)
+        if job is not None:
+            future = pool.submit(decrypt_spooled, job['storage_path'], job['wrapped_key'], job['nonce'], job['algorithm'])
+            pending[future] = job
+        return job is not None
+
+    while len(pending) < window and submit_next():
+        pass
+
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                error = future.exception()
+                yield job, (None if error else future.result()), error
+                submit_next()
+    finally:
+        # 调用方提前停止（如客户端断开）时，关闭尚未交出的临时文件
+        for future in pending:
+            if not future.cancel():
+                future.add_done_callback(_close_result)
@@ -0,0 +1,63 @@
+"""流式 ZIP（存储模式）- 边写边输出，不在磁盘或内存中构建完整归档"""
+import io
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+from datetime import datetime
+
+
+class _Sink(io.RawIOBase):
+    """不可 seek 的写入端：zipfile 会自动改用数据描述符并在结尾写中央目录"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+def iter_zip(entries):
+    """
+    entries: 可迭代的 (arcname, data)，data 为 bytes / str，或可 seek 的文件对象（按块读取）
+    每写完一个条目（文件对象为每一块）就把已生成的字节产出给调用方
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for arcname, data in entries:
+            info = zipfile.ZipInfo(arcname, date_time=datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            info.external_attr = 0o600 << 16
+            if not hasattr(data, 'read'):
+                zf.writestr(info, data)
+                yield from sink.drain()
+                continue
+            # 先给出大小，zipfile 据此决定是否写 ZIP64 头
+            info.file_size = data.seek(0, io.SEEK_END)
+            data.seek(0)
+            with zf.open(info, 'w') as dest:
+                while chunk := data.read(CHUNK_SIZE):
+                    dest.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+def unique_name(name, used):
+    """归档内文件名去重：a.txt, a (1).txt, a (2).txt ..."""
+    base, dot, ext = name.rpartition('.')
+    if not dot:
+        base, ext = name, ''
+    candidate, counter = name, 1
+    while candidate in used:
+        candidate = f"{base} ({counter}){'.' + ext if dot else ''}"
+        counter += 1
+    used.add(candidate)
+    return candidate
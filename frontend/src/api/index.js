@@ -52,7 +52,11 @@ export const keysAPI = {
 
 // 用户管理 API
 export const usersAPI = {
-    list: () => api.get('/users'),
+    list: (params) => api.get('/users', { params }),
+    import: (formData, params) => api.post('/users/import', formData, {
+        params,
+        headers: { 'Content-Type': 'multipart/form-data' }
+    }),
     create: (data) => api.post('/users', data),
     update: (id, data) => api.put(`/users/${id}`, data),
     delete: (id) => api.delete(`/users/${id}`)
@@ -69,6 +73,8 @@ export const devicesAPI = {
 // 审计日志 API
 export const logsAPI = {
     list: (params = {}) => api.get('/logs', { params }),
+    proof: (id) => api.get(`/logs/${id}/proof`),
+    integrity: (params = {}) => api.get('/logs/integrity', { params }),
     report: (data) => api.post('/logs', data),
     reset: () => api.post('/reset')
 }
@@ -78,4 +84,12 @@ export const dashboardAPI = {
     stats: () => api.get('/dashboard/stats')
 }
 
+// 审计分析 API（管理员）
+export const analyticsAPI = {
+    topUsers: (params = {}) => api.get('/analytics/top-users', { params }),
+    distinctIps: (params = {}) => api.get('/analytics/distinct-ips', { params }),
+    topFiles: (params = {}) => api.get('/analytics/top-files', { params }),
+    status: () => api.get('/analytics/status')
+}
+
 export default api